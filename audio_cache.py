@@ -0,0 +1,355 @@
+import asyncio
+import hashlib
+import json
+import mmap
+import os
+import queue
+import re
+import struct
+import threading
+import time
+import uuid
+from array import array
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from connection_pool import ConnectionMode
+from providers import TTSProvider
+from sinks import (
+    AudioSink,
+    create_sink,
+)
+from timeline import ChunkTimeline
+from tracing import Span
+
+DEFAULT_MEMORY_BYTES = 64 * 1024 * 1024
+DEFAULT_DISK_BYTES = 1024 * 1024 * 1024
+DEFAULT_CACHE_DIR = os.path.join("benchmark_output", "audio_cache")
+# Entry file layout: chunk count, the size of every chunk, then the audio itself
+_HEADER = struct.Struct("<q")
+_ENTRY_EXTENSION = ".audio"
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    # Case and punctuation change how a phrase is spoken, so only whitespace is normalised
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def cache_key(provider: TTSProvider, text: str, options: Optional[Dict] = None) -> str:
+    key = json.dumps({
+        "provider": provider.name,
+        "voice": provider.voice,
+        "model": provider.model,
+        "options": options or {},
+        "text": normalize_text(text),
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class CachedAudio:
+    # The audio of one synthesis with its original chunk boundaries, so a hit streams back like the provider did
+
+    def __init__(self, data, sizes: array):
+        self.data = memoryview(data)
+        self.sizes = sizes
+
+    def __len__(self):
+        return len(self.data)
+
+    def chunks(self) -> Iterator[memoryview]:
+        position = 0
+        for size in self.sizes:
+            yield self.data[position:position + size]
+            position += size
+
+    @staticmethod
+    def from_chunks(chunks: List[bytes]) -> "CachedAudio":
+        return CachedAudio(b"".join(chunks), array("q", (len(chunk) for chunk in chunks)))
+
+
+class MemoryTier:
+    # LRU bounded by the bytes of audio it holds rather than by entry count
+
+    def __init__(self, max_bytes: int = DEFAULT_MEMORY_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries: "OrderedDict[str, CachedAudio]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[CachedAudio]:
+        audio = self._entries.get(key)
+        if audio is not None:
+            self._entries.move_to_end(key)
+        return audio
+
+    def put(self, key: str, audio: CachedAudio):
+        if len(audio) > self.max_bytes:
+            return
+        if key in self._entries:
+            self.bytes -= len(self._entries.pop(key))
+        self._entries[key] = audio
+        self.bytes += len(audio)
+        while self.bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.bytes -= len(evicted)
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+
+class DiskTier:
+    # One file per entry, read back through mmap so a hit hands out slices of the page cache without copying.
+    # Eviction is least recently used by file modification time, which a hit refreshes, down to `max_bytes`.
+    # Entries are written on a thread of the tier's own, like FileSink's chunks, so a miss never waits on the disk
+    # inside the event loop; an entry can be read once its file is in place.
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_DISK_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._sizes: "OrderedDict[str, int]" = OrderedDict()
+        entries = [entry for entry in os.scandir(directory) if entry.name.endswith(_ENTRY_EXTENSION)]
+        for entry in sorted(entries, key=lambda entry: entry.stat().st_mtime):
+            self._sizes[entry.name[:-len(_ENTRY_EXTENSION)]] = entry.stat().st_size
+        self.bytes = sum(self._sizes.values())
+        self._evict()
+        self._lock = threading.Lock()
+        self._writes: queue.Queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_entries, name="audio-cache-writer", daemon=True)
+        self._writer.start()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + _ENTRY_EXTENSION)
+
+    def get(self, key: str) -> Optional[CachedAudio]:
+        with self._lock:
+            if key not in self._sizes:
+                return None
+        try:
+            with open(self._path(key), "rb") as f:
+                # The mapping stays valid after the file is closed, or even evicted, until the audio is released
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            os.utime(self._path(key))
+        except (OSError, ValueError):
+            with self._lock:
+                self._forget(key)
+            return None
+        with self._lock:
+            if key in self._sizes:
+                self._sizes.move_to_end(key)
+        chunk_count, = _HEADER.unpack_from(data)
+        sizes = array("q")
+        sizes.frombytes(data[_HEADER.size:_HEADER.size + chunk_count * sizes.itemsize])
+        return CachedAudio(memoryview(data)[_HEADER.size + chunk_count * sizes.itemsize:], sizes)
+
+    def put(self, key: str, audio: CachedAudio):
+        size = _HEADER.size + len(audio.sizes) * audio.sizes.itemsize + len(audio)
+        if size > self.max_bytes:
+            return
+        self._writes.put((key, audio, size))
+
+    def _write_entries(self):
+        while True:
+            key, audio, size = self._writes.get()
+            try:
+                self._write(key, audio, size)
+            except OSError:
+                # A cache that could not be written costs a later miss, nothing more
+                pass
+            finally:
+                self._writes.task_done()
+
+    def _write(self, key: str, audio: CachedAudio, size: int):
+        # Written to a temporary name and renamed, so a concurrent reader never maps a half-written entry
+        temporary_path = os.path.join(self.directory, f".{key}.{uuid.uuid4().hex[:8]}.tmp")
+        with open(temporary_path, "wb") as f:
+            f.write(_HEADER.pack(len(audio.sizes)))
+            f.write(audio.sizes.tobytes())
+            f.write(audio.data)
+        os.replace(temporary_path, self._path(key))
+        with self._lock:
+            self._forget(key)
+            self._sizes[key] = size
+            self.bytes += size
+            self._evict()
+
+    def flush(self):
+        # Blocks until every entry put so far is on disk
+        self._writes.join()
+
+    def _forget(self, key: str):
+        self.bytes -= self._sizes.pop(key, 0)
+
+    def _evict(self):
+        while self.bytes > self.max_bytes and self._sizes:
+            key, _ = next(iter(self._sizes.items()))
+            self._forget(key)
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def clear(self):
+        # Pending writes land first, or they would bring entries back after the clear
+        self.flush()
+        with self._lock:
+            for key in list(self._sizes):
+                self._forget(key)
+                try:
+                    os.remove(self._path(key))
+                except OSError:
+                    pass
+
+
+class AudioCache:
+
+    def __init__(self, memory_bytes: int = DEFAULT_MEMORY_BYTES, directory: Optional[str] = DEFAULT_CACHE_DIR,
+                 disk_bytes: int = DEFAULT_DISK_BYTES):
+        self.memory = MemoryTier(memory_bytes)
+        self.disk = DiskTier(directory, disk_bytes) if directory else None
+
+    def get(self, key: str) -> Tuple[Optional[str], Optional[CachedAudio]]:
+        # Returns the tier that served the entry with it; disk hits are promoted to memory
+        if (audio := self.memory.get(key)) is not None:
+            return "memory", audio
+        if self.disk and (audio := self.disk.get(key)) is not None:
+            self.memory.put(key, audio)
+            return "disk", audio
+        return None, None
+
+    def put(self, key: str, audio: CachedAudio):
+        # A synthesis that produced no audio is not worth replaying
+        if not len(audio):
+            return
+        self.memory.put(key, audio)
+        if self.disk:
+            self.disk.put(key, audio)
+
+    def flush(self):
+        if self.disk:
+            self.disk.flush()
+
+    def clear(self, memory: bool = True, disk: bool = True):
+        if memory:
+            self.memory.clear()
+        if disk and self.disk:
+            self.disk.clear()
+
+
+class CacheHitLatencyData(BaseModel):
+    provider: str
+    cache_tier: str
+    connection_mode: Optional[ConnectionMode] = None
+    lookup_time: Optional[float] = None
+    time_to_first_audio: Optional[float] = None
+    audio_bytes: Optional[int] = None
+    spans: List[Span] = []
+    timeline: Optional[ChunkTimeline] = None
+
+    class Config:
+        arbitrary_types_allowed = True
+
+
+class _RecordingSink(AudioSink):
+    # Keeps a copy of every chunk on its way to the caller's sink, so a miss can fill the cache
+
+    def __init__(self, sink: AudioSink):
+        super().__init__()
+        self.sink = sink
+        self.chunks: List[bytes] = []
+
+    def write(self, chunk: bytes):
+        self.bytes_written += len(chunk)
+        self.chunks.append(bytes(chunk))
+        self.sink.write(chunk)
+
+    def close(self):
+        self.sink.close()
+
+
+class CachingProvider:
+    # Serves repeated phrases from an AudioCache and synthesizes everything else with the wrapped provider. Hits
+    # return CacheHitLatencyData, misses the wrapped provider's own latency data.
+
+    def __init__(self, provider: TTSProvider, cache: Optional[AudioCache] = None, options: Optional[Dict] = None):
+        self.provider = provider
+        self.cache = cache or AudioCache()
+        self.options = options
+        self.name = provider.name
+        self.supports_input_streaming = provider.supports_input_streaming
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def voice(self):
+        return self.provider.voice
+
+    @property
+    def model(self):
+        return self.provider.model
+
+    def set_voice(self, voice: str):
+        self.provider.set_voice(voice)
+
+    async def _stream_hit(self, cache_tier: str, audio: CachedAudio, sink: AudioSink, started_at: float,
+                          looked_up_at: float, connection_mode: ConnectionMode) -> CacheHitLatencyData:
+        latency_data = CacheHitLatencyData(provider=self.name, cache_tier=cache_tier, connection_mode=connection_mode,
+                                           lookup_time=looked_up_at - started_at)
+        timeline = ChunkTimeline(started_at=started_at)
+        with sink:
+            for chunk in audio.chunks():
+                sink.write(chunk)
+                timeline.record(len(chunk))
+                if latency_data.time_to_first_audio is None:
+                    latency_data.time_to_first_audio = time.perf_counter() - started_at
+                # Other requests on the loop keep running while a long entry streams out
+                await asyncio.sleep(0)
+        latency_data.audio_bytes = sink.bytes_written
+        latency_data.timeline = timeline
+        return latency_data
+
+    async def synthesize(self, text: str, sink: Optional[AudioSink] = None,
+                         connection_mode: ConnectionMode = ConnectionMode.WARM, logger=None):
+        sink = sink or create_sink(f"cached_{self.name}")
+        started_at = time.perf_counter()
+        key = cache_key(self.provider, text, self.options)
+        cache_tier, audio = self.cache.get(key)
+        if audio is not None:
+            self.hits += 1
+            return await self._stream_hit(cache_tier, audio, sink, started_at=started_at,
+                                          looked_up_at=time.perf_counter(), connection_mode=connection_mode)
+        self.misses += 1
+        recording_sink = _RecordingSink(sink)
+        latency_data = await self.provider.synthesize(text, sink=recording_sink, connection_mode=connection_mode,
+                                                      logger=logger)
+        # Nothing to join or cache when the provider returned no audio
+        if recording_sink.chunks:
+            self.cache.put(key, CachedAudio.from_chunks(recording_sink.chunks))
+        return latency_data
+
+    async def synthesize_streaming_input(self, text_chunks: AsyncIterator[str], sink: Optional[AudioSink] = None,
+                                         connection_mode: ConnectionMode = ConnectionMode.WARM, logger=None):
+        # The key needs the whole text, which streamed input only has once the audio is under way, so these calls
+        # always synthesize; the result still fills the cache for later plain calls with the same text
+        sink = sink or create_sink(f"cached_{self.name}")
+        text = []
+
+        async def recorded_text_chunks():
+            async for text_chunk in text_chunks:
+                text.append(text_chunk)
+                yield text_chunk
+
+        self.misses += 1
+        recording_sink = _RecordingSink(sink)
+        latency_data = await self.provider.synthesize_streaming_input(recorded_text_chunks(), sink=recording_sink,
+                                                                      connection_mode=connection_mode, logger=logger)
+        if recording_sink.chunks:
+            self.cache.put(cache_key(self.provider, "".join(text), self.options),
+                           CachedAudio.from_chunks(recording_sink.chunks))
+        return latency_data
+
+    async def close(self):
+        await self.provider.close()
@@ -0,0 +1,115 @@
+import logging
+from typing import Callable, List, Optional, Sequence
+
+from pydantic import BaseModel
+
+from chunking import parse_chunker
+from connection_pool import ConnectionMode
+from latency_model import (
+    Constant,
+    LatencyModel,
+)
+from pipeline import run_pipeline
+from providers import TTSProvider
+from sinks import DiscardSink
+from stats import HistogramSummary, LatencyHistogram, field_value
+from token_source import (
+    SIMULATED_RESPONSE,
+    simulated_token_source,
+)
+
+DEFAULT_CHUNKER_SPECS = ["token", "word:2", "word:4", "punctuation", "sentence", "min_chars:20", "min_chars:50"]
+# ElevenLabs accepts schedule values between 50 and 500; the last entry is its own default
+DEFAULT_CHUNK_LENGTH_SCHEDULES = [[50], [50, 90, 120], [80, 120, 160], [120, 160, 250, 290]]
+DEFAULT_TOKEN_RATE = 30.0
+DEFAULT_TOTAL_TIME_WEIGHT = 0.25
+
+ProviderFactory = Callable[[Optional[List[int]]], TTSProvider]
+
+
+class ChunkingConfig(BaseModel):
+    chunker: str
+    chunk_length_schedule: Optional[List[int]] = None
+
+
+class ChunkingResult(BaseModel):
+    provider: str
+    config: ChunkingConfig
+    errors: int
+    time_to_first_audio: HistogramSummary
+    total_time: HistogramSummary
+    score: Optional[float] = None
+
+
+def chunking_configs(chunker_specs: Sequence[str] = DEFAULT_CHUNKER_SPECS,
+                     chunk_length_schedules: Optional[Sequence[List[int]]] = None) -> List[ChunkingConfig]:
+    return [ChunkingConfig(chunker=chunker_spec, chunk_length_schedule=chunk_length_schedule)
+            for chunker_spec in chunker_specs
+            for chunk_length_schedule in (chunk_length_schedules or [None])]
+
+
+def score(time_to_first_audio: HistogramSummary, total_time: HistogramSummary,
+          total_time_weight: float = DEFAULT_TOTAL_TIME_WEIGHT) -> Optional[float]:
+    # Lower is better: median time to first audio, plus a share of the median time to speak the whole response
+    if time_to_first_audio.p50 is None or total_time.p50 is None:
+        return None
+    return time_to_first_audio.p50 + total_time_weight * total_time.p50
+
+
+async def evaluate(provider_factory: ProviderFactory, config: ChunkingConfig, text: str = SIMULATED_RESPONSE,
+                   token_rate: float = DEFAULT_TOKEN_RATE, iterations: int = 5,
+                   connection_mode: ConnectionMode = ConnectionMode.WARM,
+                   total_time_weight: float = DEFAULT_TOTAL_TIME_WEIGHT, logger=None) -> ChunkingResult:
+    if not logger:
+        logger = logging.getLogger("chunk_sweep")
+    # Tokens arrive at a fixed rate straight away, so only the chunking and the provider move the numbers
+    token_source = simulated_token_source(text=text, latency_model=LatencyModel(inter_chunk=Constant(1 / token_rate)))
+    provider = provider_factory(config.chunk_length_schedule)
+    time_to_first_audio = LatencyHistogram()
+    total_time = LatencyHistogram()
+    errors = 0
+    try:
+        for _ in range(iterations):
+            try:
+                latency_data = await run_pipeline(provider=provider, token_source=token_source, sink=DiscardSink(),
+                                                  connection_mode=connection_mode,
+                                                  chunker=parse_chunker(config.chunker), logger=logger)
+            except Exception as e:
+                logger.warning(f"{provider.name} {config.chunker} run failed: {e!r}")
+                errors += 1
+                continue
+            # A run that ended without audio has neither time, and counts as failed
+            first_audio = field_value(latency_data, "time_to_first_audio")
+            if first_audio is None or (run_time := field_value(latency_data, "total_time")) is None:
+                logger.warning(f"{provider.name} {config.chunker} run returned no audio")
+                errors += 1
+                continue
+            time_to_first_audio.record(first_audio)
+            total_time.record(run_time)
+    finally:
+        # Closing drops pre-connected sockets, so the next configuration's BOS carries its own schedule
+        await provider.close()
+    return ChunkingResult(
+        provider=provider.name,
+        config=config,
+        errors=errors,
+        time_to_first_audio=time_to_first_audio.summary(),
+        total_time=total_time.summary(),
+        score=score(time_to_first_audio.summary(), total_time.summary(), total_time_weight),
+    )
+
+
+async def sweep(provider_factory: ProviderFactory, configs: Sequence[ChunkingConfig], text: str = SIMULATED_RESPONSE,
+                token_rate: float = DEFAULT_TOKEN_RATE, iterations: int = 5,
+                connection_mode: ConnectionMode = ConnectionMode.WARM,
+                total_time_weight: float = DEFAULT_TOTAL_TIME_WEIGHT, logger=None) -> List[ChunkingResult]:
+    # Exhaustive over the given grid; results come back best first, configurations that never produced audio last
+    if not logger:
+        logger = logging.getLogger("chunk_sweep")
+    results = []
+    for config in configs:
+        logger.info(f"Evaluating chunker {config.chunker} with schedule {config.chunk_length_schedule}")
+        results.append(await evaluate(provider_factory=provider_factory, config=config, text=text,
+                                      token_rate=token_rate, iterations=iterations, connection_mode=connection_mode,
+                                      total_time_weight=total_time_weight, logger=logger))
+    return sorted(results, key=lambda result: (result.score is None, result.score or 0.0))
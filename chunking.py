@@ -0,0 +1,119 @@
+import re
+from typing import AsyncIterator, Dict, List, Optional
+
+SENTENCE_BOUNDARIES = ".!?"
+CLAUSE_BOUNDARIES = ".!?;:,"
+_WORD = re.compile(r"\S+\s+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+class Chunker:
+    # Regroups a token stream into the text chunks that are sent to a provider. Subclasses only decide where to
+    # cut the buffered text; whatever is left when the tokens run out is always sent as the last chunk.
+
+    def __init__(self):
+        self._buffer = ""
+
+    def feed(self, token: str) -> List[str]:
+        self._buffer += token
+        chunks = []
+        while (cut := self._cut(self._buffer)) is not None:
+            chunks.append(self._buffer[:cut])
+            self._buffer = self._buffer[cut:]
+        return chunks
+
+    def flush(self) -> Optional[str]:
+        chunk, self._buffer = self._buffer, ""
+        return chunk or None
+
+    def _cut(self, buffer: str) -> Optional[int]:
+        raise NotImplementedError
+
+    async def chunk(self, tokens: AsyncIterator[str]) -> AsyncIterator[str]:
+        async for token in tokens:
+            for chunk in self.feed(token):
+                yield chunk
+        if chunk := self.flush():
+            yield chunk
+
+    def describe(self) -> str:
+        return type(self).__name__
+
+
+class PerTokenChunker(Chunker):
+
+    def _cut(self, buffer: str) -> Optional[int]:
+        return len(buffer) or None
+
+    def describe(self) -> str:
+        return "token"
+
+
+class WordChunker(Chunker):
+
+    def __init__(self, words: int = 3):
+        super().__init__()
+        self.words = words
+
+    def _cut(self, buffer: str) -> Optional[int]:
+        # A word only counts once the whitespace after it has arrived, so words are never split across chunks
+        word_ends = [match.end() for match in _WORD.finditer(buffer)]
+        return word_ends[self.words - 1] if len(word_ends) >= self.words else None
+
+    def describe(self) -> str:
+        return f"word:{self.words}"
+
+
+class PunctuationChunker(Chunker):
+
+    def __init__(self, boundaries: str = SENTENCE_BOUNDARIES):
+        super().__init__()
+        self._boundary = re.compile(rf"[{re.escape(boundaries)}]+(\s+|$)")
+        self.boundaries = boundaries
+
+    def _cut(self, buffer: str) -> Optional[int]:
+        match = self._boundary.search(buffer)
+        # A boundary at the very end may still be followed by more punctuation or a decimal digit
+        if match is None or match.end() == len(buffer) and not match.group(1):
+            return None
+        return match.end()
+
+    def describe(self) -> str:
+        return "sentence" if self.boundaries == SENTENCE_BOUNDARIES else f"punctuation:{self.boundaries}"
+
+
+class MinCharChunker(Chunker):
+
+    def __init__(self, min_chars: int = 50):
+        super().__init__()
+        self.min_chars = min_chars
+
+    def _cut(self, buffer: str) -> Optional[int]:
+        if len(buffer) < self.min_chars:
+            return None
+        match = _WHITESPACE.search(buffer, self.min_chars - 1)
+        return match.end() if match else None
+
+    def describe(self) -> str:
+        return f"min_chars:{self.min_chars}"
+
+
+CHUNKERS: Dict[str, type] = {
+    "token": PerTokenChunker,
+    "word": WordChunker,
+    "sentence": PunctuationChunker,
+    "punctuation": PunctuationChunker,
+    "min_chars": MinCharChunker,
+}
+
+
+def parse_chunker(spec: str) -> Chunker:
+    # Specs look like "token", "word:3", "sentence", "punctuation:.!?,;" or "min_chars:40"
+    name, _, param = spec.partition(":")
+    if name not in CHUNKERS:
+        raise ValueError(f"Unknown chunker {name!r}, expected one of {', '.join(CHUNKERS)}")
+    if name == "punctuation":
+        return PunctuationChunker(param or CLAUSE_BOUNDARIES)
+    if param and name in ("word", "min_chars"):
+        return CHUNKERS[name](int(param))
+    return CHUNKERS[name]()
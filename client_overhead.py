@@ -0,0 +1,159 @@
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Optional
+
+from stats import HistogramSummary, LatencyHistogram
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+DEFAULT_LAG_INTERVAL = 0.01
+DEFAULT_SAMPLE_INTERVAL = 0.005
+PROFILE_DIR = os.path.join("benchmark_output", "profiles")
+
+# orjson parses the websocket messages several times faster than the standard library and returns the same objects
+json_loads = orjson.loads if orjson is not None else json.loads
+
+
+class LoopLagMonitor:
+    # Wakes up every `interval` seconds and records how late each wake-up was. Chunk loops, callbacks and other
+    # requests' decoding all delay it, and any lag here is charged to every latency measured on the same loop.
+
+    def __init__(self, interval: float = DEFAULT_LAG_INTERVAL):
+        self.interval = interval
+        self.lag = LatencyHistogram()
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            expected_at = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lag.record(max(0.0, time.perf_counter() - expected_at))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def summary(self) -> HistogramSummary:
+        return self.lag.summary()
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.stop()
+
+
+def _collapse(frame) -> str:
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(frames))
+
+
+class SamplingProfiler:
+    # Samples the stacks of the threads that are inside a provider's chunk loop every `interval` seconds, from a
+    # thread of its own, and counts them in collapsed-stack form (flamegraph.pl and speedscope read it). Asyncio
+    # chunk loops share their thread, so a sample taken while several providers stream on one loop counts for all of
+    # them.
+
+    def __init__(self, interval: float = DEFAULT_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples: Dict[str, Counter] = {}
+        self._active: Dict[int, Counter] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @contextmanager
+    def chunk_loop(self, name: str):
+        thread_id = threading.get_ident()
+        with self._lock:
+            self._active.setdefault(thread_id, Counter())[name] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                active = self._active[thread_id]
+                active[name] -= 1
+                if not active[name]:
+                    del active[name]
+                if not active:
+                    del self._active[thread_id]
+
+    def _sample(self):
+        own_thread_id = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            frames = sys._current_frames()
+            with self._lock:
+                active = {thread_id: list(names) for thread_id, names in self._active.items()}
+            for thread_id, names in active.items():
+                if thread_id == own_thread_id or (frame := frames.get(thread_id)) is None:
+                    continue
+                stack = _collapse(frame)
+                for name in names:
+                    self.samples.setdefault(name, Counter())[stack] += 1
+
+    def start(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._sample, name="chunk-loop-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def export(self, directory: str = PROFILE_DIR) -> Dict[str, str]:
+        os.makedirs(directory, exist_ok=True)
+        paths = {}
+        for name, stacks in self.samples.items():
+            paths[name] = os.path.join(directory, f"{name}.folded")
+            with open(paths[name], "w") as f:
+                for stack, count in stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+        return paths
+
+
+# Off unless enabled, when the hook around every chunk loop costs a single check
+profiler: Optional[SamplingProfiler] = None
+
+
+def enable_profiling(interval: float = DEFAULT_SAMPLE_INTERVAL) -> SamplingProfiler:
+    global profiler
+    if profiler is None:
+        profiler = SamplingProfiler(interval)
+        profiler.start()
+    return profiler
+
+
+def disable_profiling() -> Optional[SamplingProfiler]:
+    global profiler
+    stopped, profiler = profiler, None
+    if stopped:
+        stopped.stop()
+    return stopped
+
+
+def chunk_loop_profile(name: str):
+    return profiler.chunk_loop(name) if profiler is not None else nullcontext()
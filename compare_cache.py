@@ -0,0 +1,74 @@
+# Cached vs synthesized audio: time to first audio on the miss path and on memory and disk hits
+
+import argparse
+import asyncio
+import logging
+
+from audio_cache import (
+    DEFAULT_CACHE_DIR,
+    AudioCache,
+    CachingProvider,
+)
+from connection_pool import ConnectionMode
+from providers import (
+    BlockingSdkBridge,
+    create_provider,
+    registry,
+)
+from sinks import DiscardSink
+from stats import FieldStatistics
+from utils import log_field_statistics
+
+logging.basicConfig()
+cache_logger = logging.getLogger("audio_cache")
+cache_logger.setLevel(logging.INFO)
+
+TEXT = "Hello sir, what can I do for you?"
+
+
+async def measure_paths(provider: CachingProvider, args):
+    logger = cache_logger.getChild(provider.name)
+    connection_mode = ConnectionMode(args.connection_mode)
+    statistics = {path: FieldStatistics(["time_to_first_audio"]) for path in ("miss", "memory", "disk")}
+    for i in range(args.iterations):
+        # Emptying the cache first forces every path: a miss fills both tiers, then a memory hit, then a disk hit
+        # once the memory tier is emptied again
+        provider.cache.clear()
+        statistics["miss"].record(await provider.synthesize(args.text, sink=DiscardSink(),
+                                                            connection_mode=connection_mode, logger=logger))
+        statistics["memory"].record(await provider.synthesize(args.text, sink=DiscardSink(),
+                                                              connection_mode=connection_mode, logger=logger))
+        # The miss is written to disk in the background, so it has to land before the disk tier is measured
+        provider.cache.flush()
+        provider.cache.clear(disk=False)
+        statistics["disk"].record(await provider.synthesize(args.text, sink=DiscardSink(),
+                                                            connection_mode=connection_mode, logger=logger))
+    for path, path_statistics in statistics.items():
+        logger.info(f"{path}:")
+        log_field_statistics(path_statistics, logger)
+
+
+async def run_cache_benchmark(args):
+    bridge = BlockingSdkBridge()
+    cache = AudioCache(directory=args.cache_dir)
+    for name in args.providers:
+        provider = CachingProvider(create_provider(name, bridge=bridge), cache=cache)
+        await measure_paths(provider, args)
+        await provider.close()
+    bridge.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare time to first audio of cache hits against synthesis")
+    parser.add_argument("--providers", nargs="+", default=["eleven_labs", "playht", "openai"],
+                        choices=registry.names())
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--text", default=TEXT)
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--connection-mode", default=ConnectionMode.WARM.value,
+                        choices=[connection_mode.value for connection_mode in ConnectionMode])
+    asyncio.run(run_cache_benchmark(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# Chunker and chunk_length_schedule sweep in front of PlayHT & ElevenLabs input streaming
+
+import argparse
+import asyncio
+import json
+import logging
+
+from chunk_sweep import (
+    DEFAULT_CHUNK_LENGTH_SCHEDULES,
+    DEFAULT_CHUNKER_SPECS,
+    DEFAULT_TOKEN_RATE,
+    DEFAULT_TOTAL_TIME_WEIGHT,
+    chunking_configs,
+    sweep,
+)
+from connection_pool import ConnectionMode
+from providers import create_provider
+from token_source import SIMULATED_RESPONSE
+from utils import format_seconds
+
+logging.basicConfig()
+chunking_logger = logging.getLogger("chunk_sweep")
+chunking_logger.setLevel(logging.INFO)
+
+PROVIDER_FACTORIES = {
+    "eleven_labs": lambda chunk_length_schedule: create_provider("eleven_labs",
+                                                                 chunk_length_schedule=chunk_length_schedule),
+    "playht": lambda chunk_length_schedule: create_provider("playht"),
+}
+# The schedule only exists for ElevenLabs, so PlayHT is swept over the chunkers alone
+SCHEDULED_PROVIDERS = {"eleven_labs"}
+
+
+async def run_sweeps(args):
+    for provider_name in args.providers:
+        schedules = [json.loads(schedule) for schedule in args.schedules] \
+            if provider_name in SCHEDULED_PROVIDERS else None
+        results = await sweep(provider_factory=PROVIDER_FACTORIES[provider_name],
+                              configs=chunking_configs(chunker_specs=args.chunkers, chunk_length_schedules=schedules),
+                              text=args.text, token_rate=args.token_rate, iterations=args.iterations,
+                              connection_mode=ConnectionMode(args.connection_mode),
+                              total_time_weight=args.total_time_weight, logger=chunking_logger)
+        for result in results:
+            chunking_logger.info(
+                f"{provider_name} chunker={result.config.chunker} schedule={result.config.chunk_length_schedule}: "
+                f"score={format_seconds(result.score)} "
+                f"time to first audio p50={format_seconds(result.time_to_first_audio.p50)} "
+                f"p90={format_seconds(result.time_to_first_audio.p90)} "
+                f"total p50={format_seconds(result.total_time.p50)}, {result.errors} failed"
+            )
+        if results and results[0].score is not None:
+            best = results[0].config
+            chunking_logger.info(f"{provider_name} best: chunker={best.chunker} schedule={best.chunk_length_schedule}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find the text chunking that minimises time to first audio")
+    parser.add_argument("--providers", nargs="+", default=list(PROVIDER_FACTORIES), choices=list(PROVIDER_FACTORIES))
+    parser.add_argument("--chunkers", nargs="+", default=DEFAULT_CHUNKER_SPECS,
+                        help="Chunker specs, e.g. token, word:3, sentence, punctuation, min_chars:40")
+    parser.add_argument("--schedules", nargs="+",
+                        default=[json.dumps(schedule) for schedule in DEFAULT_CHUNK_LENGTH_SCHEDULES],
+                        help="ElevenLabs chunk_length_schedule values as JSON lists, e.g. [50,120]")
+    parser.add_argument("--token-rate", type=float, default=DEFAULT_TOKEN_RATE, help="LLM tokens per second")
+    parser.add_argument("--total-time-weight", type=float, default=DEFAULT_TOTAL_TIME_WEIGHT,
+                        help="Weight of the median total time against the median time to first audio")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--text", default=SIMULATED_RESPONSE)
+    parser.add_argument("--connection-mode", default=ConnectionMode.WARM.value,
+                        choices=[connection_mode.value for connection_mode in ConnectionMode])
+    asyncio.run(run_sweeps(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
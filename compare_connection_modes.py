@@ -0,0 +1,69 @@
+# Cold vs warm connections: PlayHT, ElevenLabs & OpenAI
+
+import asyncio
+import logging
+
+from connection_pool import ConnectionMode
+from providers import create_provider
+from stats import FieldStatistics, PhaseStatistics
+from utils import log_field_statistics
+
+logging.basicConfig()
+playht_logger = logging.getLogger("connection_modes_playht")
+eleven_logger = logging.getLogger("connection_modes_11labs")
+openai_logger = logging.getLogger("connection_modes_openai")
+
+playht_logger.setLevel(logging.INFO)
+eleven_logger.setLevel(logging.INFO)
+openai_logger.setLevel(logging.INFO)
+
+TEXT = "Hello sir, what can I do for you?"
+ITERATIONS = 10
+TOKEN_OUTPUT_LATENCY = 0.01
+
+
+async def text_gen():
+    for word in TEXT.split(" "):
+        yield word + " "
+        await asyncio.sleep(TOKEN_OUTPUT_LATENCY)
+
+
+def log_connection_mode_statistics(connection_mode, statistics, phase_statistics, logger):
+    logger.info(f"{connection_mode.value} connections:")
+    log_field_statistics(statistics, logger)
+    log_field_statistics(phase_statistics, logger)
+
+
+async def compare_connection_modes(name, input_streaming, fields, logger):
+    # Providers come from the registry, so only the SDK of the provider being measured is imported
+    provider = create_provider(name)
+    mode = "input_streaming" if input_streaming else "streaming"
+
+    def synthesize(connection_mode):
+        if input_streaming:
+            return provider.synthesize_streaming_input(text_gen(), logger=logger, connection_mode=connection_mode)
+        return provider.synthesize(TEXT, logger=logger, connection_mode=connection_mode)
+
+    try:
+        for connection_mode in ConnectionMode:
+            statistics = FieldStatistics(fields)
+            phase_statistics = PhaseStatistics()
+            if connection_mode == ConnectionMode.WARM:
+                # Establish the pooled connection first so the recorded calls measure steady-state latency
+                await synthesize(connection_mode)
+            for i in range(ITERATIONS):
+                logger.info(f"{mode} {connection_mode.value} call {i + 1}")
+                latency_data = await synthesize(connection_mode)
+                statistics.record(latency_data)
+                phase_statistics.record(latency_data)
+            log_connection_mode_statistics(connection_mode, statistics, phase_statistics, logger)
+    finally:
+        await provider.close()
+
+
+# For ElevenLabs input streaming the warm mode hands every utterance a pre-connected socket with BOS already sent
+eleven_fields = ["time_to_first_audio", "stream_generation_time", "hidden_handshake_time"]
+asyncio.run(compare_connection_modes("playht", False, ["time_to_first_audio"], playht_logger))
+asyncio.run(compare_connection_modes("eleven_labs", False, eleven_fields, eleven_logger))
+asyncio.run(compare_connection_modes("eleven_labs", True, eleven_fields, eleven_logger))
+asyncio.run(compare_connection_modes("openai", False, ["time_to_first_audio"], openai_logger))
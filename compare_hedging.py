@@ -0,0 +1,100 @@
+# Hedged and racing requests: tail time to first audio against the extra requests it costs
+
+import argparse
+import asyncio
+import logging
+
+from connection_pool import ConnectionMode
+from hedging import HedgedProvider
+from providers import (
+    BlockingSdkBridge,
+    create_provider,
+    registry,
+)
+from sinks import DiscardSink
+from stats import LatencyHistogram, field_value
+from utils import format_seconds
+
+logging.basicConfig()
+hedging_logger = logging.getLogger("hedging")
+hedging_logger.setLevel(logging.INFO)
+
+TEXT = "Hello sir, what can I do for you?"
+DEFAULT_DELAYS = [0.0, 0.2, 0.4]
+
+
+async def compare_hedging(args):
+    bridge = BlockingSdkBridge()
+    provider = create_provider(args.provider, bridge=bridge)
+    hedge = create_provider(args.hedge_provider, bridge=bridge) if args.hedge_provider else None
+    hedge_connection_mode = ConnectionMode(args.hedge_connection_mode) if args.hedge_connection_mode else None
+    # The baseline goes through the same race, only never hedged, so every configuration is timed identically
+    configs = {"unhedged": HedgedProvider(provider, hedge_delay=None)}
+    configs.update({f"hedge after {delay:g}s": HedgedProvider(provider, hedge=hedge, hedge_delay=delay,
+                                                              hedge_connection_mode=hedge_connection_mode)
+                    for delay in args.delays})
+    time_to_first_audio = {name: LatencyHistogram() for name in configs}
+    requests = {name: 0 for name in configs}
+    hedge_wins = {name: 0 for name in configs}
+    errors = {name: 0 for name in configs}
+
+    for i in range(args.iterations):
+        hedging_logger.info(f"Round {i + 1}")
+        # Every configuration runs once per round, so they all see the same network conditions
+        for name, config in configs.items():
+            try:
+                latency_data = await config.synthesize(args.text, sink=DiscardSink(),
+                                                       connection_mode=ConnectionMode(args.connection_mode),
+                                                       logger=hedging_logger.getChild(name))
+            except Exception as e:
+                hedging_logger.warning(f"{name} failed: {e!r}")
+                errors[name] += 1
+                continue
+            # A race that ended without audio has no time to first audio, and counts as failed
+            if (first_audio := field_value(latency_data, "time_to_first_audio")) is None:
+                hedging_logger.warning(f"{name} returned no audio")
+                errors[name] += 1
+                continue
+            time_to_first_audio[name].record(first_audio)
+            requests[name] += latency_data.requests
+            hedge_wins[name] += latency_data.winner == "hedge"
+
+    baseline = time_to_first_audio["unhedged"].summary()
+    for name in configs:
+        summary = time_to_first_audio[name].summary()
+        improvement = 1 - summary.p99 / baseline.p99 if summary.p99 is not None and baseline.p99 else None
+        hedging_logger.info(
+            f"{name}: time to first audio p50={format_seconds(summary.p50)} p90={format_seconds(summary.p90)} "
+            f"p99={format_seconds(summary.p99)} "
+            f"(p99 {'n/a' if improvement is None else f'{improvement:+.1%} better'}), "
+            f"extra requests {requests[name] / summary.count - 1 if summary.count else 0:.1%}, "
+            f"hedge won {hedge_wins[name]}, {errors[name]} failed"
+        )
+    # Hedging at about the unhedged p95 bounds the extra requests to roughly 5% while cutting the tail above it
+    hedging_logger.info(f"Suggested hedge delay: {format_seconds(time_to_first_audio['unhedged'].percentile(95))}s")
+
+    await provider.close()
+    if hedge:
+        await hedge.close()
+    bridge.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how hedged requests change tail time to first audio")
+    parser.add_argument("--provider", default="eleven_labs", choices=registry.names())
+    parser.add_argument("--hedge-provider", default=None, choices=registry.names(),
+                        help="Provider the hedge goes to, defaults to a second request to --provider")
+    parser.add_argument("--delays", nargs="+", type=float, default=DEFAULT_DELAYS,
+                        help="Hedge delays in seconds; 0 races both requests from the start")
+    parser.add_argument("--hedge-connection-mode", default=None,
+                        choices=[connection_mode.value for connection_mode in ConnectionMode],
+                        help="cold sends the hedge over a fresh connection")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--text", default=TEXT)
+    parser.add_argument("--connection-mode", default=ConnectionMode.WARM.value,
+                        choices=[connection_mode.value for connection_mode in ConnectionMode])
+    asyncio.run(compare_hedging(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
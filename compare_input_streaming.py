@@ -2,20 +2,14 @@
 
 import asyncio
 import logging
-import time
-from typing import List
 
-from eleven.benchmark_api import (
-    ElevenLabsBenchmark,
-    ElevenLabsMode,
-    InputStreamingLatencyData,
+from providers import create_provider
+from results_store import (
+    RunMetadata,
+    start_run,
 )
-from play.benchmark_sdk import (
-    PlayHTSDKBenchmark,
-    PlayHTMode,
-    LatencyData,
-)
-from utils import get_average_of_field_entries
+from stats import FieldStatistics, PhaseStatistics, TextChunkStatistics
+from utils import log_field_statistics
 
 logging.basicConfig()
 playht_logger = logging.getLogger("input_streaming_playht")
@@ -25,53 +19,48 @@ playht_logger.setLevel(logging.INFO)
 eleven_logger.setLevel(logging.INFO)
 
 TOKEN_OUTPUT_LATENCY = 0.01
+ITERATIONS = 10
 words = ["Hello ", "sir, ", "what ", "can ", "I ", "do ", "for ", "you?"]
+text_length = sum(len(word) for word in words)
 
 
-def playht_text_gen():
-    for word in words:
-        yield word
-        time.sleep(TOKEN_OUTPUT_LATENCY)
-
-
-async def eleven_text_gen():
+async def text_gen():
     for word in words:
         yield word
         await asyncio.sleep(TOKEN_OUTPUT_LATENCY)
 
 
-playht_latency_records: List[LatencyData] = []
-eleven_latency_records: List[InputStreamingLatencyData] = []
-
-for i in range(10):
-    playht_logger.info(f"WebSocket Connection {i + 1}")
-    latency_data = PlayHTSDKBenchmark.run(synthesis_input=playht_text_gen(),
-                                          mode=PlayHTMode.INPUT_STREAMING,
-                                          logger=playht_logger)
-    playht_latency_records.append(latency_data)
-
-play_average_response_generation_time = get_average_of_field_entries(playht_latency_records, "response_generation_time")
-play_average_header_generation_time = get_average_of_field_entries(playht_latency_records, "header_generation_time")
-play_average_first_chunk_generation_time = get_average_of_field_entries(playht_latency_records,
-                                                                        "first_chunk_generation_time")
-
-playht_logger.info(f"Average response generation time: {play_average_response_generation_time:.2f}")
-playht_logger.info(f"Average header generation time: {play_average_header_generation_time:.2f}")
-playht_logger.info(f"Average first chunk generation time: {play_average_first_chunk_generation_time:.2f}")
-
-for i in range(10):
-    eleven_logger.info(f"WebSocket Connection {i + 1}")
-    latency_data = asyncio.run(ElevenLabsBenchmark.run(synthesis_input=eleven_text_gen(),
-                                                       mode=ElevenLabsMode.INPUT_STREAMING,
-                                                       logger=eleven_logger)
-                               )
-    eleven_latency_records.append(latency_data)
-
-eleven_average_stream_generation_time = get_average_of_field_entries(eleven_latency_records, "stream_generation_time")
-eleven_average_first_audio_chunk_generation_time = get_average_of_field_entries(eleven_latency_records,
-                                                                                "first_audio_chunk_generation_time")
-
-eleven_logger.info(f"Average stream generation time: {eleven_average_stream_generation_time:.2f}")
-eleven_logger.info(f"Average first audio chunk generation time: {eleven_average_first_audio_chunk_generation_time:.2f}")
+async def run_input_streaming_connections(name, fields, logger):
+    # Providers come from the registry, so only the SDK of the provider being measured is imported. One event loop
+    # for every utterance, so ElevenLabs hands each one a socket its pool pre-connected in the background.
+    provider = create_provider(name)
+    phase_statistics = PhaseStatistics()
+    # Text chunks that waited in the provider's buffer for more text show up as the slow positions
+    text_chunk_statistics = TextChunkStatistics()
+    statistics = FieldStatistics(fields)
+    results = start_run(RunMetadata.for_provider(provider, mode="input_streaming", text_length=text_length))
+    try:
+        for i in range(ITERATIONS):
+            logger.info(f"WebSocket Connection {i + 1}")
+            latency_data = await provider.synthesize_streaming_input(text_gen(), logger=logger)
+            phase_statistics.record(latency_data)
+            text_chunk_statistics.record(latency_data)
+            statistics.record(latency_data)
+            results.record(latency_data)
+    finally:
+        results.close()
+        await provider.close()
+
+    log_field_statistics(statistics, logger)
+    log_field_statistics(phase_statistics, logger)
+    log_field_statistics(text_chunk_statistics, logger)
+
+
+asyncio.run(run_input_streaming_connections("playht", ["response_generation_time", "header_generation_time",
+                                                       "first_chunk_generation_time", "time_to_first_audio"],
+                                            playht_logger))
+asyncio.run(run_input_streaming_connections("eleven_labs", ["stream_generation_time", "hidden_handshake_time",
+                                                            "first_audio_chunk_generation_time",
+                                                            "time_to_first_audio"], eleven_logger))
 
 print("\nTesting ended")
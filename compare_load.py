@@ -0,0 +1,61 @@
+# Concurrent load sweep across PlayHT, ElevenLabs & OpenAI
+
+import argparse
+import logging
+
+from connection_pool import ConnectionMode
+from load_generator import (
+    DEFAULT_CONCURRENCY_LEVELS,
+    DEFAULT_KNEE_FACTOR,
+    LoadTarget,
+    find_latency_knee,
+    run_sweep,
+)
+from results_store import DEFAULT_RESULTS_PATH
+from utils import format_seconds
+
+logging.basicConfig()
+load_logger = logging.getLogger("load_sweep")
+load_logger.setLevel(logging.INFO)
+
+TEXT = "Hello sir, what can I do for you?"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep concurrency levels against the TTS providers")
+    parser.add_argument("--targets", nargs="+", default=[target.value for target in LoadTarget],
+                        choices=[target.value for target in LoadTarget])
+    parser.add_argument("--levels", nargs="+", type=int, default=DEFAULT_CONCURRENCY_LEVELS)
+    parser.add_argument("--iterations", type=int, default=1, help="Sequential calls made by every session")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (defaults to one per core)")
+    parser.add_argument("--connection-mode", default=ConnectionMode.WARM.value,
+                        choices=[connection_mode.value for connection_mode in ConnectionMode])
+    parser.add_argument("--knee-factor", type=float, default=DEFAULT_KNEE_FACTOR)
+    parser.add_argument("--text", default=TEXT)
+    parser.add_argument("--results-db", default=DEFAULT_RESULTS_PATH,
+                        help="SQLite results store every sample is appended to (empty to disable)")
+    args = parser.parse_args()
+
+    targets = [LoadTarget(target) for target in args.targets]
+    reports = run_sweep(targets=targets, text=args.text, concurrency_levels=args.levels,
+                        iterations=args.iterations, workers=args.workers,
+                        connection_mode=ConnectionMode(args.connection_mode), results_path=args.results_db or None,
+                        logger=load_logger)
+
+    for target in targets:
+        target_reports = [report for report in reports if report.target == target]
+        for report in target_reports:
+            load_logger.info(
+                f"{target.value} concurrency={report.concurrency} run={report.run_id}: "
+                f"{report.throughput:.2f} req/s, {report.completed} ok, {report.errors} failed, "
+                f"time to first audio p50={format_seconds(report.time_to_first_audio.p50)} "
+                f"p90={format_seconds(report.time_to_first_audio.p90)} "
+                f"p99={format_seconds(report.time_to_first_audio.p99)} "
+                f"p99.9={format_seconds(report.time_to_first_audio.p99_9)}"
+            )
+        knee = find_latency_knee(target_reports, factor=args.knee_factor)
+        load_logger.info(f"{target.value} latency knee: {knee if knee is not None else 'not reached'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# Open-loop load: requests arrive at a target rate regardless of completions, latency measured from intended send
+
+import argparse
+import logging
+
+from connection_pool import ConnectionMode
+from load_generator import LoadTarget
+from open_loop import (
+    DEFAULT_DURATION,
+    DEFAULT_RATES,
+    DEFAULT_SATURATION_FACTOR,
+    find_saturation_rate,
+    parse_arrivals,
+    run_rate_sweep,
+)
+from results_store import DEFAULT_RESULTS_PATH
+from utils import format_seconds
+
+logging.basicConfig()
+open_loop_logger = logging.getLogger("open_loop")
+open_loop_logger.setLevel(logging.INFO)
+
+TEXT = "Hello sir, what can I do for you?"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep offered request rates against the TTS providers")
+    parser.add_argument("--targets", nargs="+", default=[target.value for target in LoadTarget],
+                        choices=[target.value for target in LoadTarget])
+    parser.add_argument("--arrivals", default="poisson",
+                        help="Arrival process: constant, poisson or trace:<csv of request timestamps>")
+    parser.add_argument("--rates", nargs="+", type=float, default=DEFAULT_RATES,
+                        help="Offered requests per second; a trace is rescaled to each rate")
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION, help="Seconds of arrivals per rate")
+    parser.add_argument("--warmup", type=int, default=1, help="Closed-loop requests before each rate, not measured")
+    parser.add_argument("--seed", type=int, default=None, help="Seed of the Poisson arrivals")
+    parser.add_argument("--connection-mode", default=ConnectionMode.WARM.value,
+                        choices=[connection_mode.value for connection_mode in ConnectionMode])
+    parser.add_argument("--saturation-factor", type=float, default=DEFAULT_SATURATION_FACTOR)
+    parser.add_argument("--text", default=TEXT)
+    parser.add_argument("--results-db", default=DEFAULT_RESULTS_PATH,
+                        help="SQLite results store every sample is appended to (empty to disable)")
+    args = parser.parse_args()
+
+    targets = [LoadTarget(target) for target in args.targets]
+    reports = run_rate_sweep(targets=targets, arrivals=parse_arrivals(args.arrivals, seed=args.seed), text=args.text,
+                             rates=args.rates, duration=args.duration,
+                             connection_mode=ConnectionMode(args.connection_mode), warmup=args.warmup,
+                             results_path=args.results_db or None, logger=open_loop_logger)
+
+    for target in targets:
+        target_reports = [report for report in reports if report.target == target]
+        for report in target_reports:
+            open_loop_logger.info(
+                f"{target.value} {report.arrivals} run={report.run_id}: offered {report.offered_rate:.2f} req/s, "
+                f"served {report.throughput:.2f} req/s, {report.completed} ok, {report.errors} failed, "
+                f"peak {report.max_in_flight} in flight, "
+                f"time to first audio p50={format_seconds(report.time_to_first_audio.p50)} "
+                f"p99={format_seconds(report.time_to_first_audio.p99)} "
+                f"(service p99={format_seconds(report.service_time_to_first_audio.p99)}, "
+                f"send lag p99={format_seconds(report.send_lag.p99)})"
+            )
+        saturation = find_saturation_rate(target_reports, factor=args.saturation_factor)
+        open_loop_logger.info(f"{target.value} p99 saturates at: "
+                              f"{'not reached' if saturation is None else f'{saturation:.2f} req/s'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+# Client-side overhead on the ElevenLabs websocket hot path: decode micro-benchmarks, then event loop lag and
+# parse/decode cost at rising concurrency against a local stand-in server
+
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import multiprocessing
+import socket
+import time
+import timeit
+
+from client_overhead import (
+    DEFAULT_LAG_INTERVAL,
+    PROFILE_DIR,
+    LoopLagMonitor,
+    disable_profiling,
+    enable_profiling,
+    orjson,
+)
+from connection_pool import ConnectionMode
+from eleven import local_server as eleven_local_server
+from eleven.benchmark_api import ElevenLabsBenchmark
+from latency_model import LATENCY_PRESETS
+from providers import (
+    TTSProvider,
+    create_provider,
+)
+from sinks import (
+    DiscardSink,
+    MemorySink,
+    SinkKind,
+)
+from stand_in import (
+    CHARACTERS_PER_SECOND,
+    DEFAULT_FRAMES_PER_CHUNK,
+    chunk_audio,
+    silent_audio_for_text,
+    start_app,
+)
+from stats import LatencyHistogram, field_value
+from token_source import simulated_token_source
+
+logging.basicConfig()
+overhead_logger = logging.getLogger("client_overhead")
+overhead_logger.setLevel(logging.INFO)
+
+TEXT = ("Hello sir, what can I do for you? I can book a table, check the weather, or read you the latest news. "
+        "Just let me know what you would like and I will take care of it right away.")
+DEFAULT_LEVELS = [1, 16, 64, 256]
+STAND_IN_PORT = 8091
+# Client overhead counts as negligible below this share of a request's time to first audio
+NEGLIGIBLE_SHARE = 0.01
+
+
+def sample_message(frames_per_chunk: int) -> str:
+    # Same shape and size as one ElevenLabs input streaming message: an audio chunk plus its character alignment
+    audio_chunk = chunk_audio(silent_audio_for_text(TEXT), frames_per_chunk=frames_per_chunk)[0]
+    characters = int(len(audio_chunk) / len(silent_audio_for_text(TEXT)) * len(TEXT)) or 1
+    alignment = dict(
+        chars=list(TEXT[:characters]),
+        charStartTimesMs=[i * 1000 // CHARACTERS_PER_SECOND for i in range(characters)],
+        charDurationsMs=[1000 // CHARACTERS_PER_SECOND] * characters,
+    )
+    return json.dumps(dict(audio=base64.b64encode(audio_chunk).decode(), isFinal=None, alignment=alignment,
+                           normalizedAlignment=alignment))
+
+
+def run_micro_benchmarks(frames_per_chunk: int, number: int):
+    message = sample_message(frames_per_chunk)
+    audio = json.loads(message)["audio"]
+    memory_sink = MemorySink()
+    cases = {
+        "json.loads": lambda: json.loads(message),
+        "base64 decode": lambda: base64.b64decode(audio),
+        "DiscardSink.write_base64": lambda: DiscardSink().write_base64(audio),
+        "MemorySink.write_base64": lambda: memory_sink.write_base64(audio),
+    }
+    if orjson is not None:
+        cases["orjson.loads"] = lambda: orjson.loads(message)
+    overhead_logger.info(f"Message of {len(message)} characters carrying {len(audio) * 3 // 4} audio bytes")
+    for name, case in cases.items():
+        # Best of five repeats, the run least disturbed by the rest of the machine
+        per_call = min(timeit.repeat(case, number=number, repeat=5)) / number
+        overhead_logger.info(f"{name}: {per_call * 1e6:.1f}us per message, {1 / per_call:,.0f} messages/s on one core")
+
+
+def _serve_stand_in(port: int, frames_per_chunk: int):
+    async def serve():
+        await start_app(eleven_local_server.create_app(LATENCY_PRESETS["fast"], frames_per_chunk),
+                        host="127.0.0.1", port=port)
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+def start_stand_in(port: int, frames_per_chunk: int) -> multiprocessing.Process:
+    # A process of its own, so the server's CPU time does not land on the client loop being measured
+    process = multiprocessing.Process(target=_serve_stand_in, args=(port, frames_per_chunk), daemon=True)
+    process.start()
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process
+        except OSError:
+            if time.monotonic() > deadline:
+                process.terminate()
+                raise
+            time.sleep(0.05)
+
+
+async def run_level(provider: TTSProvider, concurrency: int, args):
+    tokens = simulated_token_source(args.text)
+    sink_kind = SinkKind(args.sink)
+
+    async def synthesize():
+        sink = MemorySink() if sink_kind == SinkKind.MEMORY else DiscardSink()
+        # Cold, so the size of the pre-connected websocket pool does not cap the level
+        return await provider.synthesize_streaming_input(tokens(), sink=sink, connection_mode=ConnectionMode.COLD,
+                                                         logger=overhead_logger.getChild("requests"))
+
+    async with LoopLagMonitor(args.lag_interval) as monitor:
+        started_at = time.perf_counter()
+        results = await asyncio.gather(*[synthesize() for _ in range(concurrency)], return_exceptions=True)
+        elapsed = time.perf_counter() - started_at
+
+    # Requests that ended without audio have no time to first audio, and no parse and decode time if they failed
+    # before the chunk loop; they count as failed
+    latency_records = [result for result in results if not isinstance(result, BaseException)
+                       and field_value(result, "time_to_first_audio") is not None
+                       and field_value(result, "client_overhead_time") is not None]
+    time_to_first_audio = LatencyHistogram()
+    overhead_share = LatencyHistogram()
+    for latency_data in latency_records:
+        time_to_first_audio.record(latency_data.time_to_first_audio)
+        overhead_share.record(latency_data.client_overhead_time / latency_data.time_to_first_audio)
+    messages = sum(latency_data.messages for latency_data in latency_records)
+    overhead = sum(latency_data.client_overhead_time for latency_data in latency_records)
+    lag = monitor.summary()
+    overhead_logger.info(
+        f"concurrency={concurrency} ({sink_kind.value} sink): {len(latency_records)} ok, "
+        f"{len(results) - len(latency_records)} failed, "
+        f"{messages / elapsed:,.0f} messages/s, parse+decode busy {overhead / elapsed:.1%} of the loop, "
+        f"loop lag p50={(lag.p50 or 0) * 1000:.2f}ms p99={(lag.p99 or 0) * 1000:.2f}ms "
+        f"max={(lag.max or 0) * 1000:.2f}ms, time to first audio p50={time_to_first_audio.percentile(50) or 0:.3f}s, "
+        f"overhead share of it p99={overhead_share.percentile(99) or 0:.2%}"
+    )
+    if latency_records and overhead_share.percentile(99) > NEGLIGIBLE_SHARE:
+        overhead_logger.warning(f"concurrency={concurrency}: client overhead is not negligible, "
+                                f"try orjson or a discard sink")
+
+
+async def run_levels(args):
+    provider = create_provider("eleven_labs")
+    try:
+        for concurrency in args.levels:
+            await run_level(provider, concurrency, args)
+    finally:
+        await provider.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the client's own share of the websocket latency")
+    parser.add_argument("--levels", nargs="+", type=int, default=DEFAULT_LEVELS)
+    parser.add_argument("--text", default=TEXT)
+    # The memory sink decodes every chunk, as a client that plays or stores the audio must; the discard sink only
+    # counts bytes, so it leaves the base64 cost out of the overhead measured
+    parser.add_argument("--sink", default=SinkKind.MEMORY.value,
+                        choices=[SinkKind.DISCARD.value, SinkKind.MEMORY.value])
+    parser.add_argument("--frames-per-chunk", type=int, default=DEFAULT_FRAMES_PER_CHUNK)
+    parser.add_argument("--number", type=int, default=2000, help="Calls per micro-benchmark repeat")
+    parser.add_argument("--lag-interval", type=float, default=DEFAULT_LAG_INTERVAL)
+    parser.add_argument("--base-url", help="Measure against this server instead of a local stand-in")
+    parser.add_argument("--profile", action="store_true",
+                        help=f"Sample the chunk loops' stacks and write them to {PROFILE_DIR}")
+    args = parser.parse_args()
+
+    overhead_logger.info(f"JSON parser: {'orjson' if orjson is not None else 'json (pip install orjson is faster)'}")
+    run_micro_benchmarks(args.frames_per_chunk, args.number)
+
+    stand_in = None
+    if args.base_url:
+        ElevenLabsBenchmark.set_base_url(args.base_url)
+    else:
+        stand_in = start_stand_in(STAND_IN_PORT, args.frames_per_chunk)
+        ElevenLabsBenchmark.set_base_url(f"http://127.0.0.1:{STAND_IN_PORT}")
+    if args.profile:
+        enable_profiling()
+    try:
+        asyncio.run(run_levels(args))
+    finally:
+        if profiler := disable_profiling():
+            for name, path in profiler.export().items():
+                overhead_logger.info(f"{name} chunk loop stacks written to {path}")
+        if stand_in:
+            stand_in.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# LLM tokens to audio, end to end: GPT (or a simulated LLM) feeding PlayHT & ElevenLabs input streaming
+
+import argparse
+import asyncio
+import logging
+
+from connection_pool import ConnectionMode
+from gpt_client import GPT_PROMPT
+from latency_model import LatencyModel
+from pipeline import (
+    PIPELINE_FIELDS,
+    gpt_token_source,
+    run_pipeline,
+)
+from providers import (
+    create_provider,
+    registry,
+)
+from stats import FieldStatistics, PhaseStatistics
+from token_source import (
+    SIMULATED_RESPONSE,
+    simulated_token_source,
+)
+from utils import log_field_statistics
+
+logging.basicConfig()
+pipeline_logger = logging.getLogger("pipeline")
+pipeline_logger.setLevel(logging.INFO)
+
+# Only providers that accept streamed input text can sit behind an LLM
+PROVIDERS = ["eleven_labs", "playht"]
+
+
+async def run_pipelines(provider_names, token_source, iterations, connection_mode):
+    for provider_name in provider_names:
+        provider = create_provider(provider_name)
+        logger = pipeline_logger.getChild(provider_name)
+        statistics = FieldStatistics(PIPELINE_FIELDS)
+        phase_statistics = PhaseStatistics()
+        for i in range(iterations):
+            logger.info(f"Pipeline run {i + 1}")
+            latency_data = await run_pipeline(provider=provider, token_source=token_source,
+                                              connection_mode=connection_mode, logger=logger)
+            statistics.record(latency_data)
+            phase_statistics.record(latency_data)
+        log_field_statistics(statistics, logger)
+        log_field_statistics(phase_statistics, logger)
+        await provider.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure prompt to first audio through an LLM and a TTS provider")
+    parser.add_argument("--providers", nargs="+", default=PROVIDERS, choices=registry.names())
+    parser.add_argument("--llm", default="simulated", choices=["gpt", "simulated"])
+    parser.add_argument("--prompt", default=GPT_PROMPT, help="Prompt sent to GPT")
+    parser.add_argument("--first-token", default="lognormal:0.3,0.3",
+                        help="Simulated time to first token distribution")
+    parser.add_argument("--inter-token", default="constant:0.02", help="Simulated gap between tokens distribution")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--text", default=SIMULATED_RESPONSE, help="Response the simulated LLM streams")
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--connection-mode", default=ConnectionMode.WARM.value,
+                        choices=[connection_mode.value for connection_mode in ConnectionMode])
+    args = parser.parse_args()
+
+    if args.llm == "gpt":
+        token_source = gpt_token_source(prompt=args.prompt)
+    else:
+        latency_model = LatencyModel.from_specs(first_chunk=args.first_token, inter_chunk=args.inter_token,
+                                                seed=args.seed)
+        token_source = simulated_token_source(text=args.text, latency_model=latency_model)
+    asyncio.run(run_pipelines(provider_names=args.providers, token_source=token_source,
+                              iterations=args.iterations, connection_mode=ConnectionMode(args.connection_mode)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# Simulated playback of streamed audio: PlayHT, ElevenLabs & OpenAI behind the same jitter buffer
+
+import argparse
+import asyncio
+import logging
+
+from connection_pool import ConnectionMode
+from playback import (
+    DEFAULT_JITTER_BUFFER,
+    PlaybackSink,
+)
+from providers import (
+    BlockingSdkBridge,
+    create_provider,
+    registry,
+)
+from sinks import create_sink
+from stats import FieldStatistics
+from utils import format_seconds, log_field_statistics
+
+logging.basicConfig()
+playback_logger = logging.getLogger("playback")
+playback_logger.setLevel(logging.INFO)
+
+TEXT = ("Hello sir, what can I do for you? I can book a table, check the weather, or read you the latest news. "
+        "Just let me know what you would like and I will take care of it right away.")
+TOKEN_OUTPUT_LATENCY = 0.01
+PLAYBACK_FIELDS = ["time_to_first_frame", "time_to_first_audible", "real_time_factor", "underruns", "underrun_time",
+                   "min_startup_delay", "min_startup_buffer"]
+
+
+async def text_gen(text):
+    for word in text.split(" "):
+        yield word + " "
+        await asyncio.sleep(TOKEN_OUTPUT_LATENCY)
+
+
+async def simulate_playback(provider, input_streaming, args):
+    logger = playback_logger.getChild(provider.name)
+    statistics = FieldStatistics(PLAYBACK_FIELDS)
+    for i in range(args.iterations):
+        # Every provider streams MP3 by default
+        sink = PlaybackSink(create_sink(f"playback_{provider.name}"), audio_format="mp3",
+                            jitter_buffer=args.jitter_buffer)
+        if input_streaming:
+            await provider.synthesize_streaming_input(text_gen(args.text), sink=sink,
+                                                      connection_mode=ConnectionMode(args.connection_mode))
+        else:
+            await provider.synthesize(args.text, sink=sink, connection_mode=ConnectionMode(args.connection_mode))
+        report = sink.report()
+        logger.info(f"Run {i + 1}: {report.audio_duration:.2f}s of audio in {report.chunks} chunks, "
+                    f"first audible after {format_seconds(report.time_to_first_audible)}s, "
+                    f"{report.underruns} underrun(s)")
+        statistics.record(report)
+    logger.info(f"{'input streaming' if input_streaming else 'streaming'} with a "
+                f"{args.jitter_buffer * 1000:.0f} ms jitter buffer:")
+    log_field_statistics(statistics, logger)
+
+
+async def run_playback(args):
+    bridge = BlockingSdkBridge()
+    for name in args.providers:
+        provider = create_provider(name, bridge=bridge)
+        await simulate_playback(provider, input_streaming=False, args=args)
+        if provider.supports_input_streaming:
+            await simulate_playback(provider, input_streaming=True, args=args)
+        await provider.close()
+    bridge.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate playback of streamed audio behind a jitter buffer")
+    parser.add_argument("--jitter-buffer", type=float, default=DEFAULT_JITTER_BUFFER,
+                        help="Seconds of audio buffered before playback starts or resumes")
+    parser.add_argument("--providers", nargs="+", default=["eleven_labs", "playht", "openai"],
+                        choices=registry.names())
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--text", default=TEXT)
+    parser.add_argument("--connection-mode", default=ConnectionMode.WARM.value,
+                        choices=[connection_mode.value for connection_mode in ConnectionMode])
+    asyncio.run(run_playback(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# Every provider side by side on one event loop: PlayHT, ElevenLabs & OpenAI
+
+import asyncio
+import logging
+
+from providers import (
+    BlockingSdkBridge,
+    create_provider,
+)
+from stats import FieldStatistics, PhaseStatistics
+from utils import log_field_statistics
+
+logging.basicConfig()
+logger = logging.getLogger("compare_providers")
+logger.setLevel(logging.INFO)
+
+TEXT = "Hello sir, what can I do for you?"
+ITERATIONS = 10
+TOKEN_OUTPUT_LATENCY = 0.01
+PROVIDERS = ["eleven_labs", "playht", "openai"]
+
+
+async def text_gen():
+    for word in TEXT.split(" "):
+        yield word + " "
+        await asyncio.sleep(TOKEN_OUTPUT_LATENCY)
+
+
+async def synthesize(provider, input_streaming):
+    provider_logger = logger.getChild(provider.name)
+    if input_streaming:
+        return await provider.synthesize_streaming_input(text_gen(), logger=provider_logger)
+    return await provider.synthesize(TEXT, logger=provider_logger)
+
+
+async def compare_providers(input_streaming):
+    bridge = BlockingSdkBridge()
+    providers = [create_provider(name, bridge=bridge) for name in PROVIDERS]
+    if input_streaming:
+        providers = [provider for provider in providers if provider.supports_input_streaming]
+    statistics = {provider.name: FieldStatistics(["time_to_first_audio"]) for provider in providers}
+    phase_statistics = {provider.name: PhaseStatistics() for provider in providers}
+
+    try:
+        for i in range(ITERATIONS):
+            logger.info(f"{'Input streaming' if input_streaming else 'Streaming'} round {i + 1}")
+            # All providers synthesize concurrently, so they see the same network conditions in every round. A failed
+            # call only drops that provider's sample, the others still finish the round.
+            results = await asyncio.gather(*[synthesize(provider, input_streaming) for provider in providers],
+                                           return_exceptions=True)
+            for provider, latency_data in zip(providers, results):
+                if isinstance(latency_data, BaseException):
+                    logger.warning(f"{provider.name} call failed: {latency_data!r}")
+                    continue
+                statistics[provider.name].record(latency_data)
+                phase_statistics[provider.name].record(latency_data)
+    finally:
+        for provider in providers:
+            await provider.close()
+        bridge.close()
+
+    for provider in providers:
+        logger.info(f"{provider.name}:")
+        log_field_statistics(statistics[provider.name], logger)
+        log_field_statistics(phase_statistics[provider.name], logger)
+
+
+asyncio.run(compare_providers(input_streaming=False))
+asyncio.run(compare_providers(input_streaming=True))
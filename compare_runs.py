@@ -0,0 +1,88 @@
+# Latency regressions between two stored runs, or between a run and a named baseline
+
+import argparse
+import logging
+import sys
+
+from results_store import (
+    DEFAULT_ALPHA,
+    DEFAULT_MIN_EFFECT,
+    DEFAULT_RESULTS_PATH,
+    ResultsStore,
+    compare_runs,
+)
+from utils import format_seconds
+
+logging.basicConfig()
+runs_logger = logging.getLogger("compare_runs")
+runs_logger.setLevel(logging.INFO)
+
+
+def _describe_run(store: ResultsStore, run_id: str) -> str:
+    run = store.run(run_id)
+    if run is None:
+        return f"{run_id} (unknown)"
+    return (f"{run.run_id} {run.provider} {run.mode} concurrency={run.concurrency} rev={run.git_revision} "
+            f"host={run.host}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flag statistically significant latency regressions between runs")
+    parser.add_argument("candidate", nargs="?", help="Run id to check, defaults to the latest run")
+    parser.add_argument("--baseline-run", help="Run id to compare against")
+    parser.add_argument("--baseline", help="Named baseline to compare against")
+    parser.add_argument("--set-baseline", metavar="NAME", help="Store the candidate run as this named baseline")
+    parser.add_argument("--metrics", nargs="+", default=None, help="Metrics to compare, defaults to all shared ones")
+    parser.add_argument("--alpha", type=float, default=DEFAULT_ALPHA, help="Significance level")
+    parser.add_argument("--min-effect", type=float, default=DEFAULT_MIN_EFFECT,
+                        help="Smallest relative rise of the median that counts as a regression")
+    parser.add_argument("--db", default=DEFAULT_RESULTS_PATH)
+    parser.add_argument("--list", action="store_true", help="List the stored runs and exit")
+    args = parser.parse_args()
+
+    store = ResultsStore(args.db)
+    try:
+        if args.list:
+            for run in store.runs():
+                runs_logger.info(_describe_run(store, run.run_id))
+            return 0
+
+        candidate = args.candidate
+        if candidate is None:
+            runs = store.runs()
+            if not runs:
+                runs_logger.error("No runs stored yet")
+                return 2
+            candidate = runs[-1].run_id
+        if args.set_baseline:
+            store.set_baseline(args.set_baseline, candidate)
+            runs_logger.info(f"Baseline {args.set_baseline} set to {_describe_run(store, candidate)}")
+            return 0
+
+        baseline = args.baseline_run or (store.baseline(args.baseline) if args.baseline else None)
+        if baseline is None:
+            runs_logger.error("Pass --baseline-run RUN_ID or the name of a stored --baseline")
+            return 2
+
+        runs_logger.info(f"Baseline:  {_describe_run(store, baseline)}")
+        runs_logger.info(f"Candidate: {_describe_run(store, candidate)}")
+        comparisons = compare_runs(store, baseline_run_id=baseline, candidate_run_id=candidate, metrics=args.metrics,
+                                   alpha=args.alpha, min_effect=args.min_effect)
+        for comparison in comparisons.values():
+            change = "n/a" if comparison.relative_change is None else f"{comparison.relative_change:+.1%}"
+            p_value = "n/a" if comparison.p_value is None else f"{comparison.p_value:.4f}"
+            runs_logger.info(
+                f"{'REGRESSION ' if comparison.regression else ''}{comparison.metric}: "
+                f"p50 {format_seconds(comparison.baseline_p50)} -> {format_seconds(comparison.candidate_p50)} "
+                f"({change}), p90 {format_seconds(comparison.baseline_p90)} -> "
+                f"{format_seconds(comparison.candidate_p90)}, n={comparison.baseline_count}/"
+                f"{comparison.candidate_count}, p={p_value}"
+            )
+        # A non-zero exit status lets CI fail the build on a regression
+        return 1 if any(comparison.regression for comparison in comparisons.values()) else 0
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
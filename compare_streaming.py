@@ -2,23 +2,14 @@
 
 import asyncio
 import logging
-from typing import List
 
-from eleven.benchmark_api import (
-    ElevenLabsBenchmark,
-    ElevenLabsMode,
-    StreamingLatencyData,
+from providers import create_provider
+from results_store import (
+    RunMetadata,
+    start_run,
 )
-from open.benchmark_sdk import (
-    OpenAISDKBenchmark,
-    SynthesisResult,
-)
-from play.benchmark_sdk import (
-    PlayHTSDKBenchmark,
-    PlayHTMode,
-    LatencyData,
-)
-from utils import get_average_of_field_entries
+from stats import FieldStatistics, PhaseStatistics
+from utils import log_field_statistics
 
 logging.basicConfig()
 playht_logger = logging.getLogger("streaming_playht")
@@ -30,50 +21,34 @@ eleven_logger.setLevel(logging.DEBUG)
 openai_logger.setLevel(logging.DEBUG)
 
 TEXT = "Hello sir, what can I do for you?"
-
-eleven_latency_records: List[StreamingLatencyData] = []
-playht_latency_records: List[LatencyData] = []
-openai_results: List[SynthesisResult] = []
-
-for i in range(10):
-    playht_logger.info(f"SDK API Call {i + 1}")
-    latency_data = PlayHTSDKBenchmark.run(synthesis_input=TEXT,
-                                          mode=PlayHTMode.STREAMING,
-                                          logger=playht_logger)
-    playht_latency_records.append(latency_data)
-
-play_average_response_generation_time = get_average_of_field_entries(playht_latency_records, "response_generation_time")
-play_average_header_generation_time = get_average_of_field_entries(playht_latency_records, "header_generation_time")
-play_average_first_chunk_generation_time = get_average_of_field_entries(playht_latency_records,
-                                                                        "first_chunk_generation_time")
-
-playht_logger.info(f"Average response generation time: {play_average_response_generation_time:.2f}")
-playht_logger.info(f"Average header generation time: {play_average_header_generation_time:.2f}")
-playht_logger.info(f"Average first chunk generation time: {play_average_first_chunk_generation_time:.2f}")
-
-for i in range(10):
-    eleven_logger.info(f"API Call {i + 1}")
-    latency_data = asyncio.run(ElevenLabsBenchmark.run(
-        synthesis_input=TEXT,
-        mode=ElevenLabsMode.STREAMING,
-        logger=eleven_logger,
-    ))
-    eleven_latency_records.append(latency_data)
-
-eleven_average_stream_generation_time = get_average_of_field_entries(eleven_latency_records, "stream_generation_time")
-eleven_average_first_chunk_generation_time = get_average_of_field_entries(eleven_latency_records,
-                                                                          "first_chunk_generation_time")
-
-eleven_logger.info(f"Average stream generation time: {eleven_average_stream_generation_time}")
-eleven_logger.info(f"Average first chunk generation time: {eleven_average_first_chunk_generation_time}")
-
-for i in range(10):
-    openai_logger.info(f"SDK API Call {i + 1}")
-    result = OpenAISDKBenchmark.run(text=TEXT, logger=openai_logger)
-    openai_results.append(result)
-
-openai_average_stream_generation_time = get_average_of_field_entries(openai_results, "stream_generation_time")
-openai_average_first_chunk_generation_time = get_average_of_field_entries(openai_results, "first_chunk_generation_time")
-
-openai_logger.info(f"Average stream generation time: {openai_average_stream_generation_time}")
-openai_logger.info(f"Average first chunk generation time: {openai_average_first_chunk_generation_time}")
+ITERATIONS = 10
+
+
+async def run_streaming_calls(name, fields, logger):
+    # Providers come from the registry, so only the SDK of the provider being measured is imported. One event loop
+    # for every call, so pooled sessions keep their connections warm between calls.
+    provider = create_provider(name)
+    phase_statistics = PhaseStatistics()
+    statistics = FieldStatistics(fields)
+    results = start_run(RunMetadata.for_provider(provider, mode="streaming", text_length=len(TEXT)))
+    try:
+        for i in range(ITERATIONS):
+            logger.info(f"API Call {i + 1}")
+            latency_data = await provider.synthesize(TEXT, logger=logger)
+            phase_statistics.record(latency_data)
+            statistics.record(latency_data)
+            results.record(latency_data)
+    finally:
+        results.close()
+        await provider.close()
+
+    log_field_statistics(statistics, logger)
+    log_field_statistics(phase_statistics, logger)
+
+
+asyncio.run(run_streaming_calls("playht", ["response_generation_time", "header_generation_time",
+                                           "first_chunk_generation_time", "time_to_first_audio"], playht_logger))
+asyncio.run(run_streaming_calls("eleven_labs", ["stream_generation_time", "first_chunk_generation_time",
+                                                "time_to_first_audio"], eleven_logger))
+asyncio.run(run_streaming_calls("openai", ["stream_generation_time", "first_chunk_generation_time",
+                                           "time_to_first_audio"], openai_logger))
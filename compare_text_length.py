@@ -0,0 +1,77 @@
+# Latency against text length: sweeps a generated corpus from one word to several paragraphs and fits fixed overhead
+# plus per-character cost for every provider and mode
+
+import argparse
+import logging
+from itertools import combinations
+
+from connection_pool import ConnectionMode
+from corpus import (
+    DEFAULT_BUCKETS,
+    DEFAULT_SEED,
+    PUNCTUATION_DENSITIES,
+    generate_corpus,
+)
+from providers import registry
+from results_store import DEFAULT_RESULTS_PATH
+from scenario import ScenarioMode
+from text_length import (
+    DEFAULT_MODELS_PATH,
+    run_length_sweep,
+    save_length_models,
+)
+
+logging.basicConfig()
+length_logger = logging.getLogger("text_length")
+length_logger.setLevel(logging.INFO)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit latency against text length for the TTS providers")
+    parser.add_argument("--providers", nargs="+", default=["eleven_labs", "playht", "openai"],
+                        choices=registry.names())
+    parser.add_argument("--modes", nargs="+", default=[mode.value for mode in ScenarioMode],
+                        choices=[mode.value for mode in ScenarioMode])
+    parser.add_argument("--buckets", nargs="+", type=int, default=DEFAULT_BUCKETS,
+                        help="Target text lengths in characters")
+    parser.add_argument("--punctuation", nargs="+", default=list(PUNCTUATION_DENSITIES),
+                        choices=list(PUNCTUATION_DENSITIES))
+    parser.add_argument("--samples", type=int, default=1, help="Texts generated per length and punctuation density")
+    parser.add_argument("--iterations", type=int, default=3, help="Passes over the corpus")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--connection-mode", default=ConnectionMode.WARM.value,
+                        choices=[connection_mode.value for connection_mode in ConnectionMode])
+    parser.add_argument("--models", default=DEFAULT_MODELS_PATH, help="JSON file the fitted models are written to")
+    parser.add_argument("--results-db", default=DEFAULT_RESULTS_PATH,
+                        help="SQLite results store every sample is appended to (empty to disable)")
+    parser.add_argument("--dry-run", action="store_true", help="Print the corpus and exit")
+    args = parser.parse_args()
+
+    corpus = generate_corpus(buckets=args.buckets, densities=args.punctuation, samples=args.samples, seed=args.seed)
+    if args.dry_run:
+        for entry in corpus:
+            length_logger.info(f"{entry.id} ({entry.characters} characters): {entry.text[:80]!r}")
+        return
+
+    models = run_length_sweep(providers=args.providers, corpus=corpus,
+                              modes=[ScenarioMode(mode) for mode in args.modes], iterations=args.iterations,
+                              connection_mode=ConnectionMode(args.connection_mode),
+                              results_path=args.results_db or None, seed=args.seed, logger=length_logger)
+    for model in models:
+        r_squared = "n/a" if model.r_squared is None else f"{model.r_squared:.2f}"
+        length_logger.info(
+            f"{model.provider} {model.mode.value} {model.field}: {model.fixed:.4f} + "
+            f"{model.per_character * 1000:.4f} per 1000 characters (R^2={r_squared}, n={model.samples}, "
+            f"{model.min_characters}-{model.max_characters} characters)"
+        )
+    # Where one provider overtakes another is where routing by text length pays off
+    for model, other in combinations([model for model in models if model.field == "time_to_first_audio"], 2):
+        if model.mode == other.mode and (characters := model.crossover(other)) is not None:
+            length_logger.info(f"{model.mode.value} time to first audio: {model.provider} and {other.provider} "
+                               f"swap order at {characters:.0f} characters")
+    save_length_models(models, args.models)
+    length_logger.info(f"{len(models)} models written to {args.models}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# Per-chunk arrival timelines: sustained throughput, inter-arrival gaps and stalls for PlayHT, ElevenLabs & OpenAI
+
+import argparse
+import asyncio
+import logging
+import os
+
+from connection_pool import ConnectionMode
+from providers import (
+    BlockingSdkBridge,
+    create_provider,
+    registry,
+)
+from stats import FieldStatistics
+from timeline import DEFAULT_STALL_THRESHOLD
+from utils import log_field_statistics
+
+logging.basicConfig()
+timeline_logger = logging.getLogger("timelines")
+timeline_logger.setLevel(logging.INFO)
+
+TEXT = ("Hello sir, what can I do for you? I can book a table, check the weather, or read you the latest news. "
+        "Just let me know what you would like and I will take care of it right away.")
+TIMELINE_DIR = os.path.join("benchmark_output", "timelines")
+GAP_FIELDS = ["first_chunk_at", "gap_p50", "gap_p90", "gap_p99", "gap_max", "stalls", "stall_time"]
+
+
+async def record_timelines(provider, args):
+    logger = timeline_logger.getChild(provider.name)
+    gap_statistics = FieldStatistics(GAP_FIELDS)
+    # Throughput is bytes per second, far outside the range of a latency histogram
+    throughput_statistics = FieldStatistics(["bytes_per_second"], resolution=1, highest_trackable_value=10 ** 9)
+    for i in range(args.iterations):
+        latency_data = await provider.synthesize(args.text, connection_mode=ConnectionMode(args.connection_mode))
+        summary = latency_data.timeline.summary(stall_threshold=args.stall_threshold)
+        logger.info(f"Run {i + 1}: {summary.total_bytes} bytes in {summary.chunks} chunks, "
+                    f"{(summary.bytes_per_second or 0) / 1000:.1f} kB/s sustained, {summary.stalls} stall(s)")
+        gap_statistics.record(summary)
+        throughput_statistics.record(summary)
+        if args.export:
+            latency_data.timeline.export(os.path.join(TIMELINE_DIR, f"{provider.name}_{i + 1}.csv"))
+    log_field_statistics(gap_statistics, logger)
+    log_field_statistics(throughput_statistics, logger)
+
+
+async def run_timelines(args):
+    if args.export:
+        os.makedirs(TIMELINE_DIR, exist_ok=True)
+    bridge = BlockingSdkBridge()
+    for name in args.providers:
+        provider = create_provider(name, bridge=bridge)
+        await record_timelines(provider, args)
+        await provider.close()
+    bridge.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record per-chunk arrival timelines and find providers that trickle")
+    parser.add_argument("--stall-threshold", type=float, default=DEFAULT_STALL_THRESHOLD,
+                        help="Inter-arrival gap in seconds above which a gap counts as a stall")
+    parser.add_argument("--providers", nargs="+", default=["eleven_labs", "playht", "openai"],
+                        choices=registry.names())
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--text", default=TEXT)
+    parser.add_argument("--connection-mode", default=ConnectionMode.WARM.value,
+                        choices=[connection_mode.value for connection_mode in ConnectionMode])
+    parser.add_argument("--export", action="store_true",
+                        help=f"Write every run's timeline as CSV to {TIMELINE_DIR}")
+    asyncio.run(run_timelines(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
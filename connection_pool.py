@@ -0,0 +1,22 @@
+import importlib.util
+from enum import Enum
+
+from pydantic import BaseModel
+
+
+class ConnectionMode(Enum):
+    # COLD opens a fresh client per synthesis, WARM reuses the provider's shared, kept-alive pool
+    COLD = "cold"
+    WARM = "warm"
+
+
+class PoolSettings(BaseModel):
+    limit: int = 100
+    limit_per_host: int = 32
+    keepalive_timeout: float = 60.0
+    dns_cache_ttl: int = 300
+    http2: bool = True
+
+
+def http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
@@ -0,0 +1,90 @@
+import random
+from typing import Dict, List, Optional, Sequence
+
+from pydantic import BaseModel
+
+DEFAULT_BUCKETS = [10, 50, 200, 1000, 5000]
+# Chance that a word is followed by punctuation; a third of those end the sentence
+PUNCTUATION_DENSITIES: Dict[str, float] = {
+    "sparse": 0.03,
+    "normal": 0.1,
+    "dense": 0.25,
+}
+DEFAULT_SEED = 0
+PARAGRAPH_LENGTH = 600
+
+_WORDS = (
+    "the a an your our this that every some table weather news order flight booking reservation message meeting "
+    "call reminder account payment delivery ticket question answer moment minute hour day week morning evening "
+    "tomorrow today tonight please thanks sure certainly right away now later soon again also only just still "
+    "book check read send cancel change confirm find call remind tell show help start stop move update pay "
+    "is was will can could would should might have has had be been do does did let make take give keep "
+    "and or but so if when while because before after with without for from into about over under between "
+    "new late early next last first second quick short long simple clear good great fine happy busy free open"
+).split()
+_CLAUSE_MARKS = (",", ",", ";", ":", " -")
+_SENTENCE_MARKS = (".", ".", ".", "?", "!")
+
+
+class CorpusEntry(BaseModel):
+    id: str
+    # The length the entry was generated for; the text stops at the first word boundary past it
+    bucket: int
+    punctuation: str
+    text: str
+
+    @property
+    def characters(self) -> int:
+        return len(self.text)
+
+
+def generate_text(length: int, punctuation_density: float, rng: random.Random) -> str:
+    # Sentences of the fixed vocabulary, with clause and sentence punctuation at `punctuation_density` and a paragraph
+    # break every PARAGRAPH_LENGTH characters, so longer entries look like multi-paragraph replies
+    parts = []
+    characters = 0
+    paragraph_characters = 0
+    start_of_sentence = True
+    while characters < length:
+        if parts:
+            separator = " "
+            if start_of_sentence and paragraph_characters >= PARAGRAPH_LENGTH:
+                separator = "\n\n"
+                paragraph_characters = 0
+            parts.append(separator)
+            characters += len(separator)
+        word = rng.choice(_WORDS)
+        if start_of_sentence:
+            word = word.capitalize()
+            start_of_sentence = False
+        if rng.random() < punctuation_density:
+            if rng.random() < 1 / 3:
+                word += rng.choice(_SENTENCE_MARKS)
+                start_of_sentence = True
+            else:
+                word += rng.choice(_CLAUSE_MARKS)
+        parts.append(word)
+        characters += len(word)
+        paragraph_characters += len(word) + 1
+    text = "".join(parts).rstrip(",;:- ")
+    return text if text[-1] in ".?!" else text + "."
+
+
+def generate_corpus(buckets: Optional[Sequence[int]] = None, densities: Optional[Sequence[str]] = None,
+                    samples: int = 1, seed: int = DEFAULT_SEED) -> List[CorpusEntry]:
+    # Deterministic: every entry has its own generator seeded from its position in the corpus, so adding buckets or
+    # samples never changes the entries that were already there
+    buckets = buckets or DEFAULT_BUCKETS
+    densities = densities or list(PUNCTUATION_DENSITIES)
+    corpus = []
+    for bucket in buckets:
+        for density in densities:
+            if density not in PUNCTUATION_DENSITIES:
+                raise ValueError(f"Unknown punctuation density {density!r}, "
+                                 f"expected one of {', '.join(PUNCTUATION_DENSITIES)}")
+            for sample in range(samples):
+                entry_id = f"{bucket}-{density}-{sample}"
+                rng = random.Random(f"{seed}:{entry_id}")
+                corpus.append(CorpusEntry(id=entry_id, bucket=bucket, punctuation=density,
+                                          text=generate_text(bucket, PUNCTUATION_DENSITIES[density], rng)))
+    return corpus
@@ -1,20 +1,80 @@
 import asyncio
-import base64
+import functools
 import json
 import logging
 import os
 import time
+import weakref
 from enum import Enum
-from typing import Optional, AsyncGenerator
+from typing import Dict, List, Optional, AsyncGenerator
 
 import aiohttp
 import websockets
 from pydantic import BaseModel
 
+from client_overhead import (
+    chunk_loop_profile,
+    json_loads,
+)
+from connection_pool import (
+    ConnectionMode,
+    PoolSettings,
+)
 from eleven.config import (
-    VOICE_ID
+    BASE_URL,
+    MODEL_ID,
+    VOICE_ID,
+)
+from eleven.tracing import (
+    aiohttp_trace_config,
+    connect_websocket,
+)
+from eleven.websocket_pool import (
+    DEFAULT_POOL_SIZE,
+    WebSocketPool,
+)
+from session_trace import (
+    FrameKind,
+    start_capture,
+)
+from sinks import (
+    AudioSink,
+    create_sink,
+)
+from timeline import (
+    ChunkTimeline,
+    TextChunkLog,
+)
+from tracing import (
+    SPAN_FIRST_BYTE,
+    SPAN_POOL_ACQUIRE,
+    SPAN_STREAM,
+    RequestTrace,
+    Span,
 )
 
+DEFAULT_CHUNK_LENGTH_SCHEDULE = [50]
+
+
+def _websocket_endpoint(base_url: str, voice_id: str = VOICE_ID) -> str:
+    return f"{base_url.replace('http', 'ws', 1)}/v1/text-to-speech/{voice_id}/stream-input"
+
+
+def _stream_endpoint(base_url: str, voice_id: str = VOICE_ID) -> str:
+    return f"{base_url}/v1/text-to-speech/{voice_id}/stream"
+
+
+def _bos_message(chunk_length_schedule: List[int]) -> str:
+    return json.dumps(
+        dict(
+            text=" ",
+            try_trigger_generation=True,
+            generation_config=dict(
+                chunk_length_schedule=chunk_length_schedule,
+            ),
+        )
+    )
+
 
 class ElevenLabsMode(Enum):
     STREAMING = "eleven_labs_streaming"
@@ -22,147 +82,340 @@ class ElevenLabsMode(Enum):
 
 
 class InputStreamingLatencyData(BaseModel):
+    connection_mode: Optional[ConnectionMode] = None
     stream_generation_time: Optional[float] = None
+    # Handshake paid in the background by the pre-connected socket a warm utterance was handed
+    hidden_handshake_time: Optional[float] = None
     first_text_chunk_sent_timestamp: Optional[float] = None
     first_audio_chunk_received_timestamp: Optional[float] = None
+    audio_bytes: Optional[int] = None
+    # Client CPU time on the receive loop: messages received, JSON parsing, and base64 decoding into the sink
+    messages: Optional[int] = None
+    parse_time: Optional[float] = None
+    decode_time: Optional[float] = None
+    spans: List[Span] = []
+    timeline: Optional[ChunkTimeline] = None
+    text_chunks: Optional[TextChunkLog] = None
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    @property
+    def client_overhead_time(self):
+        return self.parse_time + self.decode_time
 
     @property
     def first_audio_chunk_generation_time(self):
         return self.first_audio_chunk_received_timestamp - self.first_text_chunk_sent_timestamp
 
+    @property
+    def time_to_first_audio(self):
+        return self.stream_generation_time + self.first_audio_chunk_generation_time
+
 
 class StreamingLatencyData(BaseModel):
+    connection_mode: Optional[ConnectionMode] = None
     stream_generation_time: Optional[float] = None
     first_chunk_generation_time: Optional[float] = None
+    audio_bytes: Optional[int] = None
+    spans: List[Span] = []
+    timeline: Optional[ChunkTimeline] = None
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    @property
+    def time_to_first_audio(self):
+        return self.stream_generation_time + self.first_chunk_generation_time
 
 
 class ElevenLabsBenchmark:
     logger = logging.getLogger("eleven_labs_api_benchmark")
     logger.setLevel(logging.DEBUG)
-    websocket_endpoint = f"wss://api.elevenlabs.io/v1/text-to-speech/{VOICE_ID}/stream-input"
-    stream_endpoint = f"https://api.elevenlabs.io/v1/text-to-speech/{VOICE_ID}/stream"
+    base_url = os.environ.get("ELEVEN_LABS_BASE_URL", BASE_URL).rstrip("/")
+    voice_id = VOICE_ID
+    websocket_endpoint = _websocket_endpoint(base_url, voice_id)
+    stream_endpoint = _stream_endpoint(base_url, voice_id)
 
-    BOS = json.dumps(
-        dict(
-            text=" ",
-            try_trigger_generation=True,
-            generation_config=dict(
-                chunk_length_schedule=[50],
-            ),
-        )
-    )
+    chunk_length_schedule = DEFAULT_CHUNK_LENGTH_SCHEDULE
+    BOS = _bos_message(chunk_length_schedule)
     EOS = json.dumps(dict(text=""))
 
+    pool_settings = PoolSettings()
+    websocket_pool_size = DEFAULT_POOL_SIZE
+    # aiohttp sessions and websockets are bound to the event loop that created them, so warm pools are kept per loop
+    _pooled_sessions = weakref.WeakKeyDictionary()
+    _websocket_pools = weakref.WeakKeyDictionary()
+
+    @staticmethod
+    def set_base_url(base_url: str):
+        base_url = base_url.rstrip("/")
+        ElevenLabsBenchmark.base_url = base_url
+        ElevenLabsBenchmark.websocket_endpoint = _websocket_endpoint(base_url, ElevenLabsBenchmark.voice_id)
+        ElevenLabsBenchmark.stream_endpoint = _stream_endpoint(base_url, ElevenLabsBenchmark.voice_id)
+
+    @staticmethod
+    def set_voice(voice_id: str):
+        # The voice is part of the websocket URL, so sockets already waiting in a websocket pool keep the voice they
+        # were opened with until close_pool()
+        ElevenLabsBenchmark.voice_id = voice_id
+        ElevenLabsBenchmark.websocket_endpoint = _websocket_endpoint(ElevenLabsBenchmark.base_url, voice_id)
+        ElevenLabsBenchmark.stream_endpoint = _stream_endpoint(ElevenLabsBenchmark.base_url, voice_id)
+
+    @staticmethod
+    def set_chunk_length_schedule(chunk_length_schedule: List[int]):
+        # The default for runs that do not pass a schedule of their own; websocket pools are kept per BOS message, so
+        # sockets opened with another schedule are never handed to these runs
+        ElevenLabsBenchmark.chunk_length_schedule = chunk_length_schedule
+        ElevenLabsBenchmark.BOS = _bos_message(chunk_length_schedule)
+
+    @staticmethod
+    def _create_session() -> aiohttp.ClientSession:
+        # aiohttp speaks HTTP/1.1 only, so pool_settings.http2 does not apply here
+        pool_settings = ElevenLabsBenchmark.pool_settings
+        connector = aiohttp.TCPConnector(
+            limit=pool_settings.limit,
+            limit_per_host=pool_settings.limit_per_host,
+            keepalive_timeout=pool_settings.keepalive_timeout,
+            ttl_dns_cache=pool_settings.dns_cache_ttl,
+        )
+        return aiohttp.ClientSession(connector=connector, trace_configs=[aiohttp_trace_config()])
+
+    @staticmethod
+    def _pooled_session() -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        session = ElevenLabsBenchmark._pooled_sessions.get(loop)
+        if session is None or session.closed:
+            session = ElevenLabsBenchmark._create_session()
+            ElevenLabsBenchmark._pooled_sessions[loop] = session
+        return session
+
+    @staticmethod
+    def _websocket_pool(bos: str) -> WebSocketPool:
+        # One pool per BOS message, since the chunk length schedule sent with it is fixed for the socket's lifetime
+        websocket_pools: Dict[str, WebSocketPool] = ElevenLabsBenchmark._websocket_pools.setdefault(
+            asyncio.get_running_loop(), {})
+        websocket_pool = websocket_pools.get(bos)
+        if websocket_pool is None:
+            open_websocket = functools.partial(ElevenLabsBenchmark._open_websocket, bos=bos)
+            websocket_pool = WebSocketPool(open_websocket=open_websocket, size=ElevenLabsBenchmark.websocket_pool_size)
+            websocket_pool.start()
+            websocket_pools[bos] = websocket_pool
+        return websocket_pool
+
+    @staticmethod
+    async def close_pool():
+        loop = asyncio.get_running_loop()
+        if session := ElevenLabsBenchmark._pooled_sessions.pop(loop, None):
+            await session.close()
+        for websocket_pool in ElevenLabsBenchmark._websocket_pools.pop(loop, {}).values():
+            await websocket_pool.close()
+
+    @staticmethod
+    async def _open_websocket(trace: Optional[RequestTrace] = None,
+                              bos: Optional[str] = None) -> websockets.WebSocketClientProtocol:
+        websocket = await connect_websocket(
+            ElevenLabsBenchmark.websocket_endpoint,
+            trace=trace or RequestTrace(),
+            extra_headers={"xi-api-key": os.environ.get("ELEVEN_LABS_API_KEY")},
+        )
+        ElevenLabsBenchmark.logger.debug("WebSocket connection established")
+        await websocket.send(bos or ElevenLabsBenchmark.BOS)
+        ElevenLabsBenchmark.logger.debug("BOS message sent")
+        return websocket
+
     @staticmethod
     async def _send_text_chunks(text_chunk_gen: AsyncGenerator, websocket: websockets.WebSocketClientProtocol,
-                                latency_data: InputStreamingLatencyData, logger):
+                                latency_data: InputStreamingLatencyData, trace: RequestTrace, logger):
         logger.debug("Starting to send text chunks to websocket...")
         async for text_chunk in text_chunk_gen:
             chunk_data = dict(text=text_chunk, try_trigger_generation=True)
             await websocket.send(json.dumps(chunk_data))
-            latency_data.first_text_chunk_sent_timestamp = time.time()
+            sent_at = time.perf_counter()
+            latency_data.text_chunks.record(text_chunk, sent_at=sent_at)
+            if trace.capture:
+                trace.capture.record(FrameKind.TEXT_SENT, text_chunk)
+            if latency_data.first_text_chunk_sent_timestamp is None:
+                latency_data.first_text_chunk_sent_timestamp = sent_at
+                trace.start(SPAN_FIRST_BYTE)
             logger.debug(f"Sent {text_chunk} to websocket")
         await websocket.send(ElevenLabsBenchmark.EOS)
         logger.debug("All text chunks sent to websocket, EOS message sent")
 
     @staticmethod
-    async def _create_live_speech(text_chunk_gen, latency_data: InputStreamingLatencyData, logger):
-        connection_start_time = time.time()
-        async with websockets.connect(
-                ElevenLabsBenchmark.websocket_endpoint,
-                extra_headers={"xi-api-key": os.environ.get("ELEVEN_LABS_API_KEY")},
-        ) as websocket:
-            connection_end_time = time.time()
-            latency_data.stream_generation_time = connection_end_time - connection_start_time
-            ElevenLabsBenchmark.logger.debug("WebSocket connection established")
-            await websocket.send(ElevenLabsBenchmark.BOS)
-            logger.debug("BOS message sent")
-
-            asyncio.create_task(ElevenLabsBenchmark._send_text_chunks(
-                text_chunk_gen=text_chunk_gen,
-                latency_data=latency_data,
-                websocket=websocket,
-                logger=logger,
-            ))
+    async def _create_live_speech(text_chunk_gen, latency_data: InputStreamingLatencyData, sink: AudioSink,
+                                  trace: RequestTrace, logger, bos: str):
+        connection_start_time = time.perf_counter()
+        if latency_data.connection_mode == ConnectionMode.WARM:
+            with trace.span(SPAN_POOL_ACQUIRE):
+                pooled_websocket = await ElevenLabsBenchmark._websocket_pool(bos).acquire()
+            websocket = pooled_websocket.websocket
+            latency_data.hidden_handshake_time = pooled_websocket.handshake_time
+            logger.debug("Pre-connected websocket acquired, BOS already sent")
+        else:
+            websocket = await ElevenLabsBenchmark._open_websocket(trace=trace, bos=bos)
+        connection_end_time = time.perf_counter()
+        latency_data.stream_generation_time = connection_end_time - connection_start_time
 
+        # Kept, so a failed send is raised here rather than lost with the task
+        sender = asyncio.create_task(ElevenLabsBenchmark._send_text_chunks(
+            text_chunk_gen=text_chunk_gen,
+            latency_data=latency_data,
+            websocket=websocket,
+            trace=trace,
+            logger=logger,
+        ))
+        try:
             is_first_chunk = True
-            audio_chunks = []
+            messages = 0
+            parse_ns = 0
+            decode_ns = 0
             while True:
                 try:
-                    message = json.loads(await websocket.recv())
+                    raw_message = await websocket.recv()
+                    # Stamped before parsing, so the client's own decoding is not mistaken for the provider's latency
+                    arrived_at = time.perf_counter()
+                    if trace.capture:
+                        trace.capture.record(FrameKind.WEBSOCKET_MESSAGE, raw_message)
+                    parse_started_ns = time.perf_counter_ns()
+                    message = json_loads(raw_message)
+                    parse_ns += time.perf_counter_ns() - parse_started_ns
+                    messages += 1
                     if audio := message.get("audio"):
                         logger.debug("Audio data received")
                         if is_first_chunk:
-                            first_audio_chunk_received_timestamp = time.time()
+                            first_audio_chunk_received_timestamp = arrived_at
+                            trace.end(SPAN_FIRST_BYTE)
+                            trace.start(SPAN_STREAM)
                             latency_data.first_audio_chunk_received_timestamp = first_audio_chunk_received_timestamp
                             time_to_first_byte = first_audio_chunk_received_timestamp - latency_data.first_text_chunk_sent_timestamp
                             logger.debug(f"Time to first audio byte: {time_to_first_byte:.2f}")
                             is_first_chunk = False
-                        audio_chunks.append(base64.b64decode(audio))
+                        bytes_written = sink.bytes_written
+                        decode_started_ns = time.perf_counter_ns()
+                        sink.write_base64(audio)
+                        decode_ns += time.perf_counter_ns() - decode_started_ns
+                        # The characters this chunk speaks, which match it back to the text chunks that produced it
+                        alignment = message.get("alignment") or {}
+                        trace.timeline.record(sink.bytes_written - bytes_written, arrived_at=arrived_at,
+                                              characters=len(alignment.get("chars") or ()))
                 except websockets.exceptions.ConnectionClosedOK:
+                    trace.end(SPAN_STREAM)
                     logger.debug("WebSocket connection closed")
                     break
-            return audio_chunks
+                if sender.done() and not sender.cancelled() and sender.exception():
+                    raise sender.exception()
+            await sender
+            latency_data.messages = messages
+            latency_data.parse_time = parse_ns / 1e9
+            latency_data.decode_time = decode_ns / 1e9
+        finally:
+            sender.cancel()
+            await websocket.close()
 
     @staticmethod
-    async def _create_speech(text, latency_data: StreamingLatencyData, logger):
+    async def _create_speech(session: aiohttp.ClientSession, text, latency_data: StreamingLatencyData,
+                             trace: RequestTrace, logger) -> aiohttp.ClientResponse:
         headers = {
             "xi-api-key": os.environ.get("ELEVEN_LABS_API_KEY"),
         }
         body = {
             "text": text,
-            "model_id": "eleven_turbo_v2",
+            "model_id": MODEL_ID,
         }
 
-        async with aiohttp.ClientSession() as session:
-            start_time = time.time()
-            response = await session.request(
-                "POST",
-                ElevenLabsBenchmark.stream_endpoint,
-                json=body,
-                headers=headers,
-            )
-            end_time = time.time()
+        if trace.capture:
+            trace.capture.record(FrameKind.REQUEST, json.dumps(body))
+        start_time = time.perf_counter()
+        response = await session.request(
+            "POST",
+            ElevenLabsBenchmark.stream_endpoint,
+            json=body,
+            headers=headers,
+            trace_request_ctx=trace,
+        )
+        end_time = time.perf_counter()
 
         if not response.ok:
+            response.release()
             raise Exception(f"ElevenLabs API returned {response.status} status code")
 
         stream_generation_time = end_time - start_time
         latency_data.stream_generation_time = stream_generation_time
 
         logger.debug(f"Stream generation time: {end_time - start_time:.2f}")
-        return response.content.iter_any()
+        return response
+
+    @staticmethod
+    async def _stream_speech(session: aiohttp.ClientSession, text, latency_data: StreamingLatencyData,
+                             sink: AudioSink, trace: RequestTrace, logger):
+        response = await ElevenLabsBenchmark._create_speech(session=session, text=text, latency_data=latency_data,
+                                                            trace=trace, logger=logger)
+        is_first_chunk = True
+        first_chunk_generation_start = time.perf_counter()
+        trace.start(SPAN_FIRST_BYTE)
+        try:
+            async for audio_chunk in response.content.iter_any():
+                if is_first_chunk:
+                    first_chunk_generation_end = time.perf_counter()
+                    trace.end(SPAN_FIRST_BYTE)
+                    trace.start(SPAN_STREAM)
+                    first_chunk_generation_time = first_chunk_generation_end - first_chunk_generation_start
+                    latency_data.first_chunk_generation_time = first_chunk_generation_time
+                    is_first_chunk = False
+                    logger.debug(f"Time to first audio byte: {first_chunk_generation_time:.2f}")
+                trace.timeline.record(len(audio_chunk))
+                if trace.capture:
+                    trace.capture.record(FrameKind.BODY_CHUNK, audio_chunk)
+                sink.write(audio_chunk)
+        except BaseException:
+            # An abandoned stream, such as the losing side of a hedged request, cannot go back to the pool half read
+            response.close()
+            raise
+        trace.end(SPAN_STREAM)
+        # The body has been read in full, so releasing hands the connection back to the pool for keep-alive reuse
+        response.release()
 
     @staticmethod
-    async def run(synthesis_input, mode=ElevenLabsMode.STREAMING, logger=None):
+    async def run(synthesis_input, mode=ElevenLabsMode.STREAMING, logger=None,
+                  connection_mode=ConnectionMode.WARM, sink: Optional[AudioSink] = None,
+                  chunk_length_schedule: Optional[List[int]] = None):
         if not logger:
             logger = ElevenLabsBenchmark.logger
+        if not sink:
+            sink = create_sink("eleven_api_benchmark")
 
-        if mode == ElevenLabsMode.INPUT_STREAMING:
-            latency_data = InputStreamingLatencyData()
-            audio_chunks = await ElevenLabsBenchmark._create_live_speech(text_chunk_gen=synthesis_input,
-                                                                         latency_data=latency_data, logger=logger)
-            with open("eleven_api_benchmark.mp3", "wb") as f:
-                for audio_chunk in audio_chunks:
-                    f.write(audio_chunk)
+        trace = RequestTrace()
+        trace.capture = start_capture("eleven_labs",
+                                      "input_streaming" if mode == ElevenLabsMode.INPUT_STREAMING else "streaming",
+                                      connection_mode=connection_mode)
+        with sink, chunk_loop_profile("eleven_labs"):
+            if mode == ElevenLabsMode.INPUT_STREAMING:
+                latency_data = InputStreamingLatencyData(connection_mode=connection_mode, text_chunks=TextChunkLog())
+                bos = _bos_message(chunk_length_schedule) if chunk_length_schedule else ElevenLabsBenchmark.BOS
+                await ElevenLabsBenchmark._create_live_speech(text_chunk_gen=synthesis_input,
+                                                              latency_data=latency_data, sink=sink, trace=trace,
+                                                              logger=logger, bos=bos)
 
-        else:
-            latency_data = StreamingLatencyData()
-            audio_chunks = await ElevenLabsBenchmark._create_speech(text=synthesis_input, latency_data=latency_data,
-                                                                    logger=logger)
-            with open("eleven_api_benchmark.mp3", "wb") as f:
-                is_first_chunk = True
-                first_chunk_generation_start = time.time()
-                async for audio_chunk in audio_chunks:
-                    print("yay")
-                    if is_first_chunk:
-                        first_chunk_generation_end = time.time()
-                        first_chunk_generation_time = first_chunk_generation_end - first_chunk_generation_start
-                        latency_data.first_chunk_generation_time = first_chunk_generation_time
-                        is_first_chunk = False
-                        logger.debug(f"Time to first audio byte: {first_chunk_generation_time:.2f}")
-                    f.write(audio_chunk)
-
-        logger.info("Audio chunks written to file")
+            else:
+                latency_data = StreamingLatencyData(connection_mode=connection_mode)
+                if connection_mode == ConnectionMode.WARM:
+                    session = ElevenLabsBenchmark._pooled_session()
+                else:
+                    session = ElevenLabsBenchmark._create_session()
+                try:
+                    await ElevenLabsBenchmark._stream_speech(session=session, text=synthesis_input,
+                                                             latency_data=latency_data, sink=sink, trace=trace,
+                                                             logger=logger)
+                finally:
+                    if connection_mode == ConnectionMode.COLD:
+                        await session.close()
+
+        latency_data.audio_bytes = sink.bytes_written
+        latency_data.spans = trace.finish()
+        latency_data.timeline = trace.timeline
+        if trace.capture:
+            trace.capture.close()
+        logger.info(f"{sink.bytes_written} audio bytes written to {type(sink).__name__}")
 
         return latency_data
@@ -1,32 +1,73 @@
 import logging
+import os
 import time
+from typing import List, Optional
 
 import elevenlabs
+from pydantic import BaseModel
 
-from eleven.config import (
-    ELEVEN_LABS_API_KEY
+from client_overhead import chunk_loop_profile
+from eleven.config import MODEL_ID
+from sinks import (
+    AudioSink,
+    create_sink,
 )
+from timeline import ChunkTimeline
+from tracing import (
+    RequestTrace,
+    Span,
+)
+
+
+class SdkLatencyData(BaseModel):
+    first_chunk_generation_time: Optional[float] = None
+    audio_bytes: Optional[int] = None
+    spans: List[Span] = []
+    timeline: Optional[ChunkTimeline] = None
+
+    class Config:
+        arbitrary_types_allowed = True
 
-elevenlabs.set_api_key(ELEVEN_LABS_API_KEY)
+    @property
+    def time_to_first_audio(self):
+        return self.first_chunk_generation_time
 
 
 class ElevenLabsSdkBenchmark:
     logger = logging.getLogger("eleven_labs_sdk_benchmark")
     logger.setLevel(logging.DEBUG)
+    # None keeps the SDK's default voice
+    voice: Optional[str] = None
 
     @staticmethod
-    def run(text_chunk_gen, logger=None):
+    def run(text_chunk_gen, logger=None, sink: Optional[AudioSink] = None):
         if not logger:
             logger = ElevenLabsSdkBenchmark.logger
+        if not sink:
+            sink = create_sink("eleven_sdk_benchmark")
+        latency_data = SdkLatencyData()
+        # The SDK only sends the request once the stream is iterated, so the clock starts before the call
+        start = time.perf_counter()
+        trace = RequestTrace()
+        # The key is passed per call like the API benchmark does, so importing this module needs no credentials
         stream = elevenlabs.generate(
             text=text_chunk_gen,
-            model="eleven_turbo_v2",
+            api_key=os.environ.get("ELEVEN_LABS_API_KEY"),
+            model=MODEL_ID,
             stream=True,
+            **({"voice": ElevenLabsSdkBenchmark.voice} if ElevenLabsSdkBenchmark.voice else {}),
         )
         is_first_chunk = True
-        start = time.time()
-        for audio_chunk in stream:
-            if is_first_chunk:
-                logger.info(f"Time for first byte: {time.time() - start}")
-                is_first_chunk = False
-            logger.debug("Audio data received")
+        with sink, chunk_loop_profile("eleven_labs_sdk"):
+            for audio_chunk in stream:
+                if is_first_chunk:
+                    latency_data.first_chunk_generation_time = time.perf_counter() - start
+                    logger.info(f"Time for first byte: {latency_data.first_chunk_generation_time}")
+                    is_first_chunk = False
+                logger.debug("Audio data received")
+                trace.timeline.record(len(audio_chunk))
+                sink.write(audio_chunk)
+        latency_data.audio_bytes = sink.bytes_written
+        latency_data.spans = trace.finish()
+        latency_data.timeline = trace.timeline
+        return latency_data
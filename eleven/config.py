@@ -1 +1,3 @@
 VOICE_ID = "pNInz6obpgDQGcFmaJgB"
+MODEL_ID = "eleven_turbo_v2"
+BASE_URL = "https://api.elevenlabs.io"
@@ -0,0 +1,165 @@
+import asyncio
+import base64
+import json
+from typing import List, Optional
+
+from aiohttp import WSMsgType, web
+
+from latency_model import (
+    LATENCY_PRESETS,
+    LatencyModel,
+)
+from session_trace import (
+    SessionLibrary,
+    SessionTrace,
+    replay_frames,
+)
+from stand_in import (
+    CHARACTERS_PER_SECOND,
+    DEFAULT_FRAMES_PER_CHUNK,
+    chunk_audio,
+    silent_audio_for_text,
+    start_app,
+    stream_audio_response,
+    stream_replay_response,
+)
+
+DEFAULT_PORT = 8081
+DEFAULT_CHUNK_LENGTH_SCHEDULE = [50]
+
+
+def _alignment(text: str, start_index: int, end_index: int):
+    char_duration_ms = int(1000 / CHARACTERS_PER_SECOND)
+    return dict(
+        chars=list(text[start_index:end_index]),
+        charStartTimesMs=[i * char_duration_ms for i in range(start_index, end_index)],
+        charDurationsMs=[char_duration_ms] * (end_index - start_index),
+    )
+
+
+async def _generate_audio(websocket: web.WebSocketResponse, text_segments: asyncio.Queue,
+                          latency_model: LatencyModel, frames_per_chunk: int):
+    while (segment := await text_segments.get()) is not None:
+        await asyncio.sleep(latency_model.first_chunk_delay())
+        audio_chunks = chunk_audio(silent_audio_for_text(segment), frames_per_chunk=frames_per_chunk)
+        for i, audio_chunk in enumerate(audio_chunks):
+            if i:
+                await asyncio.sleep(latency_model.inter_chunk_delay())
+            # Spread the segment's characters over its audio chunks, like the alignment the real API returns
+            start_index = round(i * len(segment) / len(audio_chunks))
+            end_index = round((i + 1) * len(segment) / len(audio_chunks))
+            alignment = _alignment(segment, start_index, end_index)
+            await websocket.send_json(dict(
+                audio=base64.b64encode(audio_chunk).decode(),
+                isFinal=None,
+                alignment=alignment,
+                normalizedAlignment=alignment,
+            ))
+    await websocket.send_json(dict(isFinal=True))
+
+
+async def _send_recorded_messages(websocket: web.WebSocketResponse, trace: SessionTrace, speed: float):
+    async for frame in replay_frames(trace, speed):
+        await websocket.send_str(frame.payload.decode())
+
+
+async def _replay_stream_input(websocket: web.WebSocketResponse, trace: SessionTrace,
+                               speed: float) -> web.WebSocketResponse:
+    # The recorded clock started at the first text chunk, so replay starts at the first message after BOS and the
+    # socket stays open until EOS, like the real API
+    replay_task = None
+    async for websocket_message in websocket:
+        if websocket_message.type != WSMsgType.TEXT:
+            continue
+        message = json.loads(websocket_message.data)
+        if replay_task is None and "generation_config" not in message:
+            replay_task = asyncio.create_task(_send_recorded_messages(websocket, trace, speed))
+        if message.get("text", "") == "":
+            break
+    if replay_task:
+        await replay_task
+    await websocket.close()
+    return websocket
+
+
+async def _stream_input(request: web.Request) -> web.WebSocketResponse:
+    latency_model: LatencyModel = request.app["latency_model"]
+    replay: Optional[SessionLibrary] = request.app["replay"]
+    if replay:
+        # Looked up before the handshake, so a library without such sessions refuses the upgrade with a 404
+        try:
+            trace = replay.next("eleven_labs", "input_streaming")
+        except LookupError as e:
+            raise web.HTTPNotFound(text=str(e))
+        websocket = web.WebSocketResponse()
+        await websocket.prepare(request)
+        return await _replay_stream_input(websocket, trace, speed=request.app["replay_speed"])
+    await asyncio.sleep(latency_model.handshake_delay())
+    websocket = web.WebSocketResponse()
+    await websocket.prepare(request)
+
+    text_segments = asyncio.Queue()
+    generation_task = asyncio.create_task(_generate_audio(
+        websocket=websocket,
+        text_segments=text_segments,
+        latency_model=latency_model,
+        frames_per_chunk=request.app["frames_per_chunk"],
+    ))
+
+    chunk_length_schedule: List[int] = DEFAULT_CHUNK_LENGTH_SCHEDULE
+    generations = 0
+    text_buffer = ""
+    async for websocket_message in websocket:
+        if websocket_message.type != WSMsgType.TEXT:
+            continue
+        message = json.loads(websocket_message.data)
+        if generation_config := message.get("generation_config"):
+            chunk_length_schedule = generation_config.get("chunk_length_schedule") or chunk_length_schedule
+        text = message.get("text", "")
+        if text == "":
+            if text_buffer.strip():
+                await text_segments.put(text_buffer)
+            break
+        text_buffer += text
+        threshold = chunk_length_schedule[min(generations, len(chunk_length_schedule) - 1)]
+        if message.get("flush") or (message.get("try_trigger_generation") and len(text_buffer) >= threshold):
+            await text_segments.put(text_buffer)
+            text_buffer = ""
+            generations += 1
+
+    await text_segments.put(None)
+    await generation_task
+    await websocket.close()
+    return websocket
+
+
+async def _stream(request: web.Request) -> web.StreamResponse:
+    body = await request.json()
+    if replay := request.app["replay"]:
+        try:
+            trace = replay.next("eleven_labs", "streaming")
+        except LookupError as e:
+            raise web.HTTPNotFound(text=str(e))
+        return await stream_replay_response(request, trace, speed=request.app["replay_speed"])
+    return await stream_audio_response(request, text=body["text"], latency_model=request.app["latency_model"],
+                                       frames_per_chunk=request.app["frames_per_chunk"])
+
+
+def create_app(latency_model: LatencyModel = None, frames_per_chunk: int = DEFAULT_FRAMES_PER_CHUNK,
+               replay: Optional[SessionLibrary] = None, replay_speed: float = 1.0):
+    # With `replay`, recorded sessions are served in place of generated audio and the latency model is unused
+    app = web.Application()
+    app["latency_model"] = latency_model or LATENCY_PRESETS["instant"]
+    app["frames_per_chunk"] = frames_per_chunk
+    app["replay"] = replay
+    app["replay_speed"] = replay_speed
+    app.router.add_post("/v1/text-to-speech/{voice_id}/stream", _stream)
+    app.router.add_get("/v1/text-to-speech/{voice_id}/stream-input", _stream_input)
+    return app
+
+
+async def start_server(host: str = "127.0.0.1", port: int = DEFAULT_PORT, latency_model: LatencyModel = None,
+                       frames_per_chunk: int = DEFAULT_FRAMES_PER_CHUNK, replay: Optional[SessionLibrary] = None,
+                       replay_speed: float = 1.0) -> web.AppRunner:
+    return await start_app(create_app(latency_model, frames_per_chunk, replay=replay, replay_speed=replay_speed),
+                           host=host, port=port)
@@ -0,0 +1,44 @@
+from typing import AsyncIterator, List, Optional
+
+from connection_pool import ConnectionMode
+from eleven.config import (
+    MODEL_ID,
+    VOICE_ID,
+)
+from eleven.benchmark_api import (
+    ElevenLabsBenchmark,
+    ElevenLabsMode,
+)
+from providers import BlockingSdkBridge
+from sinks import AudioSink
+
+
+class ElevenLabsApiProvider:
+    name = "eleven_labs"
+    supports_input_streaming = True
+    voice = VOICE_ID
+    model = MODEL_ID
+
+    # The websocket and HTTP clients are asyncio native, so `bridge` is only accepted to share the constructor of
+    # the SDK providers
+    def __init__(self, bridge: Optional[BlockingSdkBridge] = None, chunk_length_schedule: Optional[List[int]] = None):
+        # Kept per provider and sent with each run's BOS, so providers with different schedules can run side by side
+        self.chunk_length_schedule = chunk_length_schedule
+
+    def set_voice(self, voice: str):
+        ElevenLabsBenchmark.set_voice(voice)
+        self.voice = voice
+
+    async def synthesize(self, text: str, sink: Optional[AudioSink] = None,
+                         connection_mode: ConnectionMode = ConnectionMode.WARM, logger=None):
+        return await ElevenLabsBenchmark.run(synthesis_input=text, mode=ElevenLabsMode.STREAMING, logger=logger,
+                                             connection_mode=connection_mode, sink=sink)
+
+    async def synthesize_streaming_input(self, text_chunks: AsyncIterator[str], sink: Optional[AudioSink] = None,
+                                         connection_mode: ConnectionMode = ConnectionMode.WARM, logger=None):
+        return await ElevenLabsBenchmark.run(synthesis_input=text_chunks, mode=ElevenLabsMode.INPUT_STREAMING,
+                                             logger=logger, connection_mode=connection_mode, sink=sink,
+                                             chunk_length_schedule=self.chunk_length_schedule)
+
+    async def close(self):
+        await ElevenLabsBenchmark.close_pool()
@@ -0,0 +1,33 @@
+from typing import AsyncIterator, Optional
+
+from connection_pool import ConnectionMode
+from eleven.benchmark_sdk import ElevenLabsSdkBenchmark
+from eleven.config import MODEL_ID
+from providers import BlockingSdkProvider
+from sinks import (
+    AudioSink,
+    create_sink,
+)
+
+
+class ElevenLabsSdkProvider(BlockingSdkProvider):
+    # The SDK manages its own HTTP and websocket connections, so the connection mode is not applied
+    name = "eleven_labs_sdk"
+    supports_input_streaming = True
+    # The SDK picks its default voice
+    voice = None
+    model = MODEL_ID
+
+    def set_voice(self, voice: str):
+        ElevenLabsSdkBenchmark.voice = voice
+        self.voice = voice
+
+    async def synthesize(self, text: str, sink: Optional[AudioSink] = None,
+                         connection_mode: ConnectionMode = ConnectionMode.WARM, logger=None):
+        return await self.bridge.run(ElevenLabsSdkBenchmark.run, sink=sink or create_sink("eleven_sdk_benchmark"),
+                                     text_chunk_gen=text, logger=logger)
+
+    async def synthesize_streaming_input(self, text_chunks: AsyncIterator[str], sink: Optional[AudioSink] = None,
+                                         connection_mode: ConnectionMode = ConnectionMode.WARM, logger=None):
+        return await self.bridge.run(ElevenLabsSdkBenchmark.run, sink=sink or create_sink("eleven_sdk_benchmark"),
+                                     text_chunk_gen=self.bridge.text_chunks(text_chunks), logger=logger)
@@ -0,0 +1,99 @@
+import asyncio
+import socket
+from urllib.parse import urlparse
+
+import aiohttp
+import websockets
+
+from tracing import (
+    MARK_CONNECTION_REUSED,
+    SPAN_CONNECT,
+    SPAN_DNS,
+    SPAN_HANDSHAKE,
+    SPAN_REQUEST,
+    SPAN_SERVER,
+    RequestTrace,
+)
+
+
+def _trace_of(trace_config_ctx) -> RequestTrace:
+    return trace_config_ctx.trace_request_ctx
+
+
+async def _on_dns_resolvehost_start(session, trace_config_ctx, params):
+    if trace := _trace_of(trace_config_ctx):
+        trace.start(SPAN_DNS)
+
+
+async def _on_dns_resolvehost_end(session, trace_config_ctx, params):
+    if trace := _trace_of(trace_config_ctx):
+        trace.end(SPAN_DNS)
+
+
+async def _on_connection_create_start(session, trace_config_ctx, params):
+    if trace := _trace_of(trace_config_ctx):
+        trace.start(SPAN_CONNECT)
+
+
+async def _on_connection_create_end(session, trace_config_ctx, params):
+    if trace := _trace_of(trace_config_ctx):
+        trace.end(SPAN_CONNECT)
+
+
+async def _on_connection_reuseconn(session, trace_config_ctx, params):
+    if trace := _trace_of(trace_config_ctx):
+        trace.mark(MARK_CONNECTION_REUSED)
+
+
+async def _on_request_start(session, trace_config_ctx, params):
+    if trace := _trace_of(trace_config_ctx):
+        trace.start(SPAN_REQUEST)
+
+
+async def _on_request_headers_sent(session, trace_config_ctx, params):
+    if trace := _trace_of(trace_config_ctx):
+        trace.end(SPAN_REQUEST)
+        trace.start(SPAN_SERVER)
+
+
+async def _on_request_end(session, trace_config_ctx, params):
+    if trace := _trace_of(trace_config_ctx):
+        trace.end(SPAN_SERVER)
+
+
+def aiohttp_trace_config() -> aiohttp.TraceConfig:
+    # aiohttp opens the TLS session inside connection creation, so "connect" covers TCP and TLS for https URLs.
+    # The trace is handed to each request through `trace_request_ctx`.
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_dns_resolvehost_start.append(_on_dns_resolvehost_start)
+    trace_config.on_dns_resolvehost_end.append(_on_dns_resolvehost_end)
+    trace_config.on_connection_create_start.append(_on_connection_create_start)
+    trace_config.on_connection_create_end.append(_on_connection_create_end)
+    trace_config.on_connection_reuseconn.append(_on_connection_reuseconn)
+    trace_config.on_request_start.append(_on_request_start)
+    trace_config.on_request_headers_sent.append(_on_request_headers_sent)
+    trace_config.on_request_end.append(_on_request_end)
+    return trace_config
+
+
+async def connect_websocket(uri: str, trace: RequestTrace, **kwargs) -> websockets.WebSocketClientProtocol:
+    # Resolve and connect the socket ourselves so DNS and TCP are timed apart from the TLS and upgrade handshake
+    parsed_uri = urlparse(uri)
+    port = parsed_uri.port or (443 if parsed_uri.scheme == "wss" else 80)
+    loop = asyncio.get_running_loop()
+
+    with trace.span(SPAN_DNS):
+        addresses = await loop.getaddrinfo(parsed_uri.hostname, port, type=socket.SOCK_STREAM)
+    family, socket_type, proto, _, address = addresses[0]
+
+    with trace.span(SPAN_CONNECT):
+        sock = socket.socket(family, socket_type, proto)
+        sock.setblocking(False)
+        try:
+            await loop.sock_connect(sock, address)
+        except OSError:
+            sock.close()
+            raise
+
+    with trace.span(SPAN_HANDSHAKE):
+        return await websockets.connect(uri, sock=sock, **kwargs)
@@ -0,0 +1,131 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Set, Union
+
+import websockets
+
+DEFAULT_POOL_SIZE = 4
+# ElevenLabs closes input streaming sockets after 20 seconds without text, so pooled sockets are recycled before that
+DEFAULT_IDLE_TIMEOUT = 18.0
+# Longest an utterance waits for a pre-connected socket before it is recorded as failed
+DEFAULT_ACQUIRE_TIMEOUT = 10.0
+RETRY_DELAY = 1.0
+
+
+class PooledWebSocket:
+
+    def __init__(self, websocket: websockets.WebSocketClientProtocol, handshake_time: float):
+        self.websocket = websocket
+        self.handshake_time = handshake_time
+        self.ready_at = time.perf_counter()
+        # Set once the socket leaves the pool, either handed to an utterance or recycled
+        self.retired = False
+
+    def is_usable(self, idle_timeout: float) -> bool:
+        return self.websocket.open and time.perf_counter() - self.ready_at < idle_timeout
+
+
+class PreconnectFailure:
+    # Queued in place of a socket when pre-connecting fails, so utterances waiting on the pool fail instead of hanging
+
+    def __init__(self, error: Exception):
+        self.error = error
+        self.failed_at = time.perf_counter()
+
+
+class WebSocketPool:
+    # Keeps `size` sockets connected with BOS already sent, hands one to each utterance and replaces it in the
+    # background, so utterances only pay the handshake when the pool has run dry
+
+    def __init__(self, open_websocket: Callable[[], Awaitable[websockets.WebSocketClientProtocol]],
+                 size: int = DEFAULT_POOL_SIZE, idle_timeout: float = DEFAULT_IDLE_TIMEOUT, logger=None):
+        self.open_websocket = open_websocket
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.logger = logger or logging.getLogger("eleven_labs_websocket_pool")
+        self._ready: asyncio.Queue = asyncio.Queue()
+        self._tasks: Set[asyncio.Task] = set()
+        self._closed = False
+        self._waiting = 0
+        self._connected_at = 0.0
+
+    def _spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def start(self):
+        for _ in range(self.size):
+            self._spawn(self._replenish())
+
+    async def _replenish(self):
+        while not self._closed:
+            connection_start_time = time.perf_counter()
+            try:
+                websocket = await self.open_websocket()
+            except Exception as e:
+                # Caught broadly: a replenish task that dies leaves the pool a socket short for the rest of the run
+                self.logger.warning(f"Could not pre-connect websocket: {e!r}")
+                if self._waiting:
+                    self._ready.put_nowait(PreconnectFailure(e))
+                await asyncio.sleep(RETRY_DELAY)
+                continue
+            pooled_websocket = PooledWebSocket(websocket, handshake_time=time.perf_counter() - connection_start_time)
+            self._connected_at = pooled_websocket.ready_at
+            if self._closed:
+                await websocket.close()
+                return
+            self._ready.put_nowait(pooled_websocket)
+            self._spawn(self._expire(pooled_websocket))
+            return
+
+    async def _expire(self, pooled_websocket: PooledWebSocket):
+        await asyncio.sleep(self.idle_timeout)
+        self._retire(pooled_websocket)
+
+    def _retire(self, pooled_websocket: PooledWebSocket):
+        if pooled_websocket.retired or self._closed:
+            return
+        pooled_websocket.retired = True
+        self.logger.debug("Recycling idle or server-closed pre-connected websocket")
+        self._spawn(self._replace(pooled_websocket))
+
+    async def _replace(self, pooled_websocket: PooledWebSocket):
+        await pooled_websocket.websocket.close()
+        await self._replenish()
+
+    async def acquire(self, timeout: float = DEFAULT_ACQUIRE_TIMEOUT) -> PooledWebSocket:
+        deadline = time.perf_counter() + timeout
+        while True:
+            self._waiting += 1
+            try:
+                pooled_websocket: Union[PooledWebSocket, PreconnectFailure] = await asyncio.wait_for(
+                    self._ready.get(), timeout=max(0.0, deadline - time.perf_counter()))
+            except asyncio.TimeoutError:
+                raise ConnectionError(f"No pre-connected websocket ready within {timeout:.1f}s") from None
+            finally:
+                self._waiting -= 1
+            if isinstance(pooled_websocket, PreconnectFailure):
+                # A failure older than the last socket connected is stale, the endpoint has come back since
+                if pooled_websocket.failed_at < self._connected_at:
+                    continue
+                raise ConnectionError("Could not pre-connect websocket") from pooled_websocket.error
+            if pooled_websocket.retired:
+                continue
+            if not pooled_websocket.is_usable(self.idle_timeout):
+                self._retire(pooled_websocket)
+                continue
+            pooled_websocket.retired = True
+            self._spawn(self._replenish())
+            return pooled_websocket
+
+    async def close(self):
+        self._closed = True
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        while not self._ready.empty():
+            pooled_websocket = self._ready.get_nowait()
+            if isinstance(pooled_websocket, PooledWebSocket) and not pooled_websocket.retired:
+                await pooled_websocket.websocket.close()
@@ -1,33 +1,55 @@
 import logging
 import os
 import time
+from typing import TYPE_CHECKING, Optional
 
-from openai import AsyncOpenAI, OpenAI
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
 
 GPT_PROMPT = "Tell me about life in 30 words."
-async_client = AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+GPT_MODEL = "gpt-3.5-turbo"
 logger = logging.getLogger("openai_gpt")
 logger.setLevel(logging.DEBUG)
 
+# Imported and created on first use, so importing this module needs neither the OpenAI SDK nor an API key (e.g. when
+# the LLM is simulated)
+_async_client: Optional["AsyncOpenAI"] = None
+_client: Optional["OpenAI"] = None
 
-async def get_gpt_response_stream_async(logger=logger):
+
+def get_async_client() -> "AsyncOpenAI":
+    global _async_client
+    if _async_client is None:
+        from openai import AsyncOpenAI
+        _async_client = AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+    return _async_client
+
+
+def get_client() -> "OpenAI":
+    global _client
+    if _client is None:
+        from openai import OpenAI
+        _client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+    return _client
+
+
+async def get_gpt_response_stream_async(logger=logger, prompt=GPT_PROMPT):
     messages = [
-        {"role": "user", "content": GPT_PROMPT},
+        {"role": "user", "content": prompt},
     ]
-    stream = await async_client.chat.completions.create(model="gpt-3.5-turbo", messages=messages, stream=True)
+    stream = await get_async_client().chat.completions.create(model=GPT_MODEL, messages=messages, stream=True)
     logger.debug("Received GPT response stream")
     async for chunk in stream:
         if text_chunk := chunk.choices[0].delta.content:
             yield text_chunk
 
 
-def get_gpt_response_stream(logger=logger):
+def get_gpt_response_stream(logger=logger, prompt=GPT_PROMPT):
     messages = [
-        {"role": "user", "content": GPT_PROMPT},
+        {"role": "user", "content": prompt},
     ]
     start = time.time()
-    stream = client.chat.completions.create(model="gpt-3.5-turbo", messages=messages, stream=True)
+    stream = get_client().chat.completions.create(model=GPT_MODEL, messages=messages, stream=True)
     logger.debug(f"Received GPT response stream in {time.time() - start:.2f}")
     start_time = time.time()
     is_first_chunk = True
@@ -40,11 +62,11 @@ def get_gpt_response_stream(logger=logger):
             start_time = time.time()
 
 
-def get_gpt_response_text(logger=logger):
+def get_gpt_response_text(logger=logger, prompt=GPT_PROMPT):
     messages = [
-        {"role": "user", "content": GPT_PROMPT},
+        {"role": "user", "content": prompt},
     ]
     start = time.time()
-    response = client.chat.completions.create(model="gpt-3.5-turbo", messages=messages)
+    response = get_client().chat.completions.create(model=GPT_MODEL, messages=messages)
     logger.debug(f"Received GPT response in {time.time() - start:.2f}")
     return response.choices[0].message.content
@@ -0,0 +1,220 @@
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from connection_pool import ConnectionMode
+from providers import TTSProvider
+from sinks import (
+    AudioSink,
+    create_sink,
+)
+from timeline import ChunkTimeline
+from tracing import Span
+
+DEFAULT_HEDGE_DELAY = 0.3
+
+Attempt = Callable[[AudioSink], Awaitable]
+
+
+class HedgeLost(Exception):
+    pass
+
+
+class HedgedLatencyData(BaseModel):
+    provider: str
+    connection_mode: Optional[ConnectionMode] = None
+    hedge_delay: Optional[float] = None
+    # "primary" or "hedge"
+    winner: Optional[str] = None
+    # Requests actually sent: 1 when the primary delivered audio before the hedge delay ran out, 2 otherwise
+    requests: int = 1
+    time_to_first_audio: Optional[float] = None
+    audio_bytes: Optional[int] = None
+    spans: List[Span] = []
+    timeline: Optional[ChunkTimeline] = None
+
+    class Config:
+        arbitrary_types_allowed = True
+
+
+class _RaceSink(AudioSink):
+    # One per attempt: the first attempt to write audio wins and is passed through to the caller's sink, every later
+    # write from the other attempts raises so their provider code unwinds
+
+    def __init__(self, race: "_Race", attempt: int):
+        super().__init__()
+        self.race = race
+        self.attempt = attempt
+
+    def write(self, chunk: bytes):
+        if self.race.winner is None:
+            self.race.win(self.attempt)
+        if self.race.winner != self.attempt:
+            raise HedgeLost()
+        self.bytes_written += len(chunk)
+        self.race.sink.write(chunk)
+
+    def close(self):
+        if self.race.winner == self.attempt:
+            self.race.sink.close()
+
+
+class _Race:
+
+    def __init__(self, sink: AudioSink):
+        self.sink = sink
+        self.winner: Optional[int] = None
+        self.first_audio_at: Optional[float] = None
+        self.first_audio = asyncio.Event()
+
+    def win(self, attempt: int):
+        self.winner = attempt
+        self.first_audio_at = time.perf_counter()
+        self.first_audio.set()
+
+
+def _tee(text_chunks: AsyncIterator[str], count: int) -> List[AsyncIterator[str]]:
+    # Streamed input text can only be read once. One task reads it for every attempt, so cancelling the losing
+    # attempt never closes the source, and each attempt replays what has arrived so far before following it: a hedge
+    # sent late catches up at once.
+    received: List[str] = []
+    changed = asyncio.Condition()
+    state = {"reader": None, "done": False, "error": None}
+
+    async def read():
+        try:
+            async for text_chunk in text_chunks:
+                received.append(text_chunk)
+                async with changed:
+                    changed.notify_all()
+        except Exception as e:
+            state["error"] = e
+        state["done"] = True
+        async with changed:
+            changed.notify_all()
+
+    async def follow():
+        if state["reader"] is None:
+            state["reader"] = asyncio.create_task(read())
+        position = 0
+        while True:
+            async with changed:
+                await changed.wait_for(lambda: position < len(received) or state["done"])
+            if position < len(received):
+                yield received[position]
+                position += 1
+            elif state["error"]:
+                raise state["error"]
+            else:
+                return
+
+    return [follow() for _ in range(count)]
+
+
+class HedgedProvider:
+    # Sends the request to `primary` and, unless it has delivered audio within `hedge_delay` seconds, the same
+    # request to `hedge` as well; whichever stream delivers its first chunk first is kept and the other is
+    # cancelled. `hedge` defaults to the primary itself, which hedges across connections; a delay of 0 races both
+    # and None never hedges, which times the unhedged baseline the same way.
+
+    def __init__(self, primary: TTSProvider, hedge: Optional[TTSProvider] = None,
+                 hedge_delay: Optional[float] = DEFAULT_HEDGE_DELAY,
+                 hedge_connection_mode: Optional[ConnectionMode] = None):
+        self.primary = primary
+        self.hedge = hedge or primary
+        self.hedge_delay = hedge_delay
+        self.hedge_connection_mode = hedge_connection_mode
+        self.name = primary.name if self.hedge is primary else f"{primary.name}|{self.hedge.name}"
+        self.supports_input_streaming = primary.supports_input_streaming and self.hedge.supports_input_streaming
+        self.voice = primary.voice
+        self.model = primary.model
+
+    def set_voice(self, voice: str):
+        self.primary.set_voice(voice)
+        self.voice = voice
+
+    async def _race(self, primary: Attempt, hedge: Attempt, sink: AudioSink, connection_mode: ConnectionMode,
+                    logger) -> HedgedLatencyData:
+        race = _Race(sink)
+        started_at = time.perf_counter()
+        tasks: Dict[int, asyncio.Task] = {0: asyncio.create_task(primary(_RaceSink(race, 0)))}
+        first_audio = asyncio.create_task(race.first_audio.wait())
+        try:
+            # The hedge goes out once the delay has passed without audio, or straight away if the primary failed
+            await asyncio.wait([tasks[0], first_audio], timeout=self.hedge_delay,
+                               return_when=asyncio.FIRST_COMPLETED)
+            if race.winner is None and self.hedge_delay is not None:
+                logger.debug(f"Hedging {self.name} after {time.perf_counter() - started_at:.3f}s")
+                tasks[1] = asyncio.create_task(hedge(_RaceSink(race, 1)))
+            pending = set(tasks.values())
+            while race.winner is None and pending:
+                done, pending = await asyncio.wait(pending | {first_audio}, return_when=asyncio.FIRST_COMPLETED)
+                pending.discard(first_audio)
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            raise
+        finally:
+            first_audio.cancel()
+        for attempt, task in tasks.items():
+            if attempt != race.winner:
+                task.cancel()
+        results = await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+        if race.winner is None:
+            # Neither attempt produced audio: report the primary's outcome as if it had not been hedged
+            if isinstance(results[0], BaseException):
+                raise results[0]
+            winner_result = results[0]
+        else:
+            winner_result = results[race.winner]
+            if isinstance(winner_result, BaseException):
+                raise winner_result
+        return HedgedLatencyData(
+            provider=self.name,
+            connection_mode=connection_mode,
+            hedge_delay=self.hedge_delay,
+            winner=None if race.winner is None else ("primary", "hedge")[race.winner],
+            requests=len(tasks),
+            time_to_first_audio=race.first_audio_at - started_at if race.first_audio_at else None,
+            audio_bytes=sink.bytes_written,
+            spans=getattr(winner_result, "spans", []),
+            timeline=getattr(winner_result, "timeline", None),
+        )
+
+    async def synthesize(self, text: str, sink: Optional[AudioSink] = None,
+                         connection_mode: ConnectionMode = ConnectionMode.WARM, logger=None):
+        if not logger:
+            logger = logging.getLogger("hedging")
+        sink = sink or create_sink(f"hedged_{self.name}")
+        hedge_connection_mode = self.hedge_connection_mode or connection_mode
+        return await self._race(
+            primary=lambda race_sink: self.primary.synthesize(text, sink=race_sink, connection_mode=connection_mode,
+                                                              logger=logger),
+            hedge=lambda race_sink: self.hedge.synthesize(text, sink=race_sink, connection_mode=hedge_connection_mode,
+                                                          logger=logger),
+            sink=sink, connection_mode=connection_mode, logger=logger,
+        )
+
+    async def synthesize_streaming_input(self, text_chunks: AsyncIterator[str], sink: Optional[AudioSink] = None,
+                                         connection_mode: ConnectionMode = ConnectionMode.WARM, logger=None):
+        if not logger:
+            logger = logging.getLogger("hedging")
+        sink = sink or create_sink(f"hedged_{self.name}")
+        hedge_connection_mode = self.hedge_connection_mode or connection_mode
+        primary_text, hedge_text = _tee(text_chunks, 2)
+        return await self._race(
+            primary=lambda race_sink: self.primary.synthesize_streaming_input(
+                primary_text, sink=race_sink, connection_mode=connection_mode, logger=logger),
+            hedge=lambda race_sink: self.hedge.synthesize_streaming_input(
+                hedge_text, sink=race_sink, connection_mode=hedge_connection_mode, logger=logger),
+            sink=sink, connection_mode=connection_mode, logger=logger,
+        )
+
+    async def close(self):
+        await self.primary.close()
+        if self.hedge is not self.primary:
+            await self.hedge.close()
@@ -0,0 +1,120 @@
+import math
+import random
+from typing import Dict, Optional
+
+# Delay distributions for the stand-in servers and the simulated LLM, kept free of server dependencies so a run that
+# only simulates tokens does not need aiohttp
+
+
+class Distribution:
+
+    def sample(self, rng: random.Random) -> float:
+        raise NotImplementedError
+
+
+class Constant(Distribution):
+
+    def __init__(self, value: float = 0.0):
+        self.value = value
+
+    def sample(self, rng: random.Random) -> float:
+        return self.value
+
+
+class Uniform(Distribution):
+
+    def __init__(self, low: float, high: float):
+        self.low = low
+        self.high = high
+
+    def sample(self, rng: random.Random) -> float:
+        return rng.uniform(self.low, self.high)
+
+
+class Normal(Distribution):
+
+    def __init__(self, mean: float, stddev: float):
+        self.mean = mean
+        self.stddev = stddev
+
+    def sample(self, rng: random.Random) -> float:
+        return rng.gauss(self.mean, self.stddev)
+
+
+class LogNormal(Distribution):
+
+    def __init__(self, median: float, sigma: float):
+        self.median = median
+        self.sigma = sigma
+
+    def sample(self, rng: random.Random) -> float:
+        return rng.lognormvariate(math.log(self.median), self.sigma)
+
+
+class Exponential(Distribution):
+
+    def __init__(self, mean: float):
+        self.mean = mean
+
+    def sample(self, rng: random.Random) -> float:
+        return rng.expovariate(1 / self.mean) if self.mean else 0.0
+
+
+DISTRIBUTIONS = {
+    "constant": Constant,
+    "uniform": Uniform,
+    "normal": Normal,
+    "lognormal": LogNormal,
+    "exponential": Exponential,
+}
+
+
+def parse_distribution(spec: str) -> Distribution:
+    # Specs look like "constant:0.05", "uniform:0.1,0.3" or "lognormal:0.2,0.5"
+    name, _, params = spec.partition(":")
+    if name not in DISTRIBUTIONS:
+        raise ValueError(f"Unknown distribution {name!r}, expected one of {', '.join(DISTRIBUTIONS)}")
+    return DISTRIBUTIONS[name](*[float(param) for param in params.split(",") if param])
+
+
+class LatencyModel:
+
+    def __init__(self, handshake: Distribution = None, first_chunk: Distribution = None,
+                 inter_chunk: Distribution = None, jitter: Distribution = None, seed: Optional[int] = None):
+        self.handshake = handshake or Constant()
+        self.first_chunk = first_chunk or Constant()
+        self.inter_chunk = inter_chunk or Constant()
+        self.jitter = jitter or Constant()
+        self.rng = random.Random(seed)
+
+    def _delay(self, distribution: Distribution) -> float:
+        return max(0.0, distribution.sample(self.rng) + self.jitter.sample(self.rng))
+
+    def handshake_delay(self) -> float:
+        return self._delay(self.handshake)
+
+    def first_chunk_delay(self) -> float:
+        return self._delay(self.first_chunk)
+
+    def inter_chunk_delay(self) -> float:
+        return self._delay(self.inter_chunk)
+
+    @staticmethod
+    def from_specs(handshake: str = None, first_chunk: str = None, inter_chunk: str = None, jitter: str = None,
+                   seed: Optional[int] = None) -> "LatencyModel":
+        return LatencyModel(
+            handshake=parse_distribution(handshake) if handshake else None,
+            first_chunk=parse_distribution(first_chunk) if first_chunk else None,
+            inter_chunk=parse_distribution(inter_chunk) if inter_chunk else None,
+            jitter=parse_distribution(jitter) if jitter else None,
+            seed=seed,
+        )
+
+
+LATENCY_PRESETS: Dict[str, LatencyModel] = {
+    "instant": LatencyModel(),
+    "fast": LatencyModel(handshake=Constant(0.02), first_chunk=LogNormal(0.15, 0.2),
+                         inter_chunk=Constant(0.02), jitter=Uniform(0.0, 0.005)),
+    "realistic": LatencyModel(handshake=LogNormal(0.08, 0.3), first_chunk=LogNormal(0.35, 0.4),
+                              inter_chunk=Exponential(0.05), jitter=Normal(0.0, 0.01)),
+}
@@ -0,0 +1,235 @@
+import asyncio
+import logging
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from enum import Enum
+from typing import List, Optional, Sequence
+
+from pydantic import BaseModel
+
+from connection_pool import ConnectionMode
+from providers import (
+    BlockingSdkBridge,
+    TTSProvider,
+    create_provider,
+    provider_class,
+)
+from results_store import (
+    DEFAULT_RESULTS_PATH,
+    ResultsStore,
+    ResultsWriter,
+    RunMetadata,
+)
+from sinks import DiscardSink
+from stats import HistogramSummary, LatencyHistogram, field_value
+
+DEFAULT_CONCURRENCY_LEVELS = [1, 4, 16, 64]
+DEFAULT_KNEE_FACTOR = 1.5
+TOKEN_OUTPUT_LATENCY = 0.01
+
+
+class LoadTarget(Enum):
+    PLAYHT_STREAMING = "playht_streaming"
+    PLAYHT_INPUT_STREAMING = "playht_input_streaming"
+    ELEVEN_LABS_STREAMING = "eleven_labs_streaming"
+    ELEVEN_LABS_INPUT_STREAMING = "eleven_labs_input_streaming"
+    OPENAI_STREAMING = "openai_streaming"
+
+
+INPUT_STREAMING_TARGETS = {LoadTarget.PLAYHT_INPUT_STREAMING, LoadTarget.ELEVEN_LABS_INPUT_STREAMING}
+# Registry names: each worker process only imports the SDK of the provider it is loading
+TARGET_PROVIDERS = {
+    LoadTarget.PLAYHT_STREAMING: "playht",
+    LoadTarget.PLAYHT_INPUT_STREAMING: "playht",
+    LoadTarget.ELEVEN_LABS_STREAMING: "eleven_labs",
+    LoadTarget.ELEVEN_LABS_INPUT_STREAMING: "eleven_labs",
+    LoadTarget.OPENAI_STREAMING: "openai",
+}
+
+
+class WorkerResult:
+
+    def __init__(self, elapsed: float = 0.0, errors: int = 0):
+        self.elapsed = elapsed
+        self.errors = errors
+        self.time_to_first_audio = LatencyHistogram()
+        self.session_duration = LatencyHistogram()
+
+
+class LevelReport(BaseModel):
+    target: LoadTarget
+    run_id: Optional[str] = None
+    concurrency: int
+    completed: int
+    errors: int
+    elapsed: float
+    throughput: float
+    time_to_first_audio: HistogramSummary
+    session_duration: HistogramSummary
+
+
+def _split_text(text: str) -> List[str]:
+    return re.findall(r"\S+\s*", text)
+
+
+async def _async_text_gen(text: str):
+    for word in _split_text(text):
+        yield word
+        await asyncio.sleep(TOKEN_OUTPUT_LATENCY)
+
+
+def create_target_provider(target: LoadTarget, bridge: BlockingSdkBridge) -> TTSProvider:
+    return create_provider(TARGET_PROVIDERS[target], bridge=bridge)
+
+
+async def run_target(target: LoadTarget, provider: TTSProvider, text: str, connection_mode: ConnectionMode, logger):
+    # Audio is counted and dropped so that hundreds of concurrent sessions neither fight over an output file nor
+    # hold their audio in memory
+    sink = DiscardSink()
+    if target in INPUT_STREAMING_TARGETS:
+        return await provider.synthesize_streaming_input(_async_text_gen(text), sink=sink,
+                                                         connection_mode=connection_mode, logger=logger)
+    return await provider.synthesize(text, sink=sink, connection_mode=connection_mode, logger=logger)
+
+
+async def _run_session(target: LoadTarget, provider: TTSProvider, text: str, connection_mode: ConnectionMode,
+                       iterations: int, worker_result: WorkerResult, results: Optional[ResultsWriter], logger):
+    for _ in range(iterations):
+        start_time = time.perf_counter()
+        try:
+            latency_data = await run_target(target=target, provider=provider, text=text,
+                                             connection_mode=connection_mode, logger=logger)
+        except Exception as e:
+            logger.warning(f"{target.value} session failed: {e!r}")
+            worker_result.errors += 1
+            continue
+        # A session that ended without audio has no time to first audio, and counts as failed
+        if (time_to_first_audio := field_value(latency_data, "time_to_first_audio")) is None:
+            logger.warning(f"{target.value} session returned no audio")
+            worker_result.errors += 1
+            continue
+        worker_result.session_duration.record(time.perf_counter() - start_time)
+        worker_result.time_to_first_audio.record(time_to_first_audio)
+        if results:
+            results.record(latency_data)
+
+
+async def _drive_sessions(target: LoadTarget, text: str, connection_mode: ConnectionMode, sessions: int,
+                          iterations: int, results: Optional[ResultsWriter], logger) -> WorkerResult:
+    worker_result = WorkerResult()
+    # Blocking SDKs get one thread per session, so no session waits on another for a thread
+    bridge = BlockingSdkBridge(max_workers=sessions)
+    provider = create_target_provider(target, bridge)
+    try:
+        start_time = time.perf_counter()
+        await asyncio.gather(*[
+            _run_session(target=target, provider=provider, text=text, connection_mode=connection_mode,
+                         iterations=iterations, worker_result=worker_result, results=results, logger=logger)
+            for _ in range(sessions)
+        ])
+        worker_result.elapsed = time.perf_counter() - start_time
+    finally:
+        await provider.close()
+        bridge.close()
+    return worker_result
+
+
+def run_worker(target: LoadTarget, text: str, connection_mode: ConnectionMode, sessions: int, iterations: int,
+               results_path: Optional[str] = None, run_id: Optional[str] = None) -> WorkerResult:
+    logger = logging.getLogger(f"load_generator.worker.{os.getpid()}")
+    logger.setLevel(logging.WARNING)
+    # Every worker process appends the samples of its sessions to the level's run through its own connection
+    results = ResultsWriter(results_path, run_id=run_id) if results_path and run_id else None
+    try:
+        return asyncio.run(_drive_sessions(target=target, text=text, connection_mode=connection_mode,
+                                           sessions=sessions, iterations=iterations, results=results, logger=logger))
+    finally:
+        if results:
+            results.close()
+
+
+def split_sessions(concurrency: int, workers: int) -> List[int]:
+    sessions = [concurrency // workers + (1 if i < concurrency % workers else 0) for i in range(workers)]
+    return [count for count in sessions if count]
+
+
+def merge_worker_results(target: LoadTarget, concurrency: int, worker_results: Sequence[WorkerResult],
+                         elapsed: float) -> LevelReport:
+    merged = WorkerResult(elapsed=elapsed)
+    for worker_result in worker_results:
+        merged.errors += worker_result.errors
+        merged.time_to_first_audio.merge(worker_result.time_to_first_audio)
+        merged.session_duration.merge(worker_result.session_duration)
+    completed = merged.time_to_first_audio.count
+    return LevelReport(
+        target=target,
+        concurrency=concurrency,
+        completed=completed,
+        errors=merged.errors,
+        elapsed=elapsed,
+        throughput=completed / elapsed if elapsed else 0.0,
+        time_to_first_audio=merged.time_to_first_audio.summary(),
+        session_duration=merged.session_duration.summary(),
+    )
+
+
+def find_latency_knee(reports: Sequence[LevelReport], factor: float = DEFAULT_KNEE_FACTOR) -> Optional[int]:
+    # The knee is the first concurrency level whose p90 time to first audio exceeds the lowest level's by `factor`
+    reports = sorted((report for report in reports if report.time_to_first_audio.p90 is not None),
+                     key=lambda report: report.concurrency)
+    if not reports:
+        return None
+    baseline = reports[0].time_to_first_audio.p90
+    for report in reports[1:]:
+        if report.time_to_first_audio.p90 > baseline * factor:
+            return report.concurrency
+    return None
+
+
+def create_target_run(results_path: str, target: LoadTarget, text: str, concurrency: int, label: str) -> str:
+    mode = "input_streaming" if target in INPUT_STREAMING_TARGETS else "streaming"
+    store = ResultsStore(results_path)
+    try:
+        metadata = RunMetadata.for_provider(provider_class(TARGET_PROVIDERS[target]), mode=mode, text_length=len(text),
+                                            concurrency=concurrency, label=label)
+        return store.create_run(metadata).run_id
+    finally:
+        store.close()
+
+
+def run_level(pool: ProcessPoolExecutor, target: LoadTarget, text: str, connection_mode: ConnectionMode,
+              concurrency: int, iterations: int, workers: int,
+              results_path: Optional[str] = DEFAULT_RESULTS_PATH) -> LevelReport:
+    run_id = create_target_run(results_path, target, text, concurrency,
+                               label=f"load:{connection_mode.value}") if results_path else None
+    start_time = time.perf_counter()
+    futures = [pool.submit(run_worker, target, text, connection_mode, sessions, iterations, results_path, run_id)
+               for sessions in split_sessions(concurrency, workers)]
+    worker_results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start_time
+    report = merge_worker_results(target=target, concurrency=concurrency, worker_results=worker_results,
+                                  elapsed=elapsed)
+    report.run_id = run_id
+    return report
+
+
+def run_sweep(targets: Sequence[LoadTarget], text: str, concurrency_levels: Sequence[int] = None,
+              iterations: int = 1, workers: Optional[int] = None, connection_mode=ConnectionMode.WARM,
+              results_path: Optional[str] = DEFAULT_RESULTS_PATH, logger=None) -> List[LevelReport]:
+    if not logger:
+        logger = logging.getLogger("load_generator")
+    concurrency_levels = concurrency_levels or DEFAULT_CONCURRENCY_LEVELS
+    workers = workers or os.cpu_count() or 1
+
+    reports = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for target in targets:
+            for concurrency in concurrency_levels:
+                logger.info(f"Running {target.value} at concurrency {concurrency} across {workers} worker(s)")
+                report = run_level(pool=pool, target=target, text=text, connection_mode=connection_mode,
+                                   concurrency=concurrency, iterations=iterations, workers=workers,
+                                   results_path=results_path)
+                reports.append(report)
+    return reports
@@ -1,9 +1,49 @@
+import json
 import logging
 import os
+import threading
 import time
+from contextlib import contextmanager
+from typing import Optional
 
+import httpx
 from openai import OpenAI
 
+from client_overhead import chunk_loop_profile
+from connection_pool import (
+    ConnectionMode,
+    PoolSettings,
+    http2_available,
+)
+from open.tracing import traced_http_client
+from session_trace import (
+    FrameKind,
+    start_capture,
+)
+from sinks import (
+    AudioSink,
+    create_sink,
+)
+from tracing import (
+    SPAN_FIRST_BYTE,
+    SPAN_STREAM,
+    RequestTrace,
+    current_trace,
+)
+
+
+def _create_client(base_url: Optional[str], pool_settings: PoolSettings) -> OpenAI:
+    http_client = traced_http_client(
+        limits=httpx.Limits(
+            max_connections=pool_settings.limit,
+            max_keepalive_connections=pool_settings.limit_per_host,
+            keepalive_expiry=pool_settings.keepalive_timeout,
+        ),
+        http2=pool_settings.http2 and http2_available(),
+    )
+    return OpenAI(api_key=os.environ.get("OPENAI_API_KEY", "stand-in" if base_url else None), base_url=base_url,
+                  http_client=http_client)
+
 
 class SynthesisResult:
 
@@ -11,46 +51,118 @@ class SynthesisResult:
         self.response = response
         self.stream_generation_time = stream_generation_time
         self.first_chunk_generation_time = first_chunk_generation_time
+        self.connection_mode = None
+        self.audio_bytes = None
+        self.spans = []
+        self.timeline = None
+
+    @property
+    def time_to_first_audio(self):
+        return self.stream_generation_time + self.first_chunk_generation_time
 
 
 class OpenAISDKBenchmark:
     logger = logging.getLogger("openai_sdk_benchmark")
     logger.setLevel(logging.DEBUG)
-    client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+    # The SDK already honours OPENAI_BASE_URL, so a local stand-in server can also be selected from the environment
+    base_url: Optional[str] = None
+    model = "tts-1"
+    voice = "alloy"
+    pool_settings = PoolSettings()
+    # Built on first use rather than at import, so importing the module never needs credentials or a network stack
+    client: Optional[OpenAI] = None
+    # Runs on the bridge's worker threads, so the first calls can race to build the client
+    _client_lock = threading.Lock()
+
+    @staticmethod
+    def get_client() -> OpenAI:
+        with OpenAISDKBenchmark._client_lock:
+            if OpenAISDKBenchmark.client is None:
+                OpenAISDKBenchmark.client = _create_client(base_url=OpenAISDKBenchmark.base_url,
+                                                           pool_settings=OpenAISDKBenchmark.pool_settings)
+            return OpenAISDKBenchmark.client
+
+    @staticmethod
+    def set_voice(voice: str):
+        OpenAISDKBenchmark.voice = voice
+
+    @staticmethod
+    def set_base_url(base_url: str):
+        OpenAISDKBenchmark.base_url = base_url
+        OpenAISDKBenchmark.client = None
 
     @staticmethod
-    def _create_speech(text, logger):
-        start_time = time.time()
-        response = OpenAISDKBenchmark.client.audio.speech.create(
-            model="tts-1",
-            voice="alloy",
-            input=text,
-        )
-        end_time = time.time()
-        stream_generation_time = end_time - start_time
+    def configure_pool(pool_settings: PoolSettings):
+        OpenAISDKBenchmark.pool_settings = pool_settings
+        OpenAISDKBenchmark.client = None
 
-        logger.debug(f"Stream generation time: {stream_generation_time:.2f}")
+    @staticmethod
+    @contextmanager
+    def _create_speech(client: OpenAI, text, logger):
+        start_time = time.perf_counter()
+        # A streaming response returns once the headers arrive instead of after the whole body has been read
+        with client.audio.speech.with_streaming_response.create(
+                model=OpenAISDKBenchmark.model,
+                voice=OpenAISDKBenchmark.voice,
+                input=text,
+        ) as response:
+            end_time = time.perf_counter()
+            stream_generation_time = end_time - start_time
 
-        return SynthesisResult(response, stream_generation_time)
+            logger.debug(f"Stream generation time: {stream_generation_time:.2f}")
+
+            yield SynthesisResult(response, stream_generation_time)
 
     @staticmethod
-    def run(text, logger=None):
+    def run(text, logger=None, connection_mode=ConnectionMode.WARM, sink: Optional[AudioSink] = None):
         if not logger:
             logger = OpenAISDKBenchmark.logger
+        if not sink:
+            sink = create_sink("openai_benchmark_output")
+
+        if connection_mode == ConnectionMode.WARM:
+            client = OpenAISDKBenchmark.get_client()
+        else:
+            client = _create_client(base_url=OpenAISDKBenchmark.base_url,
+                                    pool_settings=OpenAISDKBenchmark.pool_settings)
+
+        trace = RequestTrace()
+        trace.capture = start_capture("openai", "streaming", connection_mode=connection_mode)
+        if trace.capture:
+            trace.capture.record(FrameKind.REQUEST, json.dumps(dict(model=OpenAISDKBenchmark.model,
+                                                                    voice=OpenAISDKBenchmark.voice, input=text)))
+        trace_token = current_trace.set(trace)
+        try:
+            with OpenAISDKBenchmark._create_speech(client=client, text=text, logger=logger) as synthesis_result, \
+                    sink, chunk_loop_profile("openai"):
+                is_first_chunk = True
+                first_chunk_generation_start = time.perf_counter()
+                trace.start(SPAN_FIRST_BYTE)
+                for data in synthesis_result.response.iter_bytes():
+                    if is_first_chunk:
+                        first_chunk_generation_end = time.perf_counter()
+                        trace.end(SPAN_FIRST_BYTE)
+                        trace.start(SPAN_STREAM)
+                        first_chunk_generation_time = first_chunk_generation_end - first_chunk_generation_start
+                        synthesis_result.first_chunk_generation_time = first_chunk_generation_time
+                        is_first_chunk = False
+                        logger.debug(f"First chunk generation time: {first_chunk_generation_time:.2f}")
+                    trace.timeline.record(len(data))
+                    if trace.capture:
+                        trace.capture.record(FrameKind.BODY_CHUNK, data)
+                    sink.write(data)
+                trace.end(SPAN_STREAM)
+        finally:
+            current_trace.reset(trace_token)
+            if connection_mode == ConnectionMode.COLD:
+                client.close()
 
-        synthesis_result = OpenAISDKBenchmark._create_speech(text=text, logger=logger)
-        with open("openai_benchmark_output.mp3", "wb") as f:
-            is_first_chunk = True
-            first_chunk_generation_start = time.time()
-            for data in synthesis_result.response.iter_bytes():
-                if is_first_chunk:
-                    first_chunk_generation_end = time.time()
-                    first_chunk_generation_time = first_chunk_generation_end - first_chunk_generation_start
-                    synthesis_result.first_chunk_generation_time = first_chunk_generation_time
-                    is_first_chunk = False
-                    logger.debug(f"First chunk generation time: {first_chunk_generation_time:.2f}")
-                f.write(data)
-
-        logger.info(f"Audio chunks written to file")
+        synthesis_result.connection_mode = connection_mode
+        synthesis_result.audio_bytes = sink.bytes_written
+        synthesis_result.spans = trace.finish()
+        synthesis_result.timeline = trace.timeline
+        if trace.capture:
+            trace.capture.close()
+        logger.info(f"{sink.bytes_written} audio bytes written to {type(sink).__name__}")
 
         return synthesis_result
@@ -0,0 +1,47 @@
+from typing import Optional
+
+from aiohttp import web
+
+from latency_model import (
+    LATENCY_PRESETS,
+    LatencyModel,
+)
+from session_trace import SessionLibrary
+from stand_in import (
+    DEFAULT_FRAMES_PER_CHUNK,
+    start_app,
+    stream_audio_response,
+    stream_replay_response,
+)
+
+DEFAULT_PORT = 8082
+
+
+async def _speech(request: web.Request) -> web.StreamResponse:
+    body = await request.json()
+    if replay := request.app["replay"]:
+        try:
+            trace = replay.next("openai", "streaming")
+        except LookupError as e:
+            raise web.HTTPNotFound(text=str(e))
+        return await stream_replay_response(request, trace, speed=request.app["replay_speed"])
+    return await stream_audio_response(request, text=body["input"], latency_model=request.app["latency_model"],
+                                       frames_per_chunk=request.app["frames_per_chunk"])
+
+
+def create_app(latency_model: LatencyModel = None, frames_per_chunk: int = DEFAULT_FRAMES_PER_CHUNK,
+               replay: Optional[SessionLibrary] = None, replay_speed: float = 1.0):
+    app = web.Application()
+    app["latency_model"] = latency_model or LATENCY_PRESETS["instant"]
+    app["frames_per_chunk"] = frames_per_chunk
+    app["replay"] = replay
+    app["replay_speed"] = replay_speed
+    app.router.add_post("/v1/audio/speech", _speech)
+    return app
+
+
+async def start_server(host: str = "127.0.0.1", port: int = DEFAULT_PORT, latency_model: LatencyModel = None,
+                       frames_per_chunk: int = DEFAULT_FRAMES_PER_CHUNK, replay: Optional[SessionLibrary] = None,
+                       replay_speed: float = 1.0) -> web.AppRunner:
+    return await start_app(create_app(latency_model, frames_per_chunk, replay=replay, replay_speed=replay_speed),
+                           host=host, port=port)
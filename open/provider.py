@@ -0,0 +1,29 @@
+from typing import AsyncIterator, Optional
+
+from connection_pool import ConnectionMode
+from open.benchmark_sdk import OpenAISDKBenchmark
+from providers import BlockingSdkProvider
+from sinks import (
+    AudioSink,
+    create_sink,
+)
+
+
+class OpenAIProvider(BlockingSdkProvider):
+    name = "openai"
+    supports_input_streaming = False
+    voice = OpenAISDKBenchmark.voice
+    model = OpenAISDKBenchmark.model
+
+    def set_voice(self, voice: str):
+        OpenAISDKBenchmark.set_voice(voice)
+        self.voice = voice
+
+    async def synthesize(self, text: str, sink: Optional[AudioSink] = None,
+                         connection_mode: ConnectionMode = ConnectionMode.WARM, logger=None):
+        return await self.bridge.run(OpenAISDKBenchmark.run, sink=sink or create_sink("openai_benchmark_output"),
+                                     text=text, logger=logger, connection_mode=connection_mode)
+
+    async def synthesize_streaming_input(self, text_chunks: AsyncIterator[str], sink: Optional[AudioSink] = None,
+                                         connection_mode: ConnectionMode = ConnectionMode.WARM, logger=None):
+        raise NotImplementedError("OpenAI speech synthesis does not accept streamed input text")
@@ -0,0 +1,44 @@
+import functools
+
+import httpx
+
+from tracing import (
+    SPAN_CONNECT,
+    SPAN_REQUEST,
+    SPAN_SERVER,
+    SPAN_TLS,
+    RequestTrace,
+    current_trace,
+)
+
+# httpcore trace events ("<http11|http2|connection>.<step>.<started|complete>") mapped onto trace spans.
+# httpcore resolves the host inside connect_tcp, so DNS is part of "connect" here.
+_SPAN_STARTS = {
+    "connect_tcp.started": SPAN_CONNECT,
+    "start_tls.started": SPAN_TLS,
+    "send_request_headers.started": SPAN_REQUEST,
+    "receive_response_headers.started": SPAN_SERVER,
+}
+_SPAN_ENDS = {
+    "connect_tcp.complete": SPAN_CONNECT,
+    "start_tls.complete": SPAN_TLS,
+    "send_request_body.complete": SPAN_REQUEST,
+    "receive_response_headers.complete": SPAN_SERVER,
+}
+
+
+def _on_httpcore_event(trace: RequestTrace, event_name: str, info: dict):
+    step = event_name.split(".", 1)[-1]
+    if span_name := _SPAN_STARTS.get(step):
+        trace.start(span_name)
+    elif span_name := _SPAN_ENDS.get(step):
+        trace.end(span_name)
+
+
+def _install_trace(request: httpx.Request):
+    if trace := current_trace.get():
+        request.extensions["trace"] = functools.partial(_on_httpcore_event, trace)
+
+
+def traced_http_client(**kwargs) -> httpx.Client:
+    return httpx.Client(event_hooks={"request": [_install_trace]}, **kwargs)
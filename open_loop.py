@@ -0,0 +1,297 @@
+import asyncio
+import csv
+import logging
+import random
+import time
+from typing import List, Optional, Sequence
+
+from pydantic import BaseModel
+
+from connection_pool import ConnectionMode
+from load_generator import (
+    LoadTarget,
+    create_target_provider,
+    create_target_run,
+    run_target,
+)
+from providers import BlockingSdkBridge
+from results_store import (
+    DEFAULT_RESULTS_PATH,
+    ResultsWriter,
+)
+from stats import HistogramSummary, LatencyHistogram, field_value
+
+DEFAULT_RATES = [1.0, 2.0, 5.0, 10.0]
+DEFAULT_DURATION = 30.0
+DEFAULT_SATURATION_FACTOR = 2.0
+# Blocking SDK calls each hold a thread for their whole stream, so the pool must not become the bottleneck that an
+# open loop is meant to expose on the provider side
+DEFAULT_OPEN_LOOP_WORKERS = 256
+
+
+class ArrivalProcess:
+    # Intended send times, as offsets in seconds from the start of a level, decided before anything is sent
+
+    def offsets(self, duration: float) -> List[float]:
+        raise NotImplementedError
+
+    def at_rate(self, rate: float) -> "ArrivalProcess":
+        raise NotImplementedError
+
+    def describe(self) -> str:
+        return type(self).__name__
+
+
+class ConstantArrivals(ArrivalProcess):
+
+    def __init__(self, rate: float):
+        self.rate = rate
+
+    def offsets(self, duration: float) -> List[float]:
+        return [i / self.rate for i in range(int(duration * self.rate))]
+
+    def at_rate(self, rate: float) -> "ConstantArrivals":
+        return ConstantArrivals(rate)
+
+    def describe(self) -> str:
+        return f"constant:{self.rate:g}"
+
+
+class PoissonArrivals(ArrivalProcess):
+
+    def __init__(self, rate: float, seed: Optional[int] = None):
+        self.rate = rate
+        self.seed = seed
+
+    def offsets(self, duration: float) -> List[float]:
+        rng = random.Random(self.seed)
+        offsets = []
+        offset = rng.expovariate(self.rate)
+        while offset < duration:
+            offsets.append(offset)
+            offset += rng.expovariate(self.rate)
+        return offsets
+
+    def at_rate(self, rate: float) -> "PoissonArrivals":
+        return PoissonArrivals(rate, seed=self.seed)
+
+    def describe(self) -> str:
+        return f"poisson:{self.rate:g}"
+
+
+class TraceArrivals(ArrivalProcess):
+    # Replays recorded request times; `at_rate` compresses or stretches the trace to a new mean rate, keeping its
+    # burstiness
+
+    def __init__(self, offsets: Sequence[float], name: str = "trace"):
+        offsets = sorted(offsets)
+        self._offsets = [offset - offsets[0] for offset in offsets] if offsets else []
+        self.name = name
+
+    @property
+    def rate(self) -> Optional[float]:
+        if len(self._offsets) < 2 or not self._offsets[-1]:
+            return None
+        return (len(self._offsets) - 1) / self._offsets[-1]
+
+    def offsets(self, duration: float) -> List[float]:
+        return [offset for offset in self._offsets if offset < duration]
+
+    def at_rate(self, rate: float) -> "TraceArrivals":
+        scale = self.rate / rate if self.rate else 1.0
+        return TraceArrivals([offset * scale for offset in self._offsets], name=self.name)
+
+    def describe(self) -> str:
+        return f"{self.name}:{self.rate:g}" if self.rate else self.name
+
+    @staticmethod
+    def load(path: str) -> "TraceArrivals":
+        # One request per row, its timestamp in seconds in the first column; a header row is skipped
+        offsets = []
+        with open(path, newline="") as f:
+            for row in csv.reader(f):
+                try:
+                    offsets.append(float(row[0]))
+                except (IndexError, ValueError):
+                    continue
+        return TraceArrivals(offsets)
+
+
+def parse_arrivals(spec: str, seed: Optional[int] = None) -> ArrivalProcess:
+    # Specs look like "constant:10", "poisson:10" or "trace:requests.csv"
+    name, _, param = spec.partition(":")
+    if name == "constant":
+        return ConstantArrivals(float(param or 1))
+    if name == "poisson":
+        return PoissonArrivals(float(param or 1), seed=seed)
+    if name == "trace":
+        return TraceArrivals.load(param)
+    raise ValueError(f"Unknown arrival process {name!r}, expected constant, poisson or trace")
+
+
+class OpenLoopSample:
+    # A provider's latency data seen from the intended send time. time_to_first_audio includes the time a request
+    # waited to be sent, which is what a user arriving on schedule experiences; the provider's own measurement from
+    # the actual send is kept as service_time_to_first_audio. Both are None for a request that returned no audio.
+
+    def __init__(self, latency_data, intended_at: float, sent_at: float, first_audio_at: Optional[float]):
+        self.latency_data = latency_data
+        self.send_lag = sent_at - intended_at
+        self.service_time_to_first_audio = field_value(latency_data, "time_to_first_audio")
+        self.time_to_first_audio = None if first_audio_at is None else first_audio_at - intended_at
+
+    def __getattr__(self, name):
+        return getattr(self.latency_data, name)
+
+
+class OpenLoopReport(BaseModel):
+    target: LoadTarget
+    arrivals: str
+    offered_rate: float
+    run_id: Optional[str] = None
+    scheduled: int
+    completed: int
+    errors: int
+    elapsed: float
+    throughput: float
+    max_in_flight: int
+    time_to_first_audio: HistogramSummary
+    service_time_to_first_audio: HistogramSummary
+    send_lag: HistogramSummary
+
+
+def _first_audio_at(latency_data) -> Optional[float]:
+    # Every provider stamps its chunks on the request's timeline with perf_counter, which is one clock for the event
+    # loop and the SDK threads alike
+    timeline = getattr(latency_data, "timeline", None)
+    if not timeline:
+        return None
+    return timeline.started_at + timeline.offsets[0]
+
+
+async def run_open_loop(target: LoadTarget, arrivals: ArrivalProcess, text: str, duration: float = DEFAULT_DURATION,
+                        connection_mode: ConnectionMode = ConnectionMode.WARM, warmup: int = 1,
+                        results: Optional[ResultsWriter] = None, logger=None) -> OpenLoopReport:
+    if not logger:
+        logger = logging.getLogger("open_loop")
+    offsets = arrivals.offsets(duration)
+    bridge = BlockingSdkBridge(max_workers=DEFAULT_OPEN_LOOP_WORKERS)
+    provider = create_target_provider(target, bridge)
+    time_to_first_audio = LatencyHistogram()
+    service_time_to_first_audio = LatencyHistogram()
+    send_lag = LatencyHistogram()
+    errors = 0
+    in_flight = 0
+    max_in_flight = 0
+
+    async def send(intended_at: float):
+        nonlocal errors, in_flight, max_in_flight
+        sent_at = time.perf_counter()
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        try:
+            latency_data = await run_target(target=target, provider=provider, text=text,
+                                            connection_mode=connection_mode, logger=logger)
+            sample = OpenLoopSample(latency_data, intended_at=intended_at, sent_at=sent_at,
+                                    first_audio_at=_first_audio_at(latency_data))
+        except Exception as e:
+            logger.warning(f"{target.value} request failed: {e!r}")
+            errors += 1
+            return
+        finally:
+            in_flight -= 1
+        if sample.time_to_first_audio is None or sample.service_time_to_first_audio is None:
+            logger.warning(f"{target.value} request returned no audio")
+            errors += 1
+            return
+        time_to_first_audio.record(sample.time_to_first_audio)
+        service_time_to_first_audio.record(sample.service_time_to_first_audio)
+        send_lag.record(sample.send_lag)
+        if results:
+            results.record(sample)
+
+    try:
+        # Warmup requests run closed loop before the clock starts, so the first scheduled requests do not pay for
+        # DNS, TLS and pool set-up
+        for _ in range(warmup):
+            try:
+                await run_target(target=target, provider=provider, text=text, connection_mode=connection_mode,
+                                 logger=logger)
+            except Exception as e:
+                logger.warning(f"{target.value} warmup request failed: {e!r}")
+
+        started_at = time.perf_counter()
+        requests = []
+        for offset in offsets:
+            intended_at = started_at + offset
+            # Requests are sent on schedule whether or not earlier ones have finished; when the loop falls behind
+            # they go out at once and the wait is charged to their latency, never skipped
+            if (delay := intended_at - time.perf_counter()) > 0:
+                await asyncio.sleep(delay)
+            requests.append(asyncio.create_task(send(intended_at)))
+        await asyncio.gather(*requests)
+        elapsed = time.perf_counter() - started_at
+    finally:
+        await provider.close()
+        bridge.close()
+
+    completed = time_to_first_audio.count
+    return OpenLoopReport(
+        target=target,
+        arrivals=arrivals.describe(),
+        offered_rate=len(offsets) / duration if duration else 0.0,
+        scheduled=len(offsets),
+        completed=completed,
+        errors=errors,
+        elapsed=elapsed,
+        throughput=completed / elapsed if elapsed else 0.0,
+        max_in_flight=max_in_flight,
+        time_to_first_audio=time_to_first_audio.summary(),
+        service_time_to_first_audio=service_time_to_first_audio.summary(),
+        send_lag=send_lag.summary(),
+    )
+
+
+def run_rate_sweep(targets: Sequence[LoadTarget], arrivals: ArrivalProcess, text: str,
+                   rates: Sequence[float] = None, duration: float = DEFAULT_DURATION,
+                   connection_mode: ConnectionMode = ConnectionMode.WARM, warmup: int = 1,
+                   results_path: Optional[str] = DEFAULT_RESULTS_PATH, logger=None) -> List[OpenLoopReport]:
+    if not logger:
+        logger = logging.getLogger("open_loop")
+    rates = rates or DEFAULT_RATES
+    reports = []
+    for target in targets:
+        for rate in rates:
+            level_arrivals = arrivals.at_rate(rate)
+            logger.info(f"Running {target.value} at {level_arrivals.describe()} for {duration:g}s")
+            results = None
+            if results_path:
+                # Concurrency is not fixed in an open loop; the label carries the offered load instead
+                run_id = create_target_run(results_path, target, text, concurrency=0,
+                                           label=f"open_loop:{level_arrivals.describe()}:{connection_mode.value}")
+                results = ResultsWriter(results_path, run_id=run_id)
+            try:
+                report = asyncio.run(run_open_loop(target=target, arrivals=level_arrivals, text=text,
+                                                   duration=duration, connection_mode=connection_mode,
+                                                   warmup=warmup, results=results, logger=logger))
+            finally:
+                if results:
+                    results.close()
+            report.run_id = results.run_id if results else None
+            reports.append(report)
+    return reports
+
+
+def find_saturation_rate(reports: Sequence[OpenLoopReport],
+                         factor: float = DEFAULT_SATURATION_FACTOR) -> Optional[float]:
+    # The first offered rate whose p99 time to first audio exceeds the lowest rate's by `factor`, or that the
+    # provider could not keep up with at all
+    reports = sorted(reports, key=lambda report: report.offered_rate)
+    baseline = next((report.time_to_first_audio.p99 for report in reports
+                     if report.time_to_first_audio.p99 is not None), None)
+    if baseline is None:
+        return None
+    for report in reports:
+        if report.time_to_first_audio.p99 is None or report.time_to_first_audio.p99 > baseline * factor:
+            return report.offered_rate
+    return None
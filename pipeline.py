@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, List, Optional
+
+from pydantic import BaseModel
+
+import gpt_client
+from chunking import Chunker
+from connection_pool import ConnectionMode
+from providers import TTSProvider
+from sinks import (
+    AudioSink,
+    create_sink,
+)
+from timeline import ChunkTimeline
+from token_source import TokenSource
+from tracing import Span
+
+
+class PipelineLatencyData(BaseModel):
+    provider: str
+    connection_mode: Optional[ConnectionMode] = None
+    # Every timestamp is a perf_counter reading; `prompt_sent_timestamp` is when the prompt went to the LLM
+    prompt_sent_timestamp: Optional[float] = None
+    llm_first_token_timestamp: Optional[float] = None
+    first_text_sent_timestamp: Optional[float] = None
+    first_audio_timestamp: Optional[float] = None
+    completed_timestamp: Optional[float] = None
+    tokens: int = 0
+    audio_bytes: Optional[int] = None
+    spans: List[Span] = []
+    timeline: Optional[ChunkTimeline] = None
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    @property
+    def llm_time_to_first_token(self):
+        return self.llm_first_token_timestamp - self.prompt_sent_timestamp
+
+    @property
+    def time_to_first_text_sent(self):
+        return self.first_text_sent_timestamp - self.prompt_sent_timestamp
+
+    @property
+    def tts_time_to_first_audio(self):
+        return self.first_audio_timestamp - self.first_text_sent_timestamp
+
+    @property
+    def time_to_first_audio(self):
+        # Prompt to first audio: the latency a voice agent's user actually waits for
+        return self.first_audio_timestamp - self.prompt_sent_timestamp
+
+    @property
+    def total_time(self):
+        return self.completed_timestamp - self.prompt_sent_timestamp
+
+
+PIPELINE_FIELDS = ["llm_time_to_first_token", "time_to_first_text_sent", "tts_time_to_first_audio",
+                   "time_to_first_audio", "total_time"]
+
+
+class _FirstAudioSink(AudioSink):
+    # Stamps the arrival of the first audio chunk, whichever provider produced it, and passes every chunk on
+
+    def __init__(self, sink: AudioSink, latency_data: PipelineLatencyData):
+        super().__init__()
+        self.sink = sink
+        self.latency_data = latency_data
+
+    def write(self, chunk: bytes):
+        if self.latency_data.first_audio_timestamp is None:
+            self.latency_data.first_audio_timestamp = time.perf_counter()
+        self.bytes_written += len(chunk)
+        self.sink.write(chunk)
+
+    def write_base64(self, data):
+        if self.latency_data.first_audio_timestamp is None:
+            self.latency_data.first_audio_timestamp = time.perf_counter()
+        self.sink.write_base64(data)
+        self.bytes_written = self.sink.bytes_written
+
+    def close(self):
+        self.sink.close()
+
+
+async def _timed_tokens(tokens: AsyncIterator[str], latency_data: PipelineLatencyData) -> AsyncIterator[str]:
+    async for token in tokens:
+        if latency_data.llm_first_token_timestamp is None:
+            latency_data.llm_first_token_timestamp = time.perf_counter()
+        latency_data.tokens += 1
+        yield token
+
+
+async def _pump_tokens(tokens: AsyncIterator[str], queue: asyncio.Queue):
+    # Runs from the moment the prompt is sent, so the LLM streams while the TTS provider is still connecting, as it
+    # would in a voice agent; None marks the end of the response and an exception is handed on to the provider
+    try:
+        async for token in tokens:
+            queue.put_nowait(token)
+    except Exception as e:
+        queue.put_nowait(e)
+        return
+    queue.put_nowait(None)
+
+
+async def _drain_tokens(queue: asyncio.Queue) -> AsyncIterator[str]:
+    while (token := await queue.get()) is not None:
+        if isinstance(token, Exception):
+            raise token
+        yield token
+
+
+async def _timed_text_chunks(text_chunks: AsyncIterator[str],
+                             latency_data: PipelineLatencyData) -> AsyncIterator[str]:
+    async for text_chunk in text_chunks:
+        yield text_chunk
+        # Providers only ask for the next chunk once they have sent this one
+        if latency_data.first_text_sent_timestamp is None:
+            latency_data.first_text_sent_timestamp = time.perf_counter()
+
+
+def gpt_token_source(prompt: str = gpt_client.GPT_PROMPT, logger=gpt_client.logger) -> TokenSource:
+    def tokens():
+        return gpt_client.get_gpt_response_stream_async(logger=logger, prompt=prompt)
+
+    return tokens
+
+
+async def run_pipeline(provider: TTSProvider, token_source: TokenSource, sink: Optional[AudioSink] = None,
+                       connection_mode: ConnectionMode = ConnectionMode.WARM, chunker: Optional[Chunker] = None,
+                       logger=None) -> PipelineLatencyData:
+    if not logger:
+        logger = logging.getLogger("pipeline")
+    latency_data = PipelineLatencyData(provider=provider.name, connection_mode=connection_mode)
+    sink = _FirstAudioSink(sink or create_sink(f"pipeline_{provider.name}"), latency_data)
+
+    # The token source starts at prompt time, not when the provider pulls its first chunk after connecting, so the
+    # LLM's time to first token does not include the TTS connection set-up
+    queue = asyncio.Queue()
+    latency_data.prompt_sent_timestamp = time.perf_counter()
+    pump = asyncio.create_task(_pump_tokens(_timed_tokens(token_source(), latency_data), queue))
+    try:
+        tokens = _drain_tokens(queue)
+        text_chunks = _timed_text_chunks(chunker.chunk(tokens) if chunker else tokens, latency_data)
+        tts_latency_data = await provider.synthesize_streaming_input(
+            text_chunks,
+            sink=sink,
+            connection_mode=connection_mode,
+            logger=logger,
+        )
+    finally:
+        pump.cancel()
+    latency_data.completed_timestamp = time.perf_counter()
+    latency_data.audio_bytes = sink.bytes_written
+    latency_data.spans = tts_latency_data.spans
+    latency_data.timeline = tts_latency_data.timeline
+
+    if latency_data.first_audio_timestamp is None or latency_data.first_text_sent_timestamp is None:
+        logger.debug(f"No audio from {latency_data.tokens} LLM tokens")
+    else:
+        logger.debug(f"LLM first token {latency_data.llm_time_to_first_token:.3f}, "
+                     f"first text sent {latency_data.time_to_first_text_sent:.3f}, "
+                     f"prompt to first audio {latency_data.time_to_first_audio:.3f}")
+    return latency_data
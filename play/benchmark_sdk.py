@@ -1,13 +1,53 @@
 import logging
 import os
+import threading
 import time
 from enum import Enum
-from typing import Optional, Iterable
+from typing import List, Optional, Iterable
 
 from pydantic import BaseModel
 from pyht import Client, TTSOptions
 from pyht.protos import api_pb2
 
+from client_overhead import chunk_loop_profile
+from connection_pool import ConnectionMode
+from play.tracing import instrument_client
+from session_trace import (
+    FrameKind,
+    SessionRecorder,
+    start_capture,
+)
+from sinks import (
+    AudioSink,
+    create_sink,
+)
+from timeline import (
+    ChunkTimeline,
+    TextChunkLog,
+)
+from tracing import (
+    SPAN_FIRST_BYTE,
+    SPAN_REQUEST,
+    SPAN_SERVER,
+    SPAN_STREAM,
+    RequestTrace,
+    Span,
+    current_trace,
+)
+
+
+def _create_client(api_url: Optional[str] = None, grpc_addr: Optional[str] = None) -> Client:
+    advanced_options = {}
+    if api_url:
+        advanced_options["api_url"] = api_url
+    if grpc_addr:
+        advanced_options.update(grpc_addr=grpc_addr, insecure=True)
+    return instrument_client(Client(
+        user_id=os.environ.get("PLAY_HT_USER_ID", "stand-in" if advanced_options else None),
+        api_key=os.environ.get("PLAY_HT_API_KEY", "stand-in" if advanced_options else None),
+        advanced=Client.AdvancedOptions(**advanced_options) if advanced_options else None,
+    ))
+
 
 class PlayHTMode(Enum):
     STREAMING = "play_ht_streaming"
@@ -16,18 +56,34 @@ class PlayHTMode(Enum):
 
 class LatencyData(BaseModel):
     mode: PlayHTMode
+    connection_mode: Optional[ConnectionMode] = None
     response_generation_time: Optional[float] = None
     header_generation_time: Optional[float] = None
     first_chunk_generation_time: Optional[float] = None
+    audio_bytes: Optional[int] = None
+    spans: List[Span] = []
+    timeline: Optional[ChunkTimeline] = None
+    # Input streaming only
+    text_chunks: Optional[TextChunkLog] = None
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    @property
+    def time_to_first_audio(self):
+        return self.response_generation_time + self.header_generation_time + self.first_chunk_generation_time
 
 
 class PlayHTSDKBenchmark:
     logger = logging.getLogger("playht_sdk_benchmark")
     logger.setLevel(logging.DEBUG)
-    client = Client(
-        user_id=os.environ.get("PLAY_HT_USER_ID"),
-        api_key=os.environ.get("PLAY_HT_API_KEY"),
-    )
+    api_url = os.environ.get("PLAY_HT_API_URL")
+    grpc_addr = os.environ.get("PLAY_HT_GRPC_ADDR")
+    # The SDK multiplexes every call over one gRPC (HTTP/2) channel per client, so the shared client is the warm pool.
+    # It is opened on first use, not at import.
+    client: Optional[Client] = None
+    # Runs on the bridge's worker threads, so the first calls can race to open the channel
+    _client_lock = threading.Lock()
     options = TTSOptions(
         format=api_pb2.FORMAT_MP3,
         quality="faster",
@@ -35,64 +91,144 @@ class PlayHTSDKBenchmark:
     )
 
     @staticmethod
-    def _write_audio_chunks_to_file(stream: Iterable, latency_data: LatencyData, logger):
-        with open("playht_sdk_benchmark.mp3", "wb") as f:
-            is_first_chunk = True
-            start_time = time.time()
-            for audio_chunk in stream:
-                if is_first_chunk:
-                    first_chunk_generation_time = time.time() - start_time
-                    logger.debug(f"First chunk generation time: {time.time() - start_time:.2f}")
-                    latency_data.first_chunk_generation_time = first_chunk_generation_time
-                    is_first_chunk = False
-                f.write(audio_chunk)
-        logger.info("Audio chunks written to file")
+    def set_base_url(api_url: str, grpc_addr: Optional[str] = None):
+        PlayHTSDKBenchmark.api_url = api_url
+        PlayHTSDKBenchmark.grpc_addr = grpc_addr
+        PlayHTSDKBenchmark.client = None
+
+    @staticmethod
+    def set_voice(voice: str):
+        PlayHTSDKBenchmark.options.voice = voice
 
     @staticmethod
-    def _create_speech(text: str, latency_data: LatencyData, logger):
-        response_start_time = time.time()
-        response = PlayHTSDKBenchmark.client.tts(text=text, options=PlayHTSDKBenchmark.options)
-        response_end_time = time.time()
+    def get_client() -> Client:
+        with PlayHTSDKBenchmark._client_lock:
+            if PlayHTSDKBenchmark.client is None:
+                PlayHTSDKBenchmark.client = _create_client(api_url=PlayHTSDKBenchmark.api_url,
+                                                           grpc_addr=PlayHTSDKBenchmark.grpc_addr)
+            return PlayHTSDKBenchmark.client
+
+    @staticmethod
+    def _write_audio_chunks(stream: Iterable, latency_data: LatencyData, sink: AudioSink, trace: RequestTrace,
+                            logger):
+        is_first_chunk = True
+        start_time = time.perf_counter()
+        trace.start(SPAN_FIRST_BYTE)
+        for audio_chunk in stream:
+            if is_first_chunk:
+                first_chunk_generation_time = time.perf_counter() - start_time
+                trace.end(SPAN_FIRST_BYTE)
+                trace.start(SPAN_STREAM)
+                logger.debug(f"First chunk generation time: {time.perf_counter() - start_time:.2f}")
+                latency_data.first_chunk_generation_time = first_chunk_generation_time
+                is_first_chunk = False
+            trace.timeline.record(len(audio_chunk))
+            if trace.capture:
+                trace.capture.record(FrameKind.BODY_CHUNK, audio_chunk)
+            sink.write(audio_chunk)
+        trace.end(SPAN_STREAM)
+        logger.info(f"{sink.bytes_written} audio bytes written to {type(sink).__name__}")
+
+    @staticmethod
+    def _create_speech(client: Client, text: str, latency_data: LatencyData, sink: AudioSink, trace: RequestTrace,
+                       logger):
+        if trace.capture:
+            trace.capture.record(FrameKind.REQUEST, text)
+        response_start_time = time.perf_counter()
+        trace.start(SPAN_REQUEST)
+        response = client.tts(text=text, options=PlayHTSDKBenchmark.options)
+        response_end_time = time.perf_counter()
+        trace.end(SPAN_REQUEST)
         response_generation_time = response_end_time - response_start_time
         logger.debug(f"Response generation time: {response_generation_time:.2f}")
         latency_data.response_generation_time = response_generation_time
 
-        header_start_time = time.time()
+        header_start_time = time.perf_counter()
+        trace.start(SPAN_SERVER)
         header = next(response)
-        header_end_time = time.time()
+        header_end_time = time.perf_counter()
+        trace.end(SPAN_SERVER)
+        if trace.capture:
+            trace.capture.record(FrameKind.HEADER, header)
         header_generation_time = header_end_time - header_start_time
         logger.debug(f"Header generation time: {header_generation_time:.2f}")
         latency_data.header_generation_time = header_generation_time
 
-        PlayHTSDKBenchmark._write_audio_chunks_to_file(stream=response, latency_data=latency_data, logger=logger)
+        PlayHTSDKBenchmark._write_audio_chunks(stream=response, latency_data=latency_data, sink=sink, trace=trace,
+                                               logger=logger)
 
     @staticmethod
-    def _create_live_speech(text_stream: Iterable, latency_data: LatencyData, logger):
-        response_start_time = time.time()
-        response = PlayHTSDKBenchmark.client.stream_tts_input(text_stream=text_stream,
-                                                              options=PlayHTSDKBenchmark.options)
-        response_end_time = time.time()
+    def _logged_text_stream(text_stream: Iterable, text_chunks: TextChunkLog, capture: Optional[SessionRecorder]):
+        # The SDK pulls each chunk when it is about to send it, which is as close to the send as its API lets us get
+        for text_chunk in text_stream:
+            text_chunks.record(text_chunk)
+            if capture:
+                capture.record(FrameKind.TEXT_SENT, text_chunk)
+            yield text_chunk
+
+    @staticmethod
+    def _create_live_speech(client: Client, text_stream: Iterable, latency_data: LatencyData, sink: AudioSink,
+                            trace: RequestTrace, logger):
+        latency_data.text_chunks = TextChunkLog()
+        response_start_time = time.perf_counter()
+        trace.start(SPAN_REQUEST)
+        response = client.stream_tts_input(
+            text_stream=PlayHTSDKBenchmark._logged_text_stream(text_stream, latency_data.text_chunks, trace.capture),
+            options=PlayHTSDKBenchmark.options,
+        )
+        response_end_time = time.perf_counter()
+        trace.end(SPAN_REQUEST)
         response_generation_time = response_end_time - response_start_time
         logger.debug(f"Response generation time: {response_generation_time:.2f}")
         latency_data.response_generation_time = response_generation_time
 
-        header_start_time = time.time()
+        header_start_time = time.perf_counter()
+        trace.start(SPAN_SERVER)
         header = next(response)
-        header_end_time = time.time()
+        header_end_time = time.perf_counter()
+        trace.end(SPAN_SERVER)
+        if trace.capture:
+            trace.capture.record(FrameKind.HEADER, header)
         header_generation_time = header_end_time - header_start_time
         logger.debug(f"Header generation time: {header_generation_time:.2f}")
         latency_data.header_generation_time = header_generation_time
 
-        PlayHTSDKBenchmark._write_audio_chunks_to_file(stream=response, latency_data=latency_data, logger=logger)
+        PlayHTSDKBenchmark._write_audio_chunks(stream=response, latency_data=latency_data, sink=sink, trace=trace,
+                                               logger=logger)
 
     @staticmethod
-    def run(synthesis_input, mode=PlayHTMode.STREAMING, logger=None):
+    def run(synthesis_input, mode=PlayHTMode.STREAMING, logger=None, connection_mode=ConnectionMode.WARM,
+            sink: Optional[AudioSink] = None):
         if not logger:
             logger = PlayHTSDKBenchmark.logger
-        latency_data = LatencyData(mode=mode)
-        if mode == PlayHTMode.STREAMING:
-            PlayHTSDKBenchmark._create_speech(text=synthesis_input, latency_data=latency_data, logger=logger)
+        if not sink:
+            sink = create_sink("playht_sdk_benchmark")
+        latency_data = LatencyData(mode=mode, connection_mode=connection_mode)
+        if connection_mode == ConnectionMode.WARM:
+            client = PlayHTSDKBenchmark.get_client()
         else:
-            PlayHTSDKBenchmark._create_live_speech(text_stream=synthesis_input, latency_data=latency_data,
-                                                   logger=logger)
+            client = _create_client(api_url=PlayHTSDKBenchmark.api_url, grpc_addr=PlayHTSDKBenchmark.grpc_addr)
+
+        trace = RequestTrace()
+        trace.capture = start_capture("playht", "streaming" if mode == PlayHTMode.STREAMING else "input_streaming",
+                                      connection_mode=connection_mode)
+        trace_token = current_trace.set(trace)
+        try:
+            with sink, chunk_loop_profile("playht"):
+                if mode == PlayHTMode.STREAMING:
+                    PlayHTSDKBenchmark._create_speech(client=client, text=synthesis_input, latency_data=latency_data,
+                                                      sink=sink, trace=trace, logger=logger)
+                else:
+                    PlayHTSDKBenchmark._create_live_speech(client=client, text_stream=synthesis_input,
+                                                           latency_data=latency_data, sink=sink, trace=trace,
+                                                           logger=logger)
+        finally:
+            current_trace.reset(trace_token)
+            if connection_mode == ConnectionMode.COLD:
+                client.close()
+        latency_data.audio_bytes = sink.bytes_written
+        latency_data.spans = trace.finish()
+        latency_data.timeline = trace.timeline
+        if trace.capture:
+            trace.capture.close()
         return latency_data
@@ -0,0 +1,121 @@
+import asyncio
+import json
+import time
+from typing import Optional
+
+import grpc
+from aiohttp import web
+from pyht.protos import api_pb2, api_pb2_grpc
+
+from latency_model import (
+    LATENCY_PRESETS,
+    LatencyModel,
+)
+from session_trace import (
+    SessionLibrary,
+    replay_frames,
+)
+from stand_in import (
+    DEFAULT_FRAMES_PER_CHUNK,
+    start_app,
+    stream_audio_chunks,
+    stream_audio_response,
+    stream_replay_response,
+)
+
+DEFAULT_PORT = 8083
+DEFAULT_GRPC_PORT = 8084
+
+# pyht leases are a 64 byte signature, then creation time and duration as big endian seconds since the lease epoch,
+# then JSON metadata holding the inference address the client opens its gRPC channel to
+LEASE_EPOCH = 1519257480
+LEASE_DURATION = 24 * 60 * 60
+ID3_HEADER = b"ID3\x04\x00\x00\x00\x00\x00\x00"
+
+
+def _lease(inference_address: str) -> bytes:
+    created = int(time.time()) - LEASE_EPOCH
+    metadata = json.dumps(dict(inference_address=inference_address, premium_inference_address=inference_address))
+    return bytes(64) + created.to_bytes(4, "big") + LEASE_DURATION.to_bytes(4, "big") + metadata.encode()
+
+
+class TtsServicer(api_pb2_grpc.TtsServicer):
+
+    def __init__(self, latency_model: LatencyModel, frames_per_chunk: int, replay: Optional[SessionLibrary] = None,
+                 replay_speed: float = 1.0):
+        self.latency_model = latency_model
+        self.frames_per_chunk = frames_per_chunk
+        self.replay = replay
+        self.replay_speed = replay_speed
+
+    async def Tts(self, request, context):
+        if self.replay:
+            # Streamed input reaches the server as one independent Tts call per text segment, as it does PlayHT's,
+            # so every call replays one recorded streaming session. Input streaming sessions are not replayed: their
+            # recording does not show where the SDK split the text, so their audio cannot be cut back into segments.
+            try:
+                trace = self.replay.next("playht", "streaming")
+            except LookupError as e:
+                await context.abort(grpc.StatusCode.NOT_FOUND, str(e))
+            # The recorded header frame comes first, as the real one did
+            async for frame in replay_frames(trace, self.replay_speed):
+                yield api_pb2.TtsResponse(data=frame.payload)
+            return
+        await asyncio.sleep(self.latency_model.handshake_delay())
+        # PlayHTSDKBenchmark consumes the first message as the format header before timing audio chunks
+        yield api_pb2.TtsResponse(data=ID3_HEADER)
+        async for audio_chunk in stream_audio_chunks("".join(request.params.text), latency_model=self.latency_model,
+                                                     frames_per_chunk=self.frames_per_chunk):
+            yield api_pb2.TtsResponse(data=audio_chunk)
+
+
+async def _leases(request: web.Request) -> web.Response:
+    return web.Response(body=_lease(request.app["grpc_address"]), content_type="application/octet-stream")
+
+
+async def _stream(request: web.Request) -> web.StreamResponse:
+    body = await request.json()
+    if replay := request.app["replay"]:
+        try:
+            trace = replay.next("playht", "streaming")
+        except LookupError as e:
+            raise web.HTTPNotFound(text=str(e))
+        return await stream_replay_response(request, trace, speed=request.app["replay_speed"])
+    return await stream_audio_response(request, text=body["text"], latency_model=request.app["latency_model"],
+                                       frames_per_chunk=request.app["frames_per_chunk"])
+
+
+async def _stop_grpc_server(app: web.Application):
+    await app["grpc_server"].stop(grace=None)
+
+
+def create_app(grpc_address: str, latency_model: LatencyModel = None,
+               frames_per_chunk: int = DEFAULT_FRAMES_PER_CHUNK, replay: Optional[SessionLibrary] = None,
+               replay_speed: float = 1.0):
+    app = web.Application()
+    app["grpc_address"] = grpc_address
+    app["latency_model"] = latency_model or LATENCY_PRESETS["instant"]
+    app["frames_per_chunk"] = frames_per_chunk
+    app["replay"] = replay
+    app["replay_speed"] = replay_speed
+    app.router.add_post("/api/v2/leases", _leases)
+    app.router.add_post("/api/v2/tts/stream", _stream)
+    return app
+
+
+async def start_server(host: str = "127.0.0.1", port: int = DEFAULT_PORT, grpc_port: int = DEFAULT_GRPC_PORT,
+                       latency_model: LatencyModel = None, frames_per_chunk: int = DEFAULT_FRAMES_PER_CHUNK,
+                       replay: Optional[SessionLibrary] = None, replay_speed: float = 1.0) -> web.AppRunner:
+    grpc_address = f"{host}:{grpc_port}"
+    app = create_app(grpc_address=grpc_address, latency_model=latency_model, frames_per_chunk=frames_per_chunk,
+                     replay=replay, replay_speed=replay_speed)
+
+    grpc_server = grpc.aio.server()
+    api_pb2_grpc.add_TtsServicer_to_server(TtsServicer(app["latency_model"], frames_per_chunk, replay=replay,
+                                                       replay_speed=replay_speed), grpc_server)
+    grpc_server.add_insecure_port(grpc_address)
+    await grpc_server.start()
+    app["grpc_server"] = grpc_server
+    app.on_cleanup.append(_stop_grpc_server)
+
+    return await start_app(app, host=host, port=port)
@@ -0,0 +1,37 @@
+from typing import AsyncIterator, Optional
+
+from connection_pool import ConnectionMode
+from play.benchmark_sdk import (
+    PlayHTSDKBenchmark,
+    PlayHTMode,
+)
+from providers import BlockingSdkProvider
+from sinks import (
+    AudioSink,
+    create_sink,
+)
+
+
+class PlayHTProvider(BlockingSdkProvider):
+    name = "playht"
+    supports_input_streaming = True
+    voice = PlayHTSDKBenchmark.options.voice
+    # The voice manifest selects the engine, there is no separate model setting
+    model = None
+
+    def set_voice(self, voice: str):
+        PlayHTSDKBenchmark.set_voice(voice)
+        self.voice = voice
+
+    async def synthesize(self, text: str, sink: Optional[AudioSink] = None,
+                         connection_mode: ConnectionMode = ConnectionMode.WARM, logger=None):
+        return await self.bridge.run(PlayHTSDKBenchmark.run, sink=sink or create_sink("playht_sdk_benchmark"),
+                                     synthesis_input=text, mode=PlayHTMode.STREAMING, logger=logger,
+                                     connection_mode=connection_mode)
+
+    async def synthesize_streaming_input(self, text_chunks: AsyncIterator[str], sink: Optional[AudioSink] = None,
+                                         connection_mode: ConnectionMode = ConnectionMode.WARM, logger=None):
+        return await self.bridge.run(PlayHTSDKBenchmark.run, sink=sink or create_sink("playht_sdk_benchmark"),
+                                     synthesis_input=self.bridge.text_chunks(text_chunks),
+                                     mode=PlayHTMode.INPUT_STREAMING, logger=logger,
+                                     connection_mode=connection_mode)
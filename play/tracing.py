@@ -0,0 +1,51 @@
+import grpc
+
+from tracing import current_trace
+
+SPAN_GRPC_CALL = "grpc_call"
+SPAN_GRPC_STREAM = "grpc_stream"
+
+
+class _TracedResponseIterator:
+
+    def __init__(self, call, trace):
+        self._call = call
+        self._trace = trace
+        self._is_first_message = True
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            message = next(self._call)
+        except StopIteration:
+            self._trace.end(SPAN_GRPC_STREAM)
+            raise
+        if self._is_first_message:
+            self._trace.end(SPAN_GRPC_CALL)
+            self._trace.start(SPAN_GRPC_STREAM)
+            self._is_first_message = False
+        return message
+
+    def __getattr__(self, name):
+        return getattr(self._call, name)
+
+
+class GrpcTracingInterceptor(grpc.UnaryStreamClientInterceptor):
+    # Times each server-streaming RPC from the moment it is issued, which pyht only does lazily on the first next()
+
+    def intercept_unary_stream(self, continuation, client_call_details, request):
+        trace = current_trace.get()
+        if trace is None:
+            return continuation(client_call_details, request)
+        trace.start(SPAN_GRPC_CALL)
+        return _TracedResponseIterator(continuation(client_call_details, request), trace)
+
+
+def instrument_client(client):
+    # pyht keeps its channel private as `_rpc = (address, channel)`; channels opened later are left untraced
+    rpc = getattr(client, "_rpc", None)
+    if isinstance(rpc, tuple) and len(rpc) == 2:
+        client._rpc = (rpc[0], grpc.intercept_channel(rpc[1], GrpcTracingInterceptor()))
+    return client
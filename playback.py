@@ -0,0 +1,275 @@
+import time
+from typing import List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from sinks import AudioSink
+
+DEFAULT_JITTER_BUFFER = 0.1
+
+_MP3_SAMPLE_RATES = {
+    3: (44100, 48000, 32000),  # MPEG-1
+    2: (22050, 24000, 16000),  # MPEG-2
+    0: (11025, 12000, 8000),  # MPEG-2.5
+}
+# Kilobits per second by (MPEG-1, layer) and bitrate index; MPEG-2 and 2.5 share their tables
+_MP3_BITRATES = {
+    (True, 3): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 1): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 3): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 1): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_ID3_HEADER_LENGTH = 10
+# Encoders put a Xing or Info tag (VBR and gapless data) in a silent first frame, right after the side info
+_VBR_INFO_TAGS = (b"Xing", b"Info")
+
+
+def parse_mp3_frame_header(header: bytes) -> Optional[Tuple[int, float]]:
+    # Returns (frame length in bytes, frame duration in seconds) for a valid MPEG audio header, None otherwise
+    if header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return None
+    version = (header[1] >> 3) & 0x03
+    layer = (header[1] >> 1) & 0x03
+    bitrate_index = header[2] >> 4
+    sample_rate_index = (header[2] >> 2) & 0x03
+    # Reserved version or layer, free-format or bad bitrate and reserved sample rate cannot be framed
+    if version == 1 or layer == 0 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+    padding = (header[2] >> 1) & 0x01
+    is_mpeg1 = version == 3
+    sample_rate = _MP3_SAMPLE_RATES[version][sample_rate_index]
+    bitrate = _MP3_BITRATES[(is_mpeg1, layer)][bitrate_index] * 1000
+    if layer == 3:
+        return (12 * bitrate // sample_rate + padding) * 4, 384 / sample_rate
+    samples = 1152 if layer == 2 or is_mpeg1 else 576
+    return samples // 8 * bitrate // sample_rate + padding, samples / sample_rate
+
+
+def is_vbr_info_frame(frame: bytes) -> bool:
+    # Only Layer III frames carry the tag. The side info is 32 bytes long for MPEG-1 and 17 for MPEG-2 and 2.5,
+    # halved to 17 and 9 for mono.
+    if (frame[1] >> 1) & 0x03 != 1:
+        return False
+    is_mpeg1 = (frame[1] >> 3) & 0x03 == 3
+    is_mono = frame[3] >> 6 == 3
+    side_info_length = (17 if is_mono else 32) if is_mpeg1 else (9 if is_mono else 17)
+    return bytes(frame[4 + side_info_length:8 + side_info_length]) in _VBR_INFO_TAGS
+
+
+class FrameParser:
+    # Incremental: `feed` takes arbitrary byte chunks and returns the seconds of audio completed by that chunk
+
+    def __init__(self):
+        self.duration = 0.0
+        self.frames = 0
+
+    def feed(self, chunk: bytes) -> float:
+        raise NotImplementedError
+
+
+class Mp3FrameParser(FrameParser):
+
+    def __init__(self):
+        super().__init__()
+        self._buffer = bytearray()
+        self.skipped_bytes = 0
+        self.skipped_frames = 0
+
+    def _id3_length(self, position: int) -> Optional[int]:
+        header = self._buffer[position:position + _ID3_HEADER_LENGTH]
+        if len(header) < _ID3_HEADER_LENGTH:
+            return None
+        size = (header[6] & 0x7F) << 21 | (header[7] & 0x7F) << 14 | (header[8] & 0x7F) << 7 | header[9] & 0x7F
+        footer = _ID3_HEADER_LENGTH if header[5] & 0x10 else 0
+        return _ID3_HEADER_LENGTH + size + footer
+
+    def feed(self, chunk: bytes) -> float:
+        self._buffer += chunk
+        buffer = self._buffer
+        position = 0
+        duration = 0.0
+        while len(buffer) - position >= 4:
+            if buffer[position:position + 3] == b"ID3":
+                tag_length = self._id3_length(position)
+                if tag_length is None or len(buffer) - position < tag_length:
+                    break
+                position += tag_length
+                continue
+            frame = parse_mp3_frame_header(buffer[position:position + 4])
+            if frame is None:
+                # Not a frame boundary: resynchronise on the next byte
+                position += 1
+                self.skipped_bytes += 1
+                continue
+            frame_length, frame_duration = frame
+            if len(buffer) - position < frame_length:
+                break
+            frame_start = position
+            position += frame_length
+            if not self.frames and not self.skipped_frames and is_vbr_info_frame(buffer[frame_start:position]):
+                # A tag frame, not audio; it can only be the first frame of the stream
+                self.skipped_frames += 1
+                continue
+            duration += frame_duration
+            self.frames += 1
+        del buffer[:position]
+        self.duration += duration
+        return duration
+
+
+class PcmFrameParser(FrameParser):
+
+    def __init__(self, sample_rate: int = 24000, channels: int = 1, sample_width: int = 2):
+        super().__init__()
+        self.frame_size = channels * sample_width
+        self.sample_rate = sample_rate
+        self._remainder = 0
+
+    def feed(self, chunk: bytes) -> float:
+        # A sample can be split across chunks, so the odd bytes are carried over to the next one
+        frames, self._remainder = divmod(self._remainder + len(chunk), self.frame_size)
+        self.frames += frames
+        duration = frames / self.sample_rate
+        self.duration += duration
+        return duration
+
+
+def create_frame_parser(audio_format: str = "mp3") -> FrameParser:
+    # Formats follow the ElevenLabs output_format names: "mp3", "mp3_44100_128", "pcm_16000", "pcm_24000", ...
+    codec, _, params = audio_format.partition("_")
+    if codec == "mp3":
+        return Mp3FrameParser()
+    if codec == "pcm":
+        return PcmFrameParser(sample_rate=int(params.split("_")[0]) if params else 24000)
+    raise ValueError(f"Unknown audio format {audio_format!r}, expected mp3 or pcm_<sample rate>")
+
+
+class PlaybackReport(BaseModel):
+    jitter_buffer: float
+    chunks: int = 0
+    audio_duration: float = 0.0
+    time_to_first_frame: Optional[float] = None
+    time_to_first_audible: Optional[float] = None
+    stream_duration: Optional[float] = None
+    real_time_factor: Optional[float] = None
+    underruns: int = 0
+    underrun_time: float = 0.0
+    min_startup_delay: Optional[float] = None
+    min_startup_buffer: Optional[float] = None
+
+
+class PlaybackSimulator:
+    # Plays arriving audio in real time behind a jitter buffer: playback starts, and resumes after an underrun,
+    # once `jitter_buffer` seconds of audio are buffered or the stream has ended. All times are relative to
+    # `started_at`, normally the moment the request was sent.
+
+    def __init__(self, jitter_buffer: float = DEFAULT_JITTER_BUFFER, started_at: Optional[float] = None):
+        self.jitter_buffer = jitter_buffer
+        self.started_at = time.perf_counter() if started_at is None else started_at
+        self.arrivals: List[Tuple[float, float]] = []
+        self._playing = False
+        self._buffered = 0.0
+        self._last_time = 0.0
+        self._first_audible: Optional[float] = None
+        self._underruns = 0
+        self._underrun_time = 0.0
+        # When the buffer last ran dry, while playback waits for it to refill to `jitter_buffer`
+        self._stalled_at: Optional[float] = None
+
+    def add(self, duration: float, arrived_at: Optional[float] = None):
+        now = (time.perf_counter() if arrived_at is None else arrived_at) - self.started_at
+        if not duration:
+            return
+        self.arrivals.append((now, duration))
+        if self._playing:
+            elapsed = now - self._last_time
+            if self._buffered >= elapsed:
+                self._buffered -= elapsed
+            else:
+                self._underruns += 1
+                self._stalled_at = self._last_time + self._buffered
+                self._buffered = 0.0
+                self._playing = False
+        self._buffered += duration
+        self._last_time = now
+        if not self._playing and self._buffered >= self.jitter_buffer:
+            self._start(now)
+
+    def _start(self, now: float):
+        self._playing = True
+        if self._first_audible is None:
+            self._first_audible = now
+        if self._stalled_at is not None:
+            # The stall lasts until the buffer has refilled, not just until the next chunk arrives
+            self._underrun_time += now - self._stalled_at
+            self._stalled_at = None
+
+    def _min_startup(self) -> Tuple[Optional[float], Optional[float]]:
+        # Playback is gap free if it has not yet played through the audio received before a chunk when that chunk
+        # arrives, i.e. arrival - start <= received before, so the earliest such start is max(arrival - received)
+        if not self.arrivals:
+            return None, None
+        received = 0.0
+        start = 0.0
+        for arrived_at, duration in self.arrivals:
+            start = max(start, arrived_at - received)
+            received += duration
+        # A buffer threshold only starts playback when a chunk lands, so the smallest gap-free threshold is the
+        # audio buffered once the first chunk at or after that start has arrived
+        buffered = 0.0
+        for arrived_at, duration in self.arrivals:
+            buffered += duration
+            if arrived_at >= start:
+                break
+        return start, buffered
+
+    def report(self, ended_at: Optional[float] = None) -> PlaybackReport:
+        ended = (time.perf_counter() if ended_at is None else ended_at) - self.started_at
+        first_audible = self._first_audible
+        if first_audible is None and self.arrivals:
+            # The whole stream was shorter than the jitter buffer, so playback starts when the stream ends
+            first_audible = ended
+        audio_duration = sum(duration for _, duration in self.arrivals)
+        min_startup_delay, min_startup_buffer = self._min_startup()
+        underrun_time = self._underrun_time
+        if self._stalled_at is not None:
+            # Still refilling when the stream ended, when playback resumes with whatever is buffered
+            underrun_time += max(0.0, ended - self._stalled_at)
+        return PlaybackReport(
+            jitter_buffer=self.jitter_buffer,
+            chunks=len(self.arrivals),
+            audio_duration=audio_duration,
+            time_to_first_frame=self.arrivals[0][0] if self.arrivals else None,
+            time_to_first_audible=first_audible,
+            stream_duration=self.arrivals[-1][0] if self.arrivals else None,
+            # Below 1 the provider delivers audio faster than it plays
+            real_time_factor=self.arrivals[-1][0] / audio_duration if audio_duration else None,
+            underruns=self._underruns,
+            underrun_time=underrun_time,
+            min_startup_delay=min_startup_delay,
+            min_startup_buffer=min_startup_buffer,
+        )
+
+
+class PlaybackSink(AudioSink):
+    # Parses every chunk as it arrives and feeds its audio duration to a simulated player, then passes the bytes on
+
+    def __init__(self, sink: AudioSink, audio_format: str = "mp3", jitter_buffer: float = DEFAULT_JITTER_BUFFER):
+        super().__init__()
+        self.sink = sink
+        self.parser = create_frame_parser(audio_format)
+        self.simulator = PlaybackSimulator(jitter_buffer=jitter_buffer)
+
+    def write(self, chunk: bytes):
+        arrived_at = time.perf_counter()
+        self.bytes_written += len(chunk)
+        self.simulator.add(self.parser.feed(chunk), arrived_at=arrived_at)
+        self.sink.write(chunk)
+
+    def close(self):
+        self.sink.close()
+
+    def report(self) -> PlaybackReport:
+        return self.simulator.report()
@@ -0,0 +1,196 @@
+import asyncio
+import functools
+import importlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from importlib.metadata import entry_points
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Protocol, Union
+
+from connection_pool import ConnectionMode
+from sinks import AudioSink
+
+DEFAULT_BLOCKING_WORKERS = 32
+# Third-party packages add providers by declaring an entry point in this group, e.g. in pyproject.toml:
+#   [project.entry-points."benchmark_tts.providers"]
+#   my_tts = "my_package.provider:MyTTSProvider"
+PROVIDER_ENTRY_POINT_GROUP = "benchmark_tts.providers"
+# "module:attribute" targets, the same format entry points use, so nothing is imported until a provider is used
+BUILTIN_PROVIDERS = {
+    "eleven_labs": "eleven.provider:ElevenLabsApiProvider",
+    "eleven_labs_sdk": "eleven.sdk_provider:ElevenLabsSdkProvider",
+    "openai": "open.provider:OpenAIProvider",
+    "playht": "play.provider:PlayHTProvider",
+}
+
+
+class TTSProvider(Protocol):
+    name: str
+    supports_input_streaming: bool
+    voice: Optional[str]
+    model: Optional[str]
+
+    def set_voice(self, voice: str):
+        # Voices are process wide settings of the benchmark behind the provider, not per call
+        ...
+
+    async def synthesize(self, text: str, sink: Optional[AudioSink] = None,
+                         connection_mode: ConnectionMode = ConnectionMode.WARM, logger=None):
+        ...
+
+    async def synthesize_streaming_input(self, text_chunks: AsyncIterator[str], sink: Optional[AudioSink] = None,
+                                         connection_mode: ConnectionMode = ConnectionMode.WARM, logger=None):
+        ...
+
+    async def close(self):
+        ...
+
+
+class SynthesisCancelled(Exception):
+    pass
+
+
+class QueueSink(AudioSink):
+    # Lives on an SDK thread and hands every chunk to the event loop, which writes it into the caller's sink
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, chunks: asyncio.Queue):
+        super().__init__()
+        self._loop = loop
+        self._chunks = chunks
+        self.cancelled = threading.Event()
+
+    def write(self, chunk: bytes):
+        # A thread cannot be interrupted, so a cancelled synthesis unwinds the SDK's stream from its next chunk
+        if self.cancelled.is_set():
+            raise SynthesisCancelled()
+        self.bytes_written += len(chunk)
+        self._loop.call_soon_threadsafe(self._chunks.put_nowait, chunk)
+
+
+def _retrieve_exception(future: asyncio.Future):
+    if not future.cancelled():
+        future.exception()
+
+
+async def _next_text_chunk(text_chunks: AsyncIterator[str]) -> str:
+    return await text_chunks.__anext__()
+
+
+def _blocking_text_chunks(text_chunks: AsyncIterator[str], loop: asyncio.AbstractEventLoop) -> Iterator[str]:
+    # Lets a blocking SDK pull text from an async producer that keeps running on the event loop
+    while True:
+        try:
+            yield asyncio.run_coroutine_threadsafe(_next_text_chunk(text_chunks), loop).result()
+        except StopAsyncIteration:
+            return
+
+
+class BlockingSdkBridge:
+    # Runs a blocking SDK benchmark on a bounded thread pool. Timings are taken on the SDK thread and audio is
+    # forwarded to the event loop through a queue, so one loop can drive every provider at once without the
+    # blocking iterators of one provider stalling the others.
+
+    def __init__(self, executor: Optional[ThreadPoolExecutor] = None, max_workers: int = DEFAULT_BLOCKING_WORKERS):
+        self._owns_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tts-sdk")
+
+    @staticmethod
+    def text_chunks(text_chunks: AsyncIterator[str]) -> Iterator[str]:
+        return _blocking_text_chunks(text_chunks, asyncio.get_running_loop())
+
+    async def run(self, run: Callable, sink: AudioSink, **kwargs):
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue()
+        queue_sink = QueueSink(loop, chunks)
+        future = loop.run_in_executor(self.executor, functools.partial(run, sink=queue_sink, **kwargs))
+        # The future completes through the same thread-safe callback queue as the chunks, so this marker is always
+        # seen after the last chunk
+        future.add_done_callback(lambda _: chunks.put_nowait(None))
+        try:
+            with sink:
+                while (chunk := await chunks.get()) is not None:
+                    sink.write(chunk)
+            return await future
+        except BaseException:
+            queue_sink.cancelled.set()
+            # Nobody awaits the abandoned SDK call any more, so its SynthesisCancelled is collected here instead of
+            # being reported as never retrieved
+            future.add_done_callback(_retrieve_exception)
+            raise
+
+    def close(self):
+        if self._owns_executor:
+            self.executor.shutdown(wait=True)
+
+
+class BlockingSdkProvider:
+    # Base for providers that run a blocking SDK through a BlockingSdkBridge. A bridge passed in is shared with other
+    # providers and stays open until its owner closes it; without one the provider creates its own and closes it.
+
+    def __init__(self, bridge: Optional[BlockingSdkBridge] = None):
+        self._owns_bridge = bridge is None
+        self.bridge = bridge or BlockingSdkBridge()
+
+    async def close(self):
+        if self._owns_bridge:
+            self.bridge.close()
+
+
+def _load_target(target: str) -> type:
+    module_name, _, attribute = target.partition(":")
+    provider_class = importlib.import_module(module_name)
+    for name in attribute.split("."):
+        provider_class = getattr(provider_class, name)
+    return provider_class
+
+
+class ProviderRegistry:
+    # Maps provider names to their classes without importing them: a provider's module, and the SDK behind it, is
+    # only imported the first time that provider is looked up, so a run against one provider never pays the
+    # start-up cost or the import failures of the others
+
+    def __init__(self, providers: Optional[Dict[str, str]] = None,
+                 entry_point_group: Optional[str] = PROVIDER_ENTRY_POINT_GROUP):
+        self._targets: Dict[str, Union[str, type]] = dict(BUILTIN_PROVIDERS if providers is None else providers)
+        self._classes: Dict[str, type] = {}
+        self._entry_point_group = entry_point_group
+        self._discovered = entry_point_group is None
+
+    def register(self, name: str, target: Union[str, type]):
+        self._targets[name] = target
+        self._classes.pop(name, None)
+
+    def _discover(self):
+        if self._discovered:
+            return
+        self._discovered = True
+        # Built-in and explicitly registered providers win over a plugin of the same name
+        for entry_point in entry_points(group=self._entry_point_group):
+            self._targets.setdefault(entry_point.name, entry_point.value)
+
+    def names(self) -> List[str]:
+        self._discover()
+        return list(self._targets)
+
+    def provider_class(self, name: str) -> type:
+        if name not in self._classes:
+            if name not in self._targets:
+                self._discover()
+            if name not in self._targets:
+                raise ValueError(f"Unknown provider {name!r}, expected one of {', '.join(self.names())}")
+            target = self._targets[name]
+            self._classes[name] = _load_target(target) if isinstance(target, str) else target
+        return self._classes[name]
+
+    def create(self, name: str, **options) -> TTSProvider:
+        return self.provider_class(name)(**options)
+
+
+registry = ProviderRegistry()
+
+
+def provider_class(name: str) -> type:
+    return registry.provider_class(name)
+
+
+def create_provider(name: str, **options) -> TTSProvider:
+    return registry.create(name, **options)
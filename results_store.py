@@ -0,0 +1,317 @@
+import os
+import queue
+import socket
+import sqlite3
+import subprocess
+import threading
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from pydantic import BaseModel
+
+from stats import (
+    LATENCY_FIELDS,
+    field_value,
+    mann_whitney_greater,
+)
+from timeline import sorted_percentile
+from tracing import phase_durations
+
+DEFAULT_RESULTS_PATH = os.environ.get("BENCHMARK_RESULTS_DB", os.path.join("benchmark_output", "results.db"))
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_MAX_PENDING_BATCHES = 4
+DEFAULT_ALPHA = 0.01
+DEFAULT_MIN_EFFECT = 0.05
+RECORDED_FIELDS = LATENCY_FIELDS + (
+    "time_to_first_audio",
+    "hidden_handshake_time",
+    "response_generation_time",
+    "llm_time_to_first_token",
+    "time_to_first_text_sent",
+    "tts_time_to_first_audio",
+    "total_time",
+    "service_time_to_first_audio",
+    "send_lag",
+    "client_overhead_time",
+)
+PHASE_METRIC_PREFIX = "phase."
+TIMELINE_METRIC_PREFIX = "timeline."
+TIMELINE_FIELDS = ("bytes_per_second", "gap_p50", "gap_p90", "gap_max", "stalls", "stall_time")
+TEXT_ATTRIBUTION_METRIC_PREFIX = "text_to_audio."
+TEXT_ATTRIBUTION_FIELDS = ("first", "p50", "p90", "max")
+# Everything else is a latency, where up is worse
+HIGHER_IS_BETTER = {f"{TIMELINE_METRIC_PREFIX}bytes_per_second"}
+_RUN_COLUMNS = ("run_id", "started_at", "label", "provider", "mode", "voice", "model", "text_length", "concurrency",
+                "host", "git_revision")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    started_at REAL NOT NULL,
+    label TEXT,
+    provider TEXT NOT NULL,
+    mode TEXT,
+    voice TEXT,
+    model TEXT,
+    text_length INTEGER,
+    concurrency INTEGER,
+    host TEXT,
+    git_revision TEXT
+);
+CREATE TABLE IF NOT EXISTS samples (
+    run_id TEXT NOT NULL REFERENCES runs (run_id),
+    sequence INTEGER NOT NULL,
+    recorded_at REAL NOT NULL,
+    metric TEXT NOT NULL,
+    value REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS samples_by_run_metric ON samples (run_id, metric);
+CREATE TABLE IF NOT EXISTS baselines (
+    name TEXT PRIMARY KEY,
+    run_id TEXT NOT NULL REFERENCES runs (run_id)
+);
+"""
+
+
+def git_revision() -> Optional[str]:
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                  cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return revision.stdout.strip() or None
+
+
+class RunMetadata(BaseModel):
+    run_id: str = ""
+    started_at: float = 0.0
+    label: Optional[str] = None
+    provider: str
+    mode: Optional[str] = None
+    voice: Optional[str] = None
+    model: Optional[str] = None
+    text_length: Optional[int] = None
+    concurrency: int = 1
+    host: Optional[str] = None
+    git_revision: Optional[str] = None
+
+    @staticmethod
+    def for_provider(provider, mode: str, text_length: Optional[int] = None, concurrency: int = 1,
+                     label: Optional[str] = None) -> "RunMetadata":
+        return RunMetadata(
+            label=label,
+            provider=provider.name,
+            mode=mode,
+            voice=provider.voice,
+            model=provider.model,
+            text_length=text_length,
+            concurrency=concurrency,
+        )
+
+
+def latency_metrics(latency_data) -> List[Tuple[str, float]]:
+    metrics = [(field, float(value)) for field in RECORDED_FIELDS
+               if (value := field_value(latency_data, field)) is not None]
+    metrics.extend((f"{PHASE_METRIC_PREFIX}{phase}", duration)
+                   for phase, duration in phase_durations(getattr(latency_data, "spans", [])).items())
+    if timeline := getattr(latency_data, "timeline", None):
+        timeline_summary = timeline.summary()
+        metrics.extend((f"{TIMELINE_METRIC_PREFIX}{field}", float(value)) for field in TIMELINE_FIELDS
+                       if (value := getattr(timeline_summary, field)) is not None)
+        if text_chunks := getattr(latency_data, "text_chunks", None):
+            text_summary = text_chunks.summary(timeline)
+            metrics.extend((f"{TEXT_ATTRIBUTION_METRIC_PREFIX}{field}", value) for field in TEXT_ATTRIBUTION_FIELDS
+                           if (value := getattr(text_summary, field)) is not None)
+    return metrics
+
+
+def _connect(path: str, check_same_thread: bool = True) -> sqlite3.Connection:
+    if directory := os.path.dirname(path):
+        os.makedirs(directory, exist_ok=True)
+    # WAL lets the load generator's worker processes append to one database while it is being read
+    connection = sqlite3.connect(path, timeout=30, check_same_thread=check_same_thread)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(_SCHEMA)
+    return connection
+
+
+class ResultsWriter:
+    # Buffers at most `batch_size` samples and appends them in one transaction, so soak runs stream to disk with
+    # flat memory. Each writer owns its connection and can live in any process. Transactions run on a thread of the
+    # writer's own, since waiting out other processes' write locks on the event loop would stall every request being
+    # timed on it. At most `max_pending_batches` wait for that thread; past that, flushing blocks until the disk
+    # catches up, so a slow disk cannot grow memory without bound.
+
+    def __init__(self, path: str, run_id: str, batch_size: int = DEFAULT_BATCH_SIZE,
+                 max_pending_batches: int = DEFAULT_MAX_PENDING_BATCHES):
+        self.run_id = run_id
+        self.batch_size = batch_size
+        self.sequence = 0
+        self._connection = _connect(path, check_same_thread=False)
+        self._rows = []
+        self._batches: queue.Queue = queue.Queue(maxsize=max_pending_batches)
+        self._error: Optional[sqlite3.Error] = None
+        self._thread = threading.Thread(target=self._write_batches, name="results-writer", daemon=True)
+        self._thread.start()
+
+    def _write_batches(self):
+        # None marks the end of the run
+        while (rows := self._batches.get()) is not None:
+            try:
+                with self._connection:
+                    self._connection.executemany("INSERT INTO samples VALUES (?, ?, ?, ?, ?)", rows)
+            except sqlite3.Error as e:
+                self._error = self._error or e
+
+    def record(self, latency_data):
+        # A failed write is reported at the next sample instead of only when the run closes
+        if self._error:
+            raise self._error
+        recorded_at = time.time()
+        self._rows.extend((self.run_id, self.sequence, recorded_at, metric, value)
+                          for metric, value in latency_metrics(latency_data))
+        self.sequence += 1
+        if len(self._rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._rows:
+            return
+        self._batches.put(self._rows)
+        self._rows = []
+
+    def close(self):
+        # Waits for every batch to be written, and raises the first write that failed
+        self.flush()
+        self._batches.put(None)
+        self._thread.join()
+        self._connection.close()
+        if self._error:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class ResultsStore:
+
+    def __init__(self, path: str = DEFAULT_RESULTS_PATH):
+        self.path = path
+        self._connection = _connect(path)
+
+    def create_run(self, metadata: RunMetadata) -> RunMetadata:
+        metadata.run_id = metadata.run_id or uuid.uuid4().hex[:12]
+        metadata.started_at = metadata.started_at or time.time()
+        metadata.host = metadata.host or socket.gethostname()
+        metadata.git_revision = metadata.git_revision or git_revision()
+        with self._connection:
+            self._connection.execute(
+                f"INSERT INTO runs ({', '.join(_RUN_COLUMNS)}) VALUES ({', '.join('?' for _ in _RUN_COLUMNS)})",
+                [getattr(metadata, column) for column in _RUN_COLUMNS],
+            )
+        return metadata
+
+    def writer(self, run_id: str, batch_size: int = DEFAULT_BATCH_SIZE) -> ResultsWriter:
+        return ResultsWriter(self.path, run_id=run_id, batch_size=batch_size)
+
+    def runs(self, provider: Optional[str] = None, mode: Optional[str] = None) -> List[RunMetadata]:
+        rows = self._connection.execute(
+            f"SELECT {', '.join(_RUN_COLUMNS)} FROM runs "
+            f"WHERE (? IS NULL OR provider = ?) AND (? IS NULL OR mode = ?) ORDER BY started_at",
+            (provider, provider, mode, mode),
+        )
+        return [RunMetadata(**dict(zip(_RUN_COLUMNS, row))) for row in rows]
+
+    def run(self, run_id: str) -> Optional[RunMetadata]:
+        row = self._connection.execute(f"SELECT {', '.join(_RUN_COLUMNS)} FROM runs WHERE run_id = ?",
+                                       (run_id,)).fetchone()
+        return RunMetadata(**dict(zip(_RUN_COLUMNS, row))) if row else None
+
+    def metrics(self, run_id: str) -> List[str]:
+        rows = self._connection.execute("SELECT DISTINCT metric FROM samples WHERE run_id = ? ORDER BY metric",
+                                        (run_id,))
+        return [metric for metric, in rows]
+
+    def samples(self, run_id: str, metric: str) -> List[float]:
+        rows = self._connection.execute("SELECT value FROM samples WHERE run_id = ? AND metric = ?",
+                                        (run_id, metric))
+        return [value for value, in rows]
+
+    def set_baseline(self, name: str, run_id: str):
+        with self._connection:
+            self._connection.execute("INSERT OR REPLACE INTO baselines VALUES (?, ?)", (name, run_id))
+
+    def baseline(self, name: str) -> Optional[str]:
+        row = self._connection.execute("SELECT run_id FROM baselines WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def close(self):
+        self._connection.close()
+
+
+def start_run(metadata: RunMetadata, path: str = DEFAULT_RESULTS_PATH,
+              batch_size: int = DEFAULT_BATCH_SIZE) -> ResultsWriter:
+    store = ResultsStore(path)
+    try:
+        metadata = store.create_run(metadata)
+    finally:
+        store.close()
+    return ResultsWriter(path, run_id=metadata.run_id, batch_size=batch_size)
+
+
+class MetricComparison(BaseModel):
+    metric: str
+    baseline_count: int
+    candidate_count: int
+    baseline_p50: Optional[float] = None
+    candidate_p50: Optional[float] = None
+    baseline_p90: Optional[float] = None
+    candidate_p90: Optional[float] = None
+    relative_change: Optional[float] = None
+    p_value: Optional[float] = None
+    regression: bool = False
+
+
+def compare_samples(metric: str, baseline: Sequence[float], candidate: Sequence[float], alpha: float = DEFAULT_ALPHA,
+                    min_effect: float = DEFAULT_MIN_EFFECT) -> MetricComparison:
+    # A regression must be both significant (one-sided Mann-Whitney p < alpha) and large enough to matter
+    # (median worse by more than `min_effect`), so tiny but consistent shifts on long runs are not flagged.
+    # Percentiles are exact: throughput metrics fall outside a latency histogram's trackable range.
+    baseline, candidate = sorted(baseline), sorted(candidate)
+    baseline_p50, candidate_p50 = sorted_percentile(baseline, 50), sorted_percentile(candidate, 50)
+    relative_change = candidate_p50 / baseline_p50 - 1 if baseline_p50 and candidate_p50 is not None else None
+    if metric in HIGHER_IS_BETTER:
+        p_value = mann_whitney_greater(baseline, candidate)
+        worse = relative_change is not None and -relative_change > min_effect
+    else:
+        p_value = mann_whitney_greater(candidate, baseline)
+        worse = relative_change is not None and relative_change > min_effect
+    return MetricComparison(
+        metric=metric,
+        baseline_count=len(baseline),
+        candidate_count=len(candidate),
+        baseline_p50=baseline_p50,
+        candidate_p50=candidate_p50,
+        baseline_p90=sorted_percentile(baseline, 90),
+        candidate_p90=sorted_percentile(candidate, 90),
+        relative_change=relative_change,
+        p_value=p_value,
+        regression=p_value is not None and p_value < alpha and worse,
+    )
+
+
+def compare_runs(store: ResultsStore, baseline_run_id: str, candidate_run_id: str,
+                 metrics: Optional[Iterable[str]] = None, alpha: float = DEFAULT_ALPHA,
+                 min_effect: float = DEFAULT_MIN_EFFECT) -> Dict[str, MetricComparison]:
+    if metrics is None:
+        metrics = sorted(set(store.metrics(baseline_run_id)) & set(store.metrics(candidate_run_id)))
+    return {
+        metric: compare_samples(metric, store.samples(baseline_run_id, metric),
+                                store.samples(candidate_run_id, metric), alpha=alpha, min_effect=min_effect)
+        for metric in metrics
+    }
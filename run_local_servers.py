@@ -0,0 +1,89 @@
+# Local stand-in servers for ElevenLabs, OpenAI & PlayHT, for offline and reproducible benchmarks
+
+import argparse
+import asyncio
+import logging
+from typing import Optional
+
+from eleven import local_server as eleven_local_server
+from latency_model import (
+    LATENCY_PRESETS,
+    LatencyModel,
+)
+from open import local_server as openai_local_server
+from play import local_server as playht_local_server
+from session_trace import (
+    CAPTURE_DIR_ENV,
+    SessionLibrary,
+)
+from stand_in import DEFAULT_FRAMES_PER_CHUNK
+
+logging.basicConfig()
+server_logger = logging.getLogger("local_servers")
+server_logger.setLevel(logging.INFO)
+
+
+async def serve(host: str, latency_model: LatencyModel, frames_per_chunk: int,
+                replay: Optional[SessionLibrary] = None, replay_speed: float = 1.0):
+    runners = [
+        await eleven_local_server.start_server(host=host, latency_model=latency_model,
+                                               frames_per_chunk=frames_per_chunk, replay=replay,
+                                               replay_speed=replay_speed),
+        await openai_local_server.start_server(host=host, latency_model=latency_model,
+                                               frames_per_chunk=frames_per_chunk, replay=replay,
+                                               replay_speed=replay_speed),
+        await playht_local_server.start_server(host=host, latency_model=latency_model,
+                                               frames_per_chunk=frames_per_chunk, replay=replay,
+                                               replay_speed=replay_speed),
+    ]
+    if replay:
+        server_logger.info(f"Replaying {len(replay)} recorded sessions at "
+                           f"{f'{replay_speed:g}x speed' if replay_speed else 'maximum speed'}")
+        if skipped := replay.count("playht", "input_streaming"):
+            # The PlayHT stand-in serves each streamed text segment from a recorded streaming session instead
+            server_logger.warning(f"{skipped} PlayHT input streaming sessions cannot be replayed, record PlayHT "
+                                  f"streaming sessions to serve its streamed input")
+    server_logger.info("Point the benchmarks at the stand-in servers with:")
+    server_logger.info(f"export ELEVEN_LABS_BASE_URL=http://{host}:{eleven_local_server.DEFAULT_PORT}")
+    server_logger.info(f"export OPENAI_BASE_URL=http://{host}:{openai_local_server.DEFAULT_PORT}/v1")
+    server_logger.info(f"export PLAY_HT_API_URL=http://{host}:{playht_local_server.DEFAULT_PORT}/api")
+    server_logger.info(f"export PLAY_HT_GRPC_ADDR={host}:{playht_local_server.DEFAULT_GRPC_PORT}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        for runner in runners:
+            await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve local stand-ins for the TTS provider APIs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--preset", default="instant", choices=list(LATENCY_PRESETS))
+    parser.add_argument("--handshake", help="Handshake latency distribution, e.g. constant:0.05")
+    parser.add_argument("--first-chunk", help="Time to first chunk distribution, e.g. lognormal:0.3,0.4")
+    parser.add_argument("--inter-chunk", help="Inter-chunk gap distribution, e.g. exponential:0.05")
+    parser.add_argument("--jitter", help="Jitter added to every delay, e.g. normal:0,0.01")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--frames-per-chunk", type=int, default=DEFAULT_FRAMES_PER_CHUNK)
+    parser.add_argument("--replay", nargs="+",
+                        help=f"Serve these session traces, or directories of them, instead of generated audio; "
+                             f"benchmarks record them when {CAPTURE_DIR_ENV} is set")
+    parser.add_argument("--replay-speed", type=float, default=1.0,
+                        help="Replay timing divided by this factor, 0 for as fast as the client reads")
+    args = parser.parse_args()
+
+    if any((args.handshake, args.first_chunk, args.inter_chunk, args.jitter)):
+        latency_model = LatencyModel.from_specs(handshake=args.handshake, first_chunk=args.first_chunk,
+                                                inter_chunk=args.inter_chunk, jitter=args.jitter, seed=args.seed)
+    else:
+        latency_model = LATENCY_PRESETS[args.preset]
+        if args.seed is not None:
+            latency_model.rng.seed(args.seed)
+
+    replay = SessionLibrary.load(args.replay) if args.replay else None
+    asyncio.run(serve(host=args.host, latency_model=latency_model, frames_per_chunk=args.frames_per_chunk,
+                      replay=replay, replay_speed=args.replay_speed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+# Declarative benchmark runs: providers x modes x texts x voices x concurrency from a TOML or YAML scenario
+
+import argparse
+import asyncio
+import logging
+
+from results_store import DEFAULT_RESULTS_PATH
+from scenario import (
+    expand,
+    load_scenario,
+    run_scenario,
+)
+from utils import format_seconds
+
+logging.basicConfig()
+scenario_logger = logging.getLogger("scenario")
+scenario_logger.setLevel(logging.INFO)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a benchmark scenario with warmup and interleaved providers")
+    parser.add_argument("scenario", help="Scenario file, .toml, .yaml or .yml")
+    parser.add_argument("--db", default=DEFAULT_RESULTS_PATH, help="Results store the cells are recorded to")
+    parser.add_argument("--no-record", action="store_true", help="Do not record the runs in the results store")
+    parser.add_argument("--dry-run", action="store_true", help="List the expanded cells and exit")
+    args = parser.parse_args()
+
+    scenario = load_scenario(args.scenario)
+    if args.dry_run:
+        for block_index, cells in enumerate(expand(scenario)):
+            for cell in cells:
+                scenario_logger.info(f"block {block_index + 1}: {cell.describe()}")
+        return
+
+    results = asyncio.run(run_scenario(scenario, results_path=None if args.no_record else args.db,
+                                       logger=scenario_logger))
+    for result in results:
+        summary = result.time_to_first_audio
+        scenario_logger.info(
+            f"{result.cell.describe()}: time to first audio n={summary.count} p50={format_seconds(summary.p50)} "
+            f"p90={format_seconds(summary.p90)} p99={format_seconds(summary.p99)}, {result.errors} failed"
+            + (f", run {result.run_id}" if result.run_id else "")
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from enum import Enum
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+
+from connection_pool import ConnectionMode
+from latency_model import (
+    Constant,
+    LatencyModel,
+)
+from providers import (
+    DEFAULT_BLOCKING_WORKERS,
+    BlockingSdkBridge,
+    create_provider,
+    provider_class,
+)
+from results_store import (
+    DEFAULT_RESULTS_PATH,
+    ResultsStore,
+    ResultsWriter,
+    RunMetadata,
+)
+from sinks import DiscardSink
+from stats import HistogramSummary, LatencyHistogram, field_value
+from token_source import simulated_token_source
+
+try:
+    import tomllib
+except ImportError:
+    tomllib = None
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+DEFAULT_TEXT = "Hello sir, what can I do for you?"
+DEFAULT_TOKEN_RATE = 30.0
+
+
+class ScenarioMode(Enum):
+    STREAMING = "streaming"
+    INPUT_STREAMING = "input_streaming"
+
+
+class Interleaving(Enum):
+    # RANDOM shuffles the cells of every round, ROUND_ROBIN rotates which cell goes first, SEQUENTIAL runs every
+    # round of a cell before the next cell, like the compare scripts do
+    RANDOM = "random"
+    ROUND_ROBIN = "round_robin"
+    SEQUENTIAL = "sequential"
+
+
+class Scenario(BaseModel):
+    name: str = "scenario"
+    providers: List[str]
+    modes: List[ScenarioMode] = [ScenarioMode.STREAMING]
+    texts: List[str] = [DEFAULT_TEXT]
+    # Voice ids only mean something to their own provider, so they are listed per provider; providers without an
+    # entry keep their default voice
+    voices: Dict[str, List[str]] = {}
+    concurrency: List[int] = [1]
+    connection_mode: ConnectionMode = ConnectionMode.WARM
+    # Rounds run before measuring, so DNS, TLS sessions and pools are warm for every cell; never recorded
+    warmup: int = 1
+    # Measured rounds; with `duration` as well, whichever limit is reached first ends the run
+    iterations: Optional[int] = 10
+    # Seconds of measured rounds per voice block
+    duration: Optional[float] = None
+    order: Interleaving = Interleaving.RANDOM
+    seed: Optional[int] = None
+    # LLM tokens per second fed to input streaming cells
+    token_rate: float = DEFAULT_TOKEN_RATE
+
+
+class ScenarioCell(BaseModel):
+    provider: str
+    mode: ScenarioMode
+    text: str
+    voice: Optional[str] = None
+    concurrency: int = 1
+
+    def describe(self) -> str:
+        text = self.text if len(self.text) <= 24 else f"{self.text[:21]}..."
+        return (f"{self.provider} {self.mode.value} voice={self.voice or 'default'} "
+                f"concurrency={self.concurrency} text={text!r}")
+
+
+class CellResult(BaseModel):
+    cell: ScenarioCell
+    run_id: Optional[str] = None
+    errors: int = 0
+    time_to_first_audio: HistogramSummary
+
+
+def load_scenario(path: str) -> Scenario:
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, "rb") as f:
+        content = f.read()
+    if extension == ".toml":
+        if tomllib is None:
+            raise ImportError("TOML scenarios need Python 3.11 or newer (tomllib)")
+        data = tomllib.loads(content.decode())
+    elif extension in (".yaml", ".yml"):
+        if yaml is None:
+            raise ImportError("YAML scenarios need PyYAML, install it with `pip install pyyaml`")
+        data = yaml.safe_load(content)
+    else:
+        raise ValueError(f"Unknown scenario format {extension!r}, expected .toml, .yaml or .yml")
+    return Scenario(**data)
+
+
+def expand(scenario: Scenario) -> List[List[ScenarioCell]]:
+    # Voices are process wide settings of a provider's benchmark, so one provider cannot interleave two of its
+    # voices. The matrix is split into voice blocks instead: block k holds every provider's k-th voice, and cells
+    # are only interleaved within a block.
+    if scenario.iterations is None and scenario.duration is None:
+        raise ValueError("A scenario needs iterations, a duration or both")
+    block_count = max([len(scenario.voices.get(provider, [])) for provider in scenario.providers] + [1])
+    blocks = []
+    for block in range(block_count):
+        cells = []
+        for provider in scenario.providers:
+            voices = scenario.voices.get(provider) or [None]
+            if block >= len(voices):
+                continue
+            supports_input_streaming = provider_class(provider).supports_input_streaming
+            cells.extend(
+                ScenarioCell(provider=provider, mode=mode, text=text, voice=voices[block], concurrency=concurrency)
+                for mode in scenario.modes
+                if mode == ScenarioMode.STREAMING or supports_input_streaming
+                for text in scenario.texts
+                for concurrency in scenario.concurrency
+            )
+        blocks.append(cells)
+    return blocks
+
+
+class _CellState:
+
+    def __init__(self, cell: ScenarioCell, results: Optional[ResultsWriter] = None):
+        self.cell = cell
+        self.results = results
+        self.errors = 0
+        self.time_to_first_audio = LatencyHistogram()
+
+    def result(self) -> CellResult:
+        return CellResult(cell=self.cell, run_id=self.results.run_id if self.results else None, errors=self.errors,
+                          time_to_first_audio=self.time_to_first_audio.summary())
+
+
+async def _synthesize(provider, cell: ScenarioCell, scenario: Scenario, logger):
+    # Audio is counted and dropped, so concurrent cells neither fight over output files nor measure disk writes
+    if cell.mode == ScenarioMode.INPUT_STREAMING:
+        tokens = simulated_token_source(cell.text, LatencyModel(inter_chunk=Constant(1 / scenario.token_rate)))
+        return await provider.synthesize_streaming_input(tokens(), sink=DiscardSink(),
+                                                         connection_mode=scenario.connection_mode, logger=logger)
+    return await provider.synthesize(cell.text, sink=DiscardSink(), connection_mode=scenario.connection_mode,
+                                     logger=logger)
+
+
+async def _run_cell(provider, state: _CellState, scenario: Scenario, measured: bool, logger):
+    results = await asyncio.gather(*[_synthesize(provider, state.cell, scenario, logger)
+                                     for _ in range(state.cell.concurrency)], return_exceptions=True)
+    for latency_data in results:
+        if isinstance(latency_data, BaseException):
+            logger.warning(f"{state.cell.describe()} failed: {latency_data!r}")
+            if measured:
+                state.errors += 1
+        # A call that ended without audio has no time to first audio, and counts as failed
+        elif (time_to_first_audio := field_value(latency_data, "time_to_first_audio")) is None:
+            logger.warning(f"{state.cell.describe()} returned no audio")
+            if measured:
+                state.errors += 1
+        elif measured:
+            state.time_to_first_audio.record(time_to_first_audio)
+            if state.results:
+                state.results.record(latency_data)
+
+def _round_order(states: List[_CellState], order: Interleaving, round_index: int,
+                 rng: random.Random) -> List[_CellState]:
+    if order == Interleaving.RANDOM:
+        return rng.sample(states, len(states))
+    offset = round_index % len(states)
+    return states[offset:] + states[:offset]
+
+
+async def _run_rounds(providers, states: List[_CellState], scenario: Scenario, rng: random.Random, logger):
+    for round_index in range(scenario.warmup):
+        logger.info(f"Warmup round {round_index + 1}")
+        for state in _round_order(states, scenario.order, round_index, rng):
+            await _run_cell(providers[state.cell.provider], state, scenario, measured=False, logger=logger)
+
+    started_at = time.perf_counter()
+    round_index = 0
+    while (scenario.iterations is None or round_index < scenario.iterations) and \
+            (scenario.duration is None or time.perf_counter() - started_at < scenario.duration):
+        logger.info(f"Round {round_index + 1}")
+        for state in _round_order(states, scenario.order, round_index, rng):
+            await _run_cell(providers[state.cell.provider], state, scenario, measured=True, logger=logger)
+        round_index += 1
+
+
+async def _run_sequential(providers, states: List[_CellState], scenario: Scenario, logger):
+    # The time box is shared out evenly, so every cell gets the same budget
+    duration = scenario.duration / len(states) if scenario.duration is not None else None
+    for state in states:
+        provider = providers[state.cell.provider]
+        logger.info(f"Running {state.cell.describe()}")
+        for _ in range(scenario.warmup):
+            await _run_cell(provider, state, scenario, measured=False, logger=logger)
+        started_at = time.perf_counter()
+        round_index = 0
+        while (scenario.iterations is None or round_index < scenario.iterations) and \
+                (duration is None or time.perf_counter() - started_at < duration):
+            await _run_cell(provider, state, scenario, measured=True, logger=logger)
+            round_index += 1
+
+
+async def run_scenario(scenario: Scenario, results_path: Optional[str] = DEFAULT_RESULTS_PATH,
+                       logger=None) -> List[CellResult]:
+    if not logger:
+        logger = logging.getLogger("scenario")
+    rng = random.Random(scenario.seed)
+    store = ResultsStore(results_path) if results_path else None
+    # Blocking SDKs need a thread for every concurrent synthesis of the busiest cell
+    bridge = BlockingSdkBridge(max_workers=max(scenario.concurrency + [DEFAULT_BLOCKING_WORKERS]))
+    cell_results = []
+    try:
+        for block_index, cells in enumerate(expand(scenario)):
+            if not cells:
+                continue
+            logger.info(f"Voice block {block_index + 1}: {len(cells)} cells")
+            # Fresh providers per block, so no pooled connection is still bound to the previous voice
+            providers = {}
+            for cell in cells:
+                if cell.provider not in providers:
+                    providers[cell.provider] = create_provider(cell.provider, bridge=bridge)
+                    if cell.voice:
+                        providers[cell.provider].set_voice(cell.voice)
+            states = []
+            for cell in cells:
+                results = None
+                if store:
+                    metadata = store.create_run(RunMetadata.for_provider(
+                        providers[cell.provider], mode=cell.mode.value, text_length=len(cell.text),
+                        concurrency=cell.concurrency, label=f"scenario:{scenario.name}",
+                    ))
+                    results = store.writer(metadata.run_id)
+                states.append(_CellState(cell, results))
+            try:
+                if scenario.order == Interleaving.SEQUENTIAL:
+                    await _run_sequential(providers, states, scenario, logger)
+                else:
+                    await _run_rounds(providers, states, scenario, rng, logger)
+            finally:
+                for state in states:
+                    if state.results:
+                        state.results.close()
+                for provider in providers.values():
+                    await provider.close()
+            cell_results.extend(state.result() for state in states)
+    finally:
+        bridge.close()
+        if store:
+            store.close()
+    return cell_results
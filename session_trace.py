@@ -0,0 +1,190 @@
+import asyncio
+import itertools
+import json
+import os
+import socket
+import struct
+import time
+import uuid
+from enum import IntEnum
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple, Union
+
+from pydantic import BaseModel
+
+# Sessions are captured while this is set, one trace file per synthesis
+CAPTURE_DIR_ENV = "BENCHMARK_CAPTURE_DIR"
+TRACE_EXTENSION = ".ttstrace"
+# File layout: magic, format version and header length, the JSON header, then one record per frame: offset in
+# nanoseconds since the session started, frame kind and payload length, followed by the payload itself
+_MAGIC = b"TTSTRACE"
+_VERSION = 1
+_PREAMBLE = struct.Struct("<8sHI")
+_RECORD = struct.Struct("<qBI")
+
+
+class FrameKind(IntEnum):
+    # The request itself: its body or parameters
+    REQUEST = 0
+    # A text chunk streamed to the provider
+    TEXT_SENT = 1
+    # A websocket message received, exactly as it arrived
+    WEBSOCKET_MESSAGE = 2
+    # A chunk of a streamed response body
+    BODY_CHUNK = 3
+    # The format header PlayHT sends before its audio
+    HEADER = 4
+
+
+class SessionHeader(BaseModel):
+    provider: str
+    # "streaming" or "input_streaming"
+    mode: str
+    connection_mode: Optional[str] = None
+    recorded_at: float
+    host: Optional[str] = None
+
+
+class SessionRecorder:
+    # Frames are appended to memory while the session runs and written out in one go when it ends, so capturing
+    # adds no disk I/O to the chunk loop being timed
+
+    def __init__(self, path: str, header: SessionHeader):
+        self.path = path
+        self.header = header
+        self.started_ns = time.perf_counter_ns()
+        self._records = bytearray()
+
+    def record(self, kind: FrameKind, payload: Union[bytes, str]):
+        offset_ns = time.perf_counter_ns() - self.started_ns
+        if isinstance(payload, str):
+            payload = payload.encode()
+        self._records += _RECORD.pack(offset_ns, kind, len(payload))
+        self._records += payload
+
+    def close(self):
+        header = self.header.json().encode()
+        # Written to a temporary name and renamed, so a replay server reading the directory never sees half a file
+        temporary_path = f"{self.path}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(temporary_path, "wb") as f:
+            f.write(_PREAMBLE.pack(_MAGIC, _VERSION, len(header)))
+            f.write(header)
+            f.write(self._records)
+        os.replace(temporary_path, self.path)
+
+
+def start_capture(provider: str, mode: str, connection_mode=None) -> Optional[SessionRecorder]:
+    # None unless BENCHMARK_CAPTURE_DIR is set, so the chunk loops only pay for a check when capture is off
+    directory = os.environ.get(CAPTURE_DIR_ENV)
+    if not directory:
+        return None
+    os.makedirs(directory, exist_ok=True)
+    file_name = f"{provider}-{mode}-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}{TRACE_EXTENSION}"
+    return SessionRecorder(os.path.join(directory, file_name), SessionHeader(
+        provider=provider,
+        mode=mode,
+        connection_mode=getattr(connection_mode, "value", connection_mode),
+        recorded_at=time.time(),
+        host=socket.gethostname(),
+    ))
+
+
+class Frame:
+    __slots__ = ("offset_ns", "kind", "payload")
+
+    def __init__(self, offset_ns: int, kind: FrameKind, payload: bytes):
+        self.offset_ns = offset_ns
+        self.kind = kind
+        self.payload = payload
+
+
+class SessionTrace:
+
+    def __init__(self, header: SessionHeader, frames: List[Frame], path: Optional[str] = None):
+        self.header = header
+        self.frames = frames
+        self.path = path
+
+    @staticmethod
+    def load(path: str) -> "SessionTrace":
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, version, header_length = _PREAMBLE.unpack_from(data)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"{path} is not a version {_VERSION} session trace")
+        position = _PREAMBLE.size
+        header = SessionHeader(**json.loads(data[position:position + header_length]))
+        position += header_length
+        frames = []
+        while position < len(data):
+            offset_ns, kind, length = _RECORD.unpack_from(data, position)
+            position += _RECORD.size
+            frames.append(Frame(offset_ns, FrameKind(kind), data[position:position + length]))
+            position += length
+        return SessionTrace(header, frames, path=path)
+
+    def request_offset_ns(self) -> int:
+        # Replay timing starts where the provider's clock started: the request, or for a streamed input the first
+        # text chunk, since the socket may have been opened long before
+        kinds = (FrameKind.TEXT_SENT,) if self.header.mode == "input_streaming" else (FrameKind.REQUEST,)
+        return next((frame.offset_ns for frame in self.frames if frame.kind in kinds), 0)
+
+    def responses(self) -> List[Frame]:
+        return [frame for frame in self.frames
+                if frame.kind in (FrameKind.WEBSOCKET_MESSAGE, FrameKind.BODY_CHUNK, FrameKind.HEADER)]
+
+
+def trace_paths(paths: Iterable[str]) -> List[str]:
+    # Trace files, and every trace file in the directories among them, in name (and so recording) order
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            found.extend(sorted(os.path.join(path, name) for name in os.listdir(path)
+                                if name.endswith(TRACE_EXTENSION)))
+        else:
+            found.append(path)
+    return found
+
+
+class SessionLibrary:
+    # The traces a replay server serves, handed out round robin per provider and mode so repeated requests walk
+    # through every recorded session in turn
+
+    def __init__(self, traces: Iterable[SessionTrace]):
+        self._traces: Dict[Tuple[str, str], List[SessionTrace]] = {}
+        for trace in traces:
+            self._traces.setdefault((trace.header.provider, trace.header.mode), []).append(trace)
+        by_provider: Dict[str, List[SessionTrace]] = {}
+        for (provider, _), traces in self._traces.items():
+            by_provider.setdefault(provider, []).extend(traces)
+        self._cycles = {key: itertools.cycle(traces) for key, traces in self._traces.items()}
+        self._provider_cycles = {provider: itertools.cycle(traces) for provider, traces in by_provider.items()}
+
+    def __len__(self):
+        return sum(len(traces) for traces in self._traces.values())
+
+    def count(self, provider: str, mode: str) -> int:
+        return len(self._traces.get((provider, mode), ()))
+
+    def next(self, provider: str, mode: Optional[str] = None) -> SessionTrace:
+        # Without a mode any of the provider's sessions will do
+        cycle = self._cycles.get((provider, mode)) if mode else self._provider_cycles.get(provider)
+        if cycle is None:
+            raise LookupError(f"No recorded {provider}{f' {mode}' if mode else ''} sessions to replay")
+        return next(cycle)
+
+    @staticmethod
+    def load(paths: Iterable[str]) -> "SessionLibrary":
+        return SessionLibrary(SessionTrace.load(path) for path in trace_paths(paths))
+
+
+async def replay_frames(trace: SessionTrace, speed: float = 1.0) -> AsyncIterator[Frame]:
+    # Yields the provider's side of the session at its recorded offsets from the request, divided by `speed`;
+    # a speed of 0 replays as fast as the client reads
+    request_offset_ns = trace.request_offset_ns()
+    started_ns = time.perf_counter_ns()
+    for frame in trace.responses():
+        if speed:
+            delay = (frame.offset_ns - request_offset_ns) / speed / 1e9 - (time.perf_counter_ns() - started_ns) / 1e9
+            if delay > 0:
+                await asyncio.sleep(delay)
+        yield frame
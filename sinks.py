@@ -0,0 +1,117 @@
+import binascii
+import os
+import queue
+import threading
+import time
+import uuid
+from enum import Enum
+from typing import Optional
+
+DEFAULT_OUTPUT_DIR = "benchmark_output"
+DEFAULT_MEMORY_CAPACITY = 8 * 1024 * 1024
+
+
+class SinkKind(Enum):
+    DISCARD = "discard"
+    MEMORY = "memory"
+    FILE = "file"
+
+
+class AudioSink:
+
+    def __init__(self):
+        self.bytes_written = 0
+
+    def write(self, chunk: bytes):
+        self.bytes_written += len(chunk)
+
+    def write_base64(self, data):
+        self.write(binascii.a2b_base64(data))
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class DiscardSink(AudioSink):
+
+    def write_base64(self, data):
+        # Decoded size without decoding, since the audio is thrown away anyway
+        padding = data[-2:].count("=" if isinstance(data, str) else b"=")
+        self.bytes_written += len(data) * 3 // 4 - padding
+
+
+class MemorySink(AudioSink):
+    # Preallocated ring: memory stays flat however long the text is, keeping the most recent `capacity` bytes
+
+    def __init__(self, capacity: int = DEFAULT_MEMORY_CAPACITY):
+        super().__init__()
+        self.capacity = capacity
+        self._buffer = bytearray(capacity)
+        self._view = memoryview(self._buffer)
+        self._position = 0
+
+    def write(self, chunk: bytes):
+        chunk_view = memoryview(chunk)
+        self.bytes_written += len(chunk_view)
+        if len(chunk_view) >= self.capacity:
+            self._view[:] = chunk_view[-self.capacity:]
+            self._position = 0
+            return
+        head_length = min(len(chunk_view), self.capacity - self._position)
+        self._view[self._position:self._position + head_length] = chunk_view[:head_length]
+        tail_length = len(chunk_view) - head_length
+        if tail_length:
+            self._view[:tail_length] = chunk_view[head_length:]
+        self._position = (self._position + len(chunk_view)) % self.capacity
+
+    def getvalue(self) -> bytes:
+        if self.bytes_written < self.capacity:
+            return bytes(self._view[:self.bytes_written])
+        return bytes(self._view[self._position:]) + bytes(self._view[:self._position])
+
+
+class FileSink(AudioSink):
+    # Chunks are handed to a writer thread, so disk I/O never runs inside the timed chunk loop
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self._chunks = queue.SimpleQueue()
+        self._writer = threading.Thread(target=self._write_chunks, name=f"audio-sink-{os.path.basename(path)}",
+                                        daemon=True)
+        self._writer.start()
+
+    def _write_chunks(self):
+        with open(self.path, "wb") as f:
+            while (chunk := self._chunks.get()) is not None:
+                f.write(chunk)
+
+    def write(self, chunk: bytes):
+        self.bytes_written += len(chunk)
+        self._chunks.put(chunk)
+
+    def close(self):
+        if self._writer.is_alive():
+            self._chunks.put(None)
+            self._writer.join()
+
+    @staticmethod
+    def for_run(name: str, output_dir: str = DEFAULT_OUTPUT_DIR, extension: str = "mp3") -> "FileSink":
+        os.makedirs(output_dir, exist_ok=True)
+        file_name = f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.{extension}"
+        return FileSink(os.path.join(output_dir, file_name))
+
+
+def create_sink(name: str, kind: Optional[SinkKind] = None) -> AudioSink:
+    kind = kind or SinkKind(os.environ.get("BENCHMARK_AUDIO_SINK", SinkKind.FILE.value))
+    if kind == SinkKind.DISCARD:
+        return DiscardSink()
+    if kind == SinkKind.MEMORY:
+        return MemorySink()
+    return FileSink.for_run(name)
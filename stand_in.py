@@ -0,0 +1,67 @@
+import asyncio
+import math
+from typing import AsyncGenerator, List
+
+from aiohttp import web
+
+from latency_model import LatencyModel
+from session_trace import (
+    SessionTrace,
+    replay_frames,
+)
+
+# Silent MPEG-1 Layer III frames (128 kbps, 44.1 kHz, mono): a zeroed side info section decodes to silence
+MP3_FRAME_HEADER = bytes([0xFF, 0xFB, 0x90, 0xC0])
+MP3_FRAME_LENGTH = 417
+MP3_FRAME_DURATION = 1152 / 44100
+SILENT_MP3_FRAME = MP3_FRAME_HEADER + bytes(MP3_FRAME_LENGTH - len(MP3_FRAME_HEADER))
+
+CHARACTERS_PER_SECOND = 15
+DEFAULT_FRAMES_PER_CHUNK = 8
+
+
+def silent_audio_for_text(text: str) -> bytes:
+    frame_count = max(1, math.ceil(len(text) / CHARACTERS_PER_SECOND / MP3_FRAME_DURATION))
+    return SILENT_MP3_FRAME * frame_count
+
+
+def chunk_audio(audio: bytes, frames_per_chunk: int = DEFAULT_FRAMES_PER_CHUNK) -> List[bytes]:
+    chunk_size = MP3_FRAME_LENGTH * frames_per_chunk
+    return [audio[i:i + chunk_size] for i in range(0, len(audio), chunk_size)]
+
+
+async def stream_audio_chunks(text: str, latency_model: LatencyModel,
+                              frames_per_chunk: int = DEFAULT_FRAMES_PER_CHUNK) -> AsyncGenerator[bytes, None]:
+    await asyncio.sleep(latency_model.first_chunk_delay())
+    for i, chunk in enumerate(chunk_audio(silent_audio_for_text(text), frames_per_chunk=frames_per_chunk)):
+        if i:
+            await asyncio.sleep(latency_model.inter_chunk_delay())
+        yield chunk
+
+
+async def stream_audio_response(request: web.Request, text: str, latency_model: LatencyModel,
+                                frames_per_chunk: int = DEFAULT_FRAMES_PER_CHUNK) -> web.StreamResponse:
+    await asyncio.sleep(latency_model.handshake_delay())
+    response = web.StreamResponse(headers={"Content-Type": "audio/mpeg"})
+    await response.prepare(request)
+    async for chunk in stream_audio_chunks(text, latency_model=latency_model, frames_per_chunk=frames_per_chunk):
+        await response.write(chunk)
+    await response.write_eof()
+    return response
+
+
+async def stream_replay_response(request: web.Request, trace: SessionTrace, speed: float = 1.0) -> web.StreamResponse:
+    # The recorded body chunks, cut and timed as the provider sent them
+    response = web.StreamResponse(headers={"Content-Type": "audio/mpeg"})
+    await response.prepare(request)
+    async for frame in replay_frames(trace, speed):
+        await response.write(frame.payload)
+    await response.write_eof()
+    return response
+
+
+async def start_app(app: web.Application, host: str, port: int) -> web.AppRunner:
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -0,0 +1,285 @@
+import math
+from typing import Dict, Iterable, Optional, Sequence
+
+from pydantic import BaseModel
+
+from tracing import phase_durations
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+LATENCY_FIELDS = (
+    "first_chunk_generation_time",
+    "stream_generation_time",
+    "header_generation_time",
+    "first_audio_chunk_generation_time",
+)
+DEFAULT_SIGNIFICANT_FIGURES = 3
+DEFAULT_RESOLUTION = 1e-6
+DEFAULT_HIGHEST_TRACKABLE_VALUE = 3600.0
+
+
+class HistogramSummary(BaseModel):
+    count: int = 0
+    min: Optional[float] = None
+    max: Optional[float] = None
+    mean: Optional[float] = None
+    stddev: Optional[float] = None
+    p50: Optional[float] = None
+    p90: Optional[float] = None
+    p99: Optional[float] = None
+    p99_9: Optional[float] = None
+
+
+class LatencyHistogram:
+    # HDR-style log-linear histogram: values are stored as integer multiples of `resolution` seconds in buckets that
+    # keep `significant_figures` of precision, so memory depends on the trackable range and not on the record count
+
+    def __init__(self, significant_figures: int = DEFAULT_SIGNIFICANT_FIGURES, resolution: float = DEFAULT_RESOLUTION,
+                 highest_trackable_value: float = DEFAULT_HIGHEST_TRACKABLE_VALUE):
+        self.significant_figures = significant_figures
+        self.resolution = resolution
+        self.highest_trackable_value = highest_trackable_value
+
+        self.highest_unit = max(1, math.ceil(highest_trackable_value / resolution))
+        sub_bucket_count_magnitude = math.ceil(math.log2(2 * 10 ** significant_figures))
+        self.sub_bucket_half_count_magnitude = sub_bucket_count_magnitude - 1
+        self.sub_bucket_count = 1 << sub_bucket_count_magnitude
+        self.sub_bucket_half_count = self.sub_bucket_count // 2
+        self.sub_bucket_mask = self.sub_bucket_count - 1
+
+        bucket_count = 1
+        while (self.sub_bucket_count << (bucket_count - 1)) <= self.highest_unit:
+            bucket_count += 1
+        counts_length = (bucket_count + 1) * self.sub_bucket_half_count
+        self.counts = np.zeros(counts_length, dtype=np.int64) if np is not None else [0] * counts_length
+
+        self.count = 0
+        self.clamped_count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    def _index_of(self, unit: int) -> int:
+        bucket_index = (unit | self.sub_bucket_mask).bit_length() - (self.sub_bucket_half_count_magnitude + 1)
+        sub_bucket_index = unit >> bucket_index
+        return (bucket_index << self.sub_bucket_half_count_magnitude) + sub_bucket_index
+
+    def _highest_equivalent_unit(self, index: int) -> int:
+        bucket_index = (index >> self.sub_bucket_half_count_magnitude) - 1
+        sub_bucket_index = (index & (self.sub_bucket_half_count - 1)) + self.sub_bucket_half_count
+        if bucket_index < 0:
+            sub_bucket_index -= self.sub_bucket_half_count
+            bucket_index = 0
+        return ((sub_bucket_index + 1) << bucket_index) - 1
+
+    def _to_unit(self, value: float) -> int:
+        unit = round(value / self.resolution)
+        if unit < 0 or unit > self.highest_unit:
+            self.clamped_count += 1
+            return min(max(unit, 0), self.highest_unit)
+        return unit
+
+    def record(self, value: float):
+        self.counts[self._index_of(self._to_unit(value))] += 1
+        self.count += 1
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        delta = value - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (value - self._mean)
+
+    def record_many(self, values: Iterable[float]):
+        if np is None:
+            for value in values:
+                self.record(value)
+            return
+
+        values = np.asarray(values if isinstance(values, np.ndarray) else list(values), dtype=np.float64)
+        if not values.size:
+            return
+        units = np.rint(values / self.resolution).astype(np.int64)
+        self.clamped_count += int(np.count_nonzero((units < 0) | (units > self.highest_unit)))
+        units = np.clip(units, 0, self.highest_unit)
+        # frexp gives the exact bit length for integers below 2 ** 53, which covers every trackable unit
+        _, bit_lengths = np.frexp((units | self.sub_bucket_mask).astype(np.float64))
+        bucket_indexes = bit_lengths.astype(np.int64) - (self.sub_bucket_half_count_magnitude + 1)
+        indexes = (bucket_indexes << self.sub_bucket_half_count_magnitude) + (units >> bucket_indexes)
+        self.counts += np.bincount(indexes, minlength=len(self.counts))
+
+        self._merge_moments(count=int(values.size), mean=float(values.mean()),
+                            m2=float(((values - values.mean()) ** 2).sum()))
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def _merge_moments(self, count: int, mean: float, m2: float):
+        total = self.count + count
+        delta = mean - self._mean
+        self._m2 += m2 + delta * delta * self.count * count / total
+        self._mean += delta * count / total
+        self.count = total
+
+    def merge(self, other: "LatencyHistogram") -> "LatencyHistogram":
+        if (other.significant_figures, other.resolution, other.highest_trackable_value) != (
+                self.significant_figures, self.resolution, self.highest_trackable_value):
+            raise ValueError("Only histograms with the same precision and range can be merged")
+        if not other.count:
+            return self
+        if np is not None:
+            self.counts += np.asarray(other.counts, dtype=np.int64)
+        else:
+            self.counts = [count + other_count for count, other_count in zip(self.counts, other.counts)]
+        self.clamped_count += other.clamped_count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._merge_moments(count=other.count, mean=other._mean, m2=other._m2)
+        return self
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self._mean if self.count else None
+
+    @property
+    def stddev(self) -> Optional[float]:
+        return math.sqrt(self._m2 / self.count) if self.count else None
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        if not self.count:
+            return None
+        # Multiplied before dividing: 99.9 / 100 * 10000 is 9990.000000000002 in floating point, one rank too high
+        target = max(1, math.ceil(percentile * self.count / 100))
+        if np is not None:
+            index = int(np.searchsorted(np.cumsum(self.counts), target))
+        else:
+            running_count = 0
+            for index, count in enumerate(self.counts):
+                running_count += count
+                if running_count >= target:
+                    break
+        value = self._highest_equivalent_unit(index) * self.resolution
+        return min(max(value, self.min), self.max)
+
+    def summary(self) -> HistogramSummary:
+        if not self.count:
+            return HistogramSummary()
+        return HistogramSummary(
+            count=self.count,
+            min=self.min,
+            max=self.max,
+            mean=self.mean,
+            stddev=self.stddev,
+            p50=self.percentile(50),
+            p90=self.percentile(90),
+            p99=self.percentile(99),
+            p99_9=self.percentile(99.9),
+        )
+
+
+def field_value(latency_data, field: str) -> Optional[float]:
+    try:
+        return getattr(latency_data, field, None)
+    except TypeError:
+        # Derived fields such as first_audio_chunk_generation_time fail when one of their timestamps is missing
+        return None
+
+
+class FieldStatistics:
+
+    def __init__(self, fields: Sequence[str] = LATENCY_FIELDS, **histogram_options):
+        self.histogram_options = histogram_options
+        self.histograms: Dict[str, LatencyHistogram] = {
+            field: LatencyHistogram(**histogram_options) for field in fields
+        }
+
+    def record(self, latency_data):
+        for field, histogram in self.histograms.items():
+            if (value := field_value(latency_data, field)) is not None:
+                histogram.record(value)
+
+    def record_many(self, latency_records: Iterable):
+        latency_records = list(latency_records)
+        for field, histogram in self.histograms.items():
+            histogram.record_many([value for latency_data in latency_records
+                                   if (value := field_value(latency_data, field)) is not None])
+
+    def merge(self, other: "FieldStatistics") -> "FieldStatistics":
+        for field, histogram in other.histograms.items():
+            if field in self.histograms:
+                self.histograms[field].merge(histogram)
+            else:
+                self.histograms[field] = histogram
+        return self
+
+    def summary(self) -> Dict[str, HistogramSummary]:
+        return {field: histogram.summary() for field, histogram in self.histograms.items() if histogram.count}
+
+
+def mann_whitney_greater(candidate: Sequence[float], baseline: Sequence[float]) -> Optional[float]:
+    # One-sided Mann-Whitney U test (normal approximation with tie and continuity correction): the p-value for
+    # "candidate latencies tend to be larger than baseline ones". Rank based, so a few outliers cannot fake a shift.
+    n1, n2 = len(candidate), len(baseline)
+    if not n1 or not n2:
+        return None
+    values = sorted([(value, 0) for value in candidate] + [(value, 1) for value in baseline])
+    total = n1 + n2
+    candidate_rank_sum = 0.0
+    tie_correction = 0.0
+    i = 0
+    while i < total:
+        j = i
+        while j + 1 < total and values[j + 1][0] == values[i][0]:
+            j += 1
+        average_rank = (i + j) / 2 + 1
+        candidate_rank_sum += average_rank * sum(1 for _, group in values[i:j + 1] if group == 0)
+        ties = j - i + 1
+        tie_correction += ties ** 3 - ties
+        i = j + 1
+    u = candidate_rank_sum - n1 * (n1 + 1) / 2
+    variance = n1 * n2 / 12 * ((total + 1) - tie_correction / (total * (total - 1) if total > 1 else 1))
+    if variance <= 0:
+        return 1.0
+    z = (u - n1 * n2 / 2 - 0.5) / math.sqrt(variance)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+class PhaseStatistics(FieldStatistics):
+    # One histogram per traced phase (dns, connect, server, ...), created the first time a phase shows up
+
+    def __init__(self, **histogram_options):
+        super().__init__(fields=(), **histogram_options)
+
+    def record(self, latency_data):
+        for phase, duration in phase_durations(latency_data.spans).items():
+            if phase not in self.histograms:
+                self.histograms[phase] = LatencyHistogram(**self.histogram_options)
+            self.histograms[phase].record(duration)
+
+    def record_many(self, latency_records: Iterable):
+        for latency_data in latency_records:
+            self.record(latency_data)
+
+
+class TextChunkStatistics(FieldStatistics):
+    # One histogram per text chunk position (text_chunk_1 is the first chunk sent) of the latency from sending that
+    # chunk to the first audio speaking it, plus every chunk pooled under text_chunk_all
+
+    def __init__(self, **histogram_options):
+        super().__init__(fields=("text_chunk_all",), **histogram_options)
+
+    def record(self, latency_data):
+        text_chunks = getattr(latency_data, "text_chunks", None)
+        if not text_chunks or latency_data.timeline is None:
+            return
+        for position, latency in enumerate(text_chunks.latencies(latency_data.timeline), start=1):
+            field = f"text_chunk_{position}"
+            if field not in self.histograms:
+                self.histograms[field] = LatencyHistogram(**self.histogram_options)
+            self.histograms[field].record(latency)
+            self.histograms["text_chunk_all"].record(latency)
+
+    def record_many(self, latency_records: Iterable):
+        for latency_data in latency_records:
+            self.record(latency_data)
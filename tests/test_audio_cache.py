@@ -0,0 +1,63 @@
+import asyncio
+
+from audio_cache import AudioCache, CachedAudio, CachingProvider, DiskTier
+from sinks import DiscardSink
+
+
+class FakeProvider:
+    name = "fake"
+    supports_input_streaming = False
+    voice = "voice"
+    model = "model"
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.calls = 0
+
+    async def synthesize(self, text, sink=None, connection_mode=None, logger=None):
+        self.calls += 1
+        with sink:
+            for chunk in self.chunks:
+                sink.write(chunk)
+        return object()
+
+    async def close(self):
+        pass
+
+
+def test_disk_entries_can_be_read_once_flushed(tmp_path):
+    disk = DiskTier(str(tmp_path))
+    disk.put("key", CachedAudio.from_chunks([b"abc", b"de"]))
+    disk.flush()
+
+    audio = disk.get("key")
+    assert [bytes(chunk) for chunk in audio.chunks()] == [b"abc", b"de"]
+    # A new tier over the same directory finds the entry
+    assert DiskTier(str(tmp_path)).get("key") is not None
+
+
+def test_synthesis_without_audio_is_not_cached(tmp_path):
+    cache = AudioCache(directory=str(tmp_path))
+    provider = CachingProvider(FakeProvider([]), cache=cache)
+
+    for _ in range(2):
+        asyncio.run(provider.synthesize("Hello", sink=DiscardSink()))
+    cache.flush()
+
+    assert provider.misses == 2
+    assert provider.hits == 0
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_miss_is_served_from_disk_once_memory_is_cleared(tmp_path):
+    cache = AudioCache(directory=str(tmp_path))
+    provider = CachingProvider(FakeProvider([b"abc"]), cache=cache)
+
+    asyncio.run(provider.synthesize("Hello", sink=DiscardSink()))
+    cache.flush()
+    cache.clear(disk=False)
+    latency_data = asyncio.run(provider.synthesize("Hello", sink=DiscardSink()))
+
+    assert provider.provider.calls == 1
+    assert latency_data.cache_tier == "disk"
+    assert latency_data.audio_bytes == 3
@@ -0,0 +1,83 @@
+import asyncio
+import time
+
+import pytest
+
+import open_loop
+from load_generator import LoadTarget
+from open_loop import ConstantArrivals, run_open_loop
+from timeline import ChunkTimeline
+
+SERVICE_TIME = 0.01
+
+
+class LatencyData:
+
+    def __init__(self, timeline: ChunkTimeline):
+        self.timeline = timeline
+
+    @property
+    def time_to_first_audio(self):
+        return self.timeline.offsets[0]
+
+
+class BlockingProvider:
+    # Holds the event loop for a while on every call, like a client doing blocking work, so later requests cannot
+    # go out on schedule and queue up behind it
+    name = "blocking"
+
+    def __init__(self, no_audio_every: int = 0):
+        self.calls = 0
+        self.no_audio_every = no_audio_every
+
+    async def synthesize(self, text, sink=None, connection_mode=None, logger=None):
+        self.calls += 1
+        timeline = ChunkTimeline()
+        time.sleep(SERVICE_TIME)
+        if not (self.no_audio_every and self.calls % self.no_audio_every == 0):
+            timeline.record(100)
+        await asyncio.sleep(0)
+        return LatencyData(timeline)
+
+    async def close(self):
+        pass
+
+
+class SampleLog:
+    # Stands in for a ResultsWriter, keeping the samples instead of writing them
+
+    def __init__(self):
+        self.samples = []
+
+    def record(self, sample):
+        self.samples.append(sample)
+
+
+def run(monkeypatch, provider, rate=200.0, duration=0.5, results=None):
+    monkeypatch.setattr(open_loop, "create_target_provider", lambda target, bridge: provider)
+    return asyncio.run(run_open_loop(LoadTarget.OPENAI_STREAMING, ConstantArrivals(rate), text="Hello",
+                                     duration=duration, warmup=0, results=results))
+
+
+def test_corrected_time_to_first_audio_adds_send_lag_to_service_time(monkeypatch):
+    # 200 requests a second against 10 ms of blocking each: the loop falls further behind with every request
+    samples = SampleLog()
+    report = run(monkeypatch, BlockingProvider(), results=samples)
+
+    assert report.completed == report.scheduled == len(samples.samples) == 100
+    assert report.errors == 0
+    assert report.send_lag.max > 0.4
+    for sample in samples.samples:
+        assert sample.time_to_first_audio == pytest.approx(sample.send_lag + sample.service_time_to_first_audio,
+                                                           abs=1e-3)
+    # The provider's own measurement never sees the backlog; the corrected one is dominated by it
+    assert report.service_time_to_first_audio.p99 < 2 * SERVICE_TIME
+    assert report.time_to_first_audio.p99 > report.send_lag.p50 > 0.2
+
+
+def test_requests_without_audio_count_as_errors(monkeypatch):
+    report = run(monkeypatch, BlockingProvider(no_audio_every=4), rate=20.0)
+
+    assert report.scheduled == 10
+    assert report.errors == 2
+    assert report.completed == 8
@@ -0,0 +1,48 @@
+import pytest
+
+from playback import Mp3FrameParser, PlaybackSimulator
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz, mono: 417-byte frames of 1152 samples
+HEADER = bytes([0xFF, 0xFB, 0x90, 0xC0])
+FRAME_LENGTH = 417
+FRAME_DURATION = 1152 / 44100
+
+
+def mp3_frame(tag: bytes = b"") -> bytes:
+    # Mono MPEG-1 side info is 17 bytes long, and a Xing or Info tag follows it
+    body = bytes(17) + tag
+    return HEADER + body + bytes(FRAME_LENGTH - len(HEADER) - len(body))
+
+
+@pytest.mark.parametrize("tag", [b"Xing", b"Info"])
+def test_mp3_parser_skips_the_vbr_info_frame(tag):
+    parser = Mp3FrameParser()
+    stream = mp3_frame(tag) + mp3_frame() * 3
+
+    # Fed in uneven pieces, so frames straddle chunk boundaries
+    duration = sum(parser.feed(stream[start:start + 100]) for start in range(0, len(stream), 100))
+
+    assert parser.frames == 3
+    assert parser.skipped_frames == 1
+    assert duration == pytest.approx(3 * FRAME_DURATION)
+
+
+def test_mp3_parser_counts_a_first_frame_without_tag_as_audio():
+    parser = Mp3FrameParser()
+
+    assert parser.feed(mp3_frame() * 2) == pytest.approx(2 * FRAME_DURATION)
+    assert parser.skipped_frames == 0
+
+
+def test_underrun_lasts_until_the_jitter_buffer_refills():
+    # Playback starts at 0 and drains 0.2 s by 0.2, then stalls: the chunk at 1.0 leaves 0.05 s buffered, under the
+    # 0.1 s jitter buffer, so playback only resumes when the chunk at 2.0 refills it
+    simulator = PlaybackSimulator(jitter_buffer=0.1, started_at=0.0)
+    for arrived_at, duration in ((0.0, 0.2), (1.0, 0.05), (2.0, 0.05)):
+        simulator.add(duration, arrived_at=arrived_at)
+
+    report = simulator.report(ended_at=2.0)
+
+    assert report.underruns == 1
+    assert report.underrun_time == pytest.approx(1.8)
+    assert report.time_to_first_audible == 0.0
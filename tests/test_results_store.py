@@ -0,0 +1,24 @@
+import sqlite3
+
+import pytest
+
+from results_store import ResultsWriter
+
+
+class LatencyData:
+    time_to_first_audio = 0.25
+
+
+def test_writer_raises_a_failed_write_at_a_later_sample(tmp_path):
+    path = str(tmp_path / "results.db")
+    writer = ResultsWriter(path, run_id="run", batch_size=1, max_pending_batches=1)
+    connection = sqlite3.connect(path)
+    connection.execute("DROP TABLE samples")
+    connection.close()
+
+    # With one pending batch allowed, the third sample waits until the first batch has failed
+    with pytest.raises(sqlite3.OperationalError, match="no such table"):
+        for _ in range(4):
+            writer.record(LatencyData())
+    with pytest.raises(sqlite3.OperationalError):
+        writer.close()
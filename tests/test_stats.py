@@ -0,0 +1,59 @@
+import math
+import random
+
+import pytest
+
+from stats import LatencyHistogram
+
+PERCENTILES = (1, 10, 50, 90, 99, 99.9)
+
+
+def nearest_rank(sorted_values, percentile):
+    return sorted_values[max(1, math.ceil(percentile * len(sorted_values) / 100)) - 1]
+
+
+def lognormal_samples(count, seed):
+    rng = random.Random(seed)
+    return [rng.lognormvariate(math.log(0.3), 0.6) for _ in range(count)]
+
+
+@pytest.mark.parametrize("count", [1, 7, 1000, 10000])
+def test_percentiles_match_sorted_samples(count):
+    samples = lognormal_samples(count, seed=count)
+    histogram = LatencyHistogram()
+    for sample in samples:
+        histogram.record(sample)
+    sorted_samples = sorted(samples)
+    for percentile in PERCENTILES:
+        # Three significant figures: within a thousandth of the exact nearest-rank value
+        assert histogram.percentile(percentile) == pytest.approx(nearest_rank(sorted_samples, percentile), rel=1e-3)
+
+
+def test_p99_9_of_ten_thousand_samples_is_rank_9990():
+    samples = sorted(lognormal_samples(10000, seed=1))
+    histogram = LatencyHistogram()
+    histogram.record_many(samples)
+    assert histogram.percentile(99.9) == pytest.approx(samples[9989], rel=1e-3)
+    assert histogram.percentile(99.9) != pytest.approx(samples[9990], rel=1e-3)
+
+
+def test_merge_matches_recording_every_sample_in_one_histogram():
+    first, second = lognormal_samples(3000, seed=2), lognormal_samples(5000, seed=3)
+    merged = LatencyHistogram()
+    merged.record_many(first)
+    other = LatencyHistogram()
+    other.record_many(second)
+    merged.merge(other)
+
+    combined = sorted(first + second)
+    assert merged.count == len(combined)
+    assert merged.min == combined[0]
+    assert merged.max == combined[-1]
+    assert merged.mean == pytest.approx(sum(combined) / len(combined))
+    for percentile in PERCENTILES:
+        assert merged.percentile(percentile) == pytest.approx(nearest_rank(combined, percentile), rel=1e-3)
+
+
+def test_merge_rejects_histograms_of_another_precision():
+    with pytest.raises(ValueError):
+        LatencyHistogram().merge(LatencyHistogram(significant_figures=2))
@@ -0,0 +1,24 @@
+import pytest
+
+from timeline import ChunkTimeline, TextChunkLog, sorted_percentile
+
+
+def test_text_chunks_never_match_audio_that_arrived_before_they_were_sent():
+    # Without alignment the first audio chunk is estimated to speak three quarters of the text, which reaches into
+    # the last text chunk even though that chunk was sent after the audio arrived
+    text_chunks = TextChunkLog()
+    for sent_at in (0.0, 0.1, 1.0):
+        text_chunks.record("0123456789", sent_at=sent_at)
+    timeline = ChunkTimeline(started_at=0.0)
+    timeline.record(300, arrived_at=0.5)
+    timeline.record(100, arrived_at=1.6)
+
+    assert list(text_chunks.latencies(timeline)) == pytest.approx([0.5, 0.4, 0.6])
+    assert text_chunks.summary(timeline).source == "characters"
+
+
+def test_sorted_percentile_p99_9_of_ten_thousand_values_is_rank_9990():
+    values = list(range(1, 10001))
+    assert sorted_percentile(values, 99.9) == 9990
+    assert sorted_percentile(values, 50) == 5000
+    assert sorted_percentile([], 50) is None
@@ -0,0 +1,204 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from pydantic import BaseModel
+
+from connection_pool import ConnectionMode
+from corpus import CorpusEntry
+from providers import (
+    BlockingSdkBridge,
+    create_provider,
+)
+from results_store import (
+    DEFAULT_RESULTS_PATH,
+    ResultsStore,
+    ResultsWriter,
+    RunMetadata,
+)
+from scenario import ScenarioMode
+from sinks import DiscardSink
+from token_source import simulated_token_source
+
+DEFAULT_MODELS_PATH = os.path.join("benchmark_output", "length_models.json")
+MODELED_FIELDS = ("time_to_first_audio", "total_time", "bytes_per_second")
+
+
+class TextLengthSample:
+    # A provider's latency data for one corpus entry, with the wall time of the whole synthesis and its sustained
+    # throughput alongside; everything else is read through from the latency data
+
+    def __init__(self, latency_data, entry: CorpusEntry, total_time: float):
+        self.latency_data = latency_data
+        self.entry_id = entry.id
+        self.characters = entry.characters
+        self.punctuation = entry.punctuation
+        self.total_time = total_time
+        timeline = getattr(latency_data, "timeline", None)
+        self.bytes_per_second = timeline.bytes_per_second() if timeline is not None else None
+
+    def __getattr__(self, name):
+        return getattr(self.latency_data, name)
+
+
+class LengthModel(BaseModel):
+    # value = fixed + per_character * characters, fitted by least squares
+    provider: str
+    mode: ScenarioMode
+    field: str
+    fixed: float
+    per_character: float
+    r_squared: Optional[float] = None
+    samples: int
+    min_characters: int
+    max_characters: int
+
+    def predict(self, characters: int) -> float:
+        return self.fixed + self.per_character * characters
+
+    def crossover(self, other: "LengthModel") -> Optional[float]:
+        # Text length past which the two models swap order, or None if one is ahead at every length
+        if self.per_character == other.per_character:
+            return None
+        characters = (other.fixed - self.fixed) / (self.per_character - other.per_character)
+        return characters if characters > 0 else None
+
+
+def fit_length_model(points: Sequence[Tuple[int, float]], provider: str, mode: ScenarioMode,
+                     field: str) -> Optional[LengthModel]:
+    if len(points) < 2:
+        return None
+    count = len(points)
+    mean_x = sum(x for x, _ in points) / count
+    mean_y = sum(y for _, y in points) / count
+    sxx = sum((x - mean_x) ** 2 for x, _ in points)
+    if not sxx:
+        return None
+    sxy = sum((x - mean_x) * (y - mean_y) for x, y in points)
+    per_character = sxy / sxx
+    fixed = mean_y - per_character * mean_x
+    syy = sum((y - mean_y) ** 2 for _, y in points)
+    residual = sum((y - fixed - per_character * x) ** 2 for x, y in points)
+    return LengthModel(
+        provider=provider,
+        mode=mode,
+        field=field,
+        fixed=fixed,
+        per_character=per_character,
+        r_squared=1 - residual / syy if syy else None,
+        samples=count,
+        min_characters=min(x for x, _ in points),
+        max_characters=max(x for x, _ in points),
+    )
+
+
+def fit_length_models(samples: Sequence[TextLengthSample], provider: str, mode: ScenarioMode,
+                      fields: Sequence[str] = MODELED_FIELDS) -> List[LengthModel]:
+    models = []
+    for field in fields:
+        points = [(sample.characters, value) for sample in samples
+                  if (value := getattr(sample, field, None)) is not None]
+        if model := fit_length_model(points, provider=provider, mode=mode, field=field):
+            models.append(model)
+    return models
+
+
+def save_length_models(models: Sequence[LengthModel], path: str = DEFAULT_MODELS_PATH):
+    if directory := os.path.dirname(path):
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump([json.loads(model.json()) for model in models], f, indent=2)
+
+
+def load_length_models(path: str = DEFAULT_MODELS_PATH) -> List[LengthModel]:
+    with open(path) as f:
+        return [LengthModel(**model) for model in json.load(f)]
+
+
+async def _synthesize(provider, entry: CorpusEntry, mode: ScenarioMode, connection_mode: ConnectionMode, logger):
+    started_at = time.perf_counter()
+    if mode == ScenarioMode.INPUT_STREAMING:
+        # Tokens arrive without delay, so the slope is the provider's cost per character and not the token rate
+        latency_data = await provider.synthesize_streaming_input(simulated_token_source(entry.text)(),
+                                                                 sink=DiscardSink(), connection_mode=connection_mode,
+                                                                 logger=logger)
+    else:
+        latency_data = await provider.synthesize(entry.text, sink=DiscardSink(), connection_mode=connection_mode,
+                                                 logger=logger)
+    return TextLengthSample(latency_data, entry=entry, total_time=time.perf_counter() - started_at)
+
+
+async def sweep_provider(name: str, corpus: Sequence[CorpusEntry], modes: Sequence[ScenarioMode],
+                         iterations: int = 3, connection_mode: ConnectionMode = ConnectionMode.WARM,
+                         bridge: Optional[BlockingSdkBridge] = None, store: Optional[ResultsStore] = None,
+                         seed: Optional[int] = None, logger=None) -> Dict[ScenarioMode, List[TextLengthSample]]:
+    # Every round visits the corpus in a fresh random order, so drift in the provider's latency over the sweep
+    # spreads across all lengths instead of tilting the fit
+    if not logger:
+        logger = logging.getLogger("text_length")
+    rng = random.Random(seed)
+    provider = create_provider(name, bridge=bridge)
+    modes = [mode for mode in modes if mode == ScenarioMode.STREAMING or provider.supports_input_streaming]
+    if not modes:
+        logger.warning(f"{name} supports none of the modes swept, skipping it")
+        await provider.close()
+        return {}
+    samples: Dict[ScenarioMode, List[TextLengthSample]] = {mode: [] for mode in modes}
+    writers: Dict[Tuple[ScenarioMode, int], ResultsWriter] = {}
+    try:
+        # A warmup call per mode, so the first entry measured does not pay for DNS, TLS and pool set-up; the modes
+        # have connections of their own to set up
+        for mode in modes:
+            try:
+                await _synthesize(provider, corpus[0], mode, connection_mode, logger)
+            except Exception as e:
+                logger.warning(f"{name} {mode.value} warmup request failed: {e!r}")
+        for round_index in range(iterations):
+            logger.info(f"{name} round {round_index + 1} of {iterations}")
+            for mode, entry in rng.sample([(mode, entry) for mode in modes for entry in corpus],
+                                          len(modes) * len(corpus)):
+                try:
+                    sample = await _synthesize(provider, entry, mode, connection_mode, logger)
+                except Exception as e:
+                    logger.warning(f"{name} {mode.value} {entry.id} failed: {e!r}")
+                    continue
+                samples[mode].append(sample)
+                if store:
+                    # One run per length bucket, so compare_runs can line up the same bucket across providers
+                    if (mode, entry.bucket) not in writers:
+                        metadata = store.create_run(RunMetadata.for_provider(
+                            provider, mode=mode.value, text_length=entry.bucket, label="text_length"))
+                        writers[mode, entry.bucket] = store.writer(metadata.run_id)
+                    writers[mode, entry.bucket].record(sample)
+    finally:
+        for writer in writers.values():
+            writer.close()
+        await provider.close()
+    return samples
+
+
+def run_length_sweep(providers: Sequence[str], corpus: Sequence[CorpusEntry], modes: Sequence[ScenarioMode],
+                     iterations: int = 3, connection_mode: ConnectionMode = ConnectionMode.WARM,
+                     results_path: Optional[str] = DEFAULT_RESULTS_PATH, seed: Optional[int] = None,
+                     logger=None) -> List[LengthModel]:
+    if not logger:
+        logger = logging.getLogger("text_length")
+    store = ResultsStore(results_path) if results_path else None
+    bridge = BlockingSdkBridge()
+    models = []
+    try:
+        for name in providers:
+            samples = asyncio.run(sweep_provider(name, corpus=corpus, modes=modes, iterations=iterations,
+                                                 connection_mode=connection_mode, bridge=bridge, store=store,
+                                                 seed=seed, logger=logger.getChild(name)))
+            for mode, mode_samples in samples.items():
+                models.extend(fit_length_models(mode_samples, provider=name, mode=mode))
+    finally:
+        bridge.close()
+        if store:
+            store.close()
+    return models
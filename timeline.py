@@ -0,0 +1,180 @@
+import bisect
+import csv
+import math
+import time
+from array import array
+from itertools import accumulate
+from typing import List, Optional, Tuple
+
+from pydantic import BaseModel
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_STALL_THRESHOLD = 0.25
+
+
+class TimelineSummary(BaseModel):
+    chunks: int = 0
+    total_bytes: int = 0
+    first_chunk_at: Optional[float] = None
+    last_chunk_at: Optional[float] = None
+    bytes_per_second: Optional[float] = None
+    gap_p50: Optional[float] = None
+    gap_p90: Optional[float] = None
+    gap_p99: Optional[float] = None
+    gap_max: Optional[float] = None
+    stall_threshold: float = DEFAULT_STALL_THRESHOLD
+    stalls: int = 0
+    stall_time: float = 0.0
+
+
+class TextAttributionSummary(BaseModel):
+    # Per text chunk latency from its send to the arrival of the first audio that speaks it
+    chunks: int = 0
+    # "alignment" when the provider said which characters each audio chunk speaks, "characters" when that was
+    # estimated from the audio's share of the total
+    source: Optional[str] = None
+    first: Optional[float] = None
+    p50: Optional[float] = None
+    p90: Optional[float] = None
+    max: Optional[float] = None
+
+
+def sorted_percentile(sorted_values, percentile: float) -> Optional[float]:
+    if not len(sorted_values):
+        return None
+    # Multiplied before dividing, which keeps the rank exact: 99.9 / 100 * 10000 is 9990.000000000002
+    return float(sorted_values[max(0, math.ceil(percentile * len(sorted_values) / 100) - 1)])
+
+
+class ChunkTimeline:
+    # Arrival offset (seconds since `started_at`) and byte size of every chunk, kept in flat typed arrays so long
+    # streams cost 16 bytes per chunk instead of an object each. Providers that send alignment data also record how
+    # many characters of the text each chunk speaks.
+
+    def __init__(self, started_at: Optional[float] = None):
+        self.started_at = time.perf_counter() if started_at is None else started_at
+        self.offsets = array("d")
+        self.sizes = array("q")
+        self.characters = array("q")
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def record(self, size: int, arrived_at: Optional[float] = None, characters: Optional[int] = None):
+        self.offsets.append((time.perf_counter() if arrived_at is None else arrived_at) - self.started_at)
+        self.sizes.append(size)
+        if characters is not None:
+            self.characters.append(characters)
+
+    def gaps(self):
+        # Inter-arrival gaps; the wait for the first chunk is time to first byte and is not one of them
+        if np is not None:
+            return np.diff(np.frombuffer(self.offsets, dtype=np.float64))
+        return array("d", (later - earlier for earlier, later in zip(self.offsets, self.offsets[1:])))
+
+    def stalls(self, threshold: float = DEFAULT_STALL_THRESHOLD) -> List[Tuple[float, float]]:
+        # (offset the stall started at, stall length) for every gap longer than `threshold`
+        return [(self.offsets[i], float(gap)) for i, gap in enumerate(self.gaps()) if gap > threshold]
+
+    def bytes_per_second(self) -> Optional[float]:
+        # Sustained rate after the first chunk, so a fast start cannot hide a trickle later on
+        if len(self) < 2 or self.offsets[-1] == self.offsets[0]:
+            return None
+        return (sum(self.sizes) - self.sizes[0]) / (self.offsets[-1] - self.offsets[0])
+
+    def summary(self, stall_threshold: float = DEFAULT_STALL_THRESHOLD) -> TimelineSummary:
+        if not len(self):
+            return TimelineSummary(stall_threshold=stall_threshold)
+        gaps = self.gaps()
+        sorted_gaps = np.sort(gaps) if np is not None else sorted(gaps)
+        stalls = self.stalls(stall_threshold)
+        return TimelineSummary(
+            chunks=len(self),
+            total_bytes=sum(self.sizes),
+            first_chunk_at=self.offsets[0],
+            last_chunk_at=self.offsets[-1],
+            bytes_per_second=self.bytes_per_second(),
+            gap_p50=sorted_percentile(sorted_gaps, 50),
+            gap_p90=sorted_percentile(sorted_gaps, 90),
+            gap_p99=sorted_percentile(sorted_gaps, 99),
+            gap_max=float(sorted_gaps[-1]) if len(sorted_gaps) else None,
+            stall_threshold=stall_threshold,
+            stalls=len(stalls),
+            stall_time=sum(duration for _, duration in stalls),
+        )
+
+    def export(self, path: str):
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["offset_seconds", "bytes"])
+            writer.writerows(zip(self.offsets, self.sizes))
+
+
+class TextChunkLog:
+    # Send time (perf_counter, the clock the audio timeline uses) and character range of every text chunk streamed
+    # to a provider, so arriving audio can be matched back to the text that produced it
+
+    def __init__(self):
+        self.sent_at = array("d")
+        self.starts = array("q")
+        self.ends = array("q")
+
+    def __len__(self):
+        return len(self.sent_at)
+
+    @property
+    def characters(self) -> int:
+        return self.ends[-1] if len(self) else 0
+
+    def record(self, text_chunk: str, sent_at: Optional[float] = None):
+        self.starts.append(self.characters)
+        self.ends.append(self.characters + len(text_chunk))
+        self.sent_at.append(time.perf_counter() if sent_at is None else sent_at)
+
+    def _spoken_until(self, timeline: ChunkTimeline) -> Tuple[Optional[str], List[float]]:
+        # Cumulative characters spoken by the end of every audio chunk. Alignment counts are rescaled to the text
+        # sent, since providers may drop or normalise characters; without them every audio byte is assumed to
+        # speak an equal share of the text.
+        if len(timeline.characters) == len(timeline) and sum(timeline.characters):
+            source, spoken = "alignment", list(accumulate(timeline.characters))
+        elif sum(timeline.sizes):
+            source, spoken = "characters", list(accumulate(timeline.sizes))
+        else:
+            return None, []
+        scale = self.characters / spoken[-1]
+        return source, [count * scale for count in spoken]
+
+    def latencies(self, timeline: ChunkTimeline) -> array:
+        # For every text chunk with audio, the time from its send to the arrival of the audio chunk that starts
+        # speaking it. Audio that arrived before the chunk was sent cannot speak it, however the character counts
+        # fall, so the match never goes negative.
+        _, spoken = self._spoken_until(timeline)
+        latencies = array("d")
+        for sent_at, start, end in zip(self.sent_at, self.starts, self.ends):
+            if start == end:
+                continue
+            index = max(bisect.bisect_right(spoken, start),
+                        bisect.bisect_left(timeline.offsets, sent_at - timeline.started_at))
+            if index == len(spoken):
+                break
+            latencies.append(timeline.started_at + timeline.offsets[index] - sent_at)
+        return latencies
+
+    def summary(self, timeline: ChunkTimeline) -> TextAttributionSummary:
+        source, _ = self._spoken_until(timeline)
+        latencies = self.latencies(timeline)
+        if not latencies:
+            return TextAttributionSummary(source=source)
+        sorted_latencies = sorted(latencies)
+        return TextAttributionSummary(
+            chunks=len(latencies),
+            source=source,
+            first=latencies[0],
+            p50=sorted_percentile(sorted_latencies, 50),
+            p90=sorted_percentile(sorted_latencies, 90),
+            max=sorted_latencies[-1],
+        )
@@ -0,0 +1,26 @@
+import asyncio
+import re
+from typing import AsyncIterator, Callable, Optional
+
+from latency_model import LatencyModel
+
+SIMULATED_RESPONSE = ("Life is a journey of small moments, shared laughter and quiet lessons. We grow through "
+                      "change, find meaning in the people we love, and learn to enjoy the road as it unfolds.")
+
+# Called once per utterance, at the moment the prompt is sent
+TokenSource = Callable[[], AsyncIterator[str]]
+
+
+def simulated_token_source(text: str = SIMULATED_RESPONSE,
+                           latency_model: Optional[LatencyModel] = None) -> TokenSource:
+    # `first_chunk` is the time to first token and `inter_chunk` the delay between tokens
+    latency_model = latency_model or LatencyModel()
+
+    async def tokens():
+        await asyncio.sleep(latency_model.first_chunk_delay())
+        for i, token in enumerate(re.findall(r"\S+\s*", text)):
+            if i:
+                await asyncio.sleep(latency_model.inter_chunk_delay())
+            yield token
+
+    return tokens
@@ -0,0 +1,78 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+
+from timeline import ChunkTimeline
+
+SPAN_DNS = "dns"
+SPAN_CONNECT = "connect"
+SPAN_TLS = "tls"
+SPAN_HANDSHAKE = "handshake"
+SPAN_POOL_ACQUIRE = "pool_acquire"
+SPAN_REQUEST = "request"
+SPAN_SERVER = "server"
+SPAN_FIRST_BYTE = "first_byte"
+SPAN_STREAM = "stream"
+MARK_CONNECTION_REUSED = "connection_reused"
+
+# Set around synchronous SDK calls so transport hooks that cannot be handed a trace (httpx, gRPC) can find it
+current_trace: ContextVar[Optional["RequestTrace"]] = ContextVar("current_trace", default=None)
+
+
+class Span(BaseModel):
+    name: str
+    start_ns: int
+    end_ns: Optional[int] = None
+
+    @property
+    def duration(self) -> Optional[float]:
+        return None if self.end_ns is None else (self.end_ns - self.start_ns) / 1e9
+
+
+class RequestTrace:
+
+    def __init__(self):
+        self.spans: List[Span] = []
+        self._open_spans: Dict[str, Span] = {}
+        # Chunk loops record every audio chunk here, so everything after the first byte is kept as well
+        self.timeline = ChunkTimeline()
+        # A session_trace.SessionRecorder while sessions are captured for replay, which the chunk loops hand every
+        # frame they receive
+        self.capture = None
+
+    def start(self, name: str, at_ns: Optional[int] = None):
+        span = Span(name=name, start_ns=at_ns if at_ns is not None else time.perf_counter_ns())
+        self._open_spans[name] = span
+        self.spans.append(span)
+
+    def end(self, name: str, at_ns: Optional[int] = None):
+        if span := self._open_spans.pop(name, None):
+            span.end_ns = at_ns if at_ns is not None else time.perf_counter_ns()
+
+    def mark(self, name: str):
+        now = time.perf_counter_ns()
+        self.spans.append(Span(name=name, start_ns=now, end_ns=now))
+
+    @contextmanager
+    def span(self, name: str):
+        self.start(name)
+        try:
+            yield
+        finally:
+            self.end(name)
+
+    def finish(self) -> List[Span]:
+        for name in list(self._open_spans):
+            self.end(name)
+        return self.spans
+
+
+def phase_durations(spans: List[Span]) -> Dict[str, float]:
+    durations = {}
+    for span in spans:
+        if span.duration is not None:
+            durations[span.name] = durations.get(span.name, 0.0) + span.duration
+    return durations
@@ -1,5 +1,16 @@
-from typing import List
+from typing import Optional
 
+from stats import FieldStatistics
 
-def get_average_of_field_entries(latency_records: List, field: str):
-    return sum([getattr(latency_data, field) for latency_data in latency_records]) / len(latency_records)
+
+def format_seconds(value: Optional[float]) -> str:
+    return "n/a" if value is None else f"{value:.3f}"
+
+
+def log_field_statistics(field_statistics: FieldStatistics, logger):
+    for field, summary in field_statistics.summary().items():
+        logger.info(
+            f"{field}: n={summary.count} min={summary.min:.3f} p50={summary.p50:.3f} p90={summary.p90:.3f} "
+            f"p99={summary.p99:.3f} p99.9={summary.p99_9:.3f} max={summary.max:.3f} "
+            f"mean={summary.mean:.3f} stddev={summary.stddev:.3f}"
+        )